@@ -28,6 +28,7 @@ class BZR(SourceControl):
     """ Bazaar source control class """
     name = 'Bazaar'
     command = 'bzr'
+    metadir = '.bzr'
     ccache = list()     # Cache of paths that are under bazaar control
     repocache = dict()
 
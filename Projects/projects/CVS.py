@@ -17,9 +17,15 @@ class CVS(SourceControl):
 
     name = 'CVS'
     command = 'cvs'
+    metadir = 'CVS'
+    metafiles = ('Root', 'Entries')
     
     def __repr__(self):
         return 'CVS.CVS()'
+
+    def isFixedRevision(self, rev):
+        """Revision numbers (1.2) are fixed, tags and branches are not"""
+        return bool(re.match('^[0-9]+(\.[0-9]+)+$', rev))
     
     def getRepository(self, path):
         """ Get the repository of a given path """
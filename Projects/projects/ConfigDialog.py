@@ -592,6 +592,7 @@ class ConfigData(dict):
         else:
             self.setDiffProgram('')
         self.setSyncWithNotebook(True)
+        self.setStatusCacheTTL(30)
         
         self.addSCSystem(CVS.CVS())
         self.addSCSystem(SVN.SVN())
@@ -666,6 +667,17 @@ class ConfigData(dict):
     def getSyncWithNotebook(self):
         """ Is the tree syncronized with the notebook """
         return self['general']['sync-with-notebook']
+
+    def setStatusCacheTTL(self, seconds):
+        """ Set how long cached source control status stays valid
+        @param seconds: int (0 to disable caching)
+
+        """
+        self['general']['status-cache-ttl'] = seconds
+
+    def getStatusCacheTTL(self):
+        """ Get the number of seconds source control status is cached for """
+        return self['general'].get('status-cache-ttl', 30)
     
     def addSCSystem(self, instance, repositories=None):
         """ Add a source control system to the configuration """
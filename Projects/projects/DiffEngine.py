@@ -0,0 +1,349 @@
+###############################################################################
+# Name: DiffEngine.py                                                         #
+# Purpose: Line based diff algorithm used by the diff window                  #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2008 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Diff Engine
+
+Computes the differences between two lists of lines. Each line is first
+mapped to an integer id so that all comparisons are integer comparisons.
+The common prefix and suffix of a range are stripped and the rest of the
+range is split on the lines that occur exactly once in both sides (patience
+anchoring). Ranges that have no unique lines left are compared with the
+Myers O(ND) algorithm after discarding the lines that do not occur in the
+other side at all. The Myers search is bounded so that very different
+ranges do not take quadratic time, and the whole diff has a work budget
+proportional to the input size. When the budget is used up the rest is
+searched only a few edits at a time, which keeps the running time linear.
+
+The result is a list of opcodes in the same format as
+difflib.SequenceMatcher.get_opcodes().
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__cvsid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#--------------------------------------------------------------------------#
+# Imports
+import bisect
+
+#--------------------------------------------------------------------------#
+# Globals
+
+# Maximum edit distance searched for at once by the Myers algorithm. Ranges
+# that differ by more than this get a good but not always minimal result.
+MAX_COST = 512
+
+# Work budget of the Myers search per input line. After it is used up the
+# rest is searched FALLBACK_COST edits at a time, which takes linear time.
+WORK_PER_LINE = 2
+FALLBACK_COST = 8
+
+OP_EQUAL = 'equal'
+OP_REPLACE = 'replace'
+OP_DELETE = 'delete'
+OP_INSERT = 'insert'
+
+#--------------------------------------------------------------------------#
+
+def GetOpcodes(a, b, maxcost=MAX_COST, maxwork=None):
+    """Get the opcodes describing how to turn a into b
+    @param a: list of lines
+    @param b: list of lines
+    @keyword maxcost: maximum edit distance to search for in a range
+    @keyword maxwork: work budget of the Myers search (None for default)
+    @return: list of (tag, i1, i2, j1, j2) tuples
+
+    """
+    ids = dict()
+    ida = [ ids.setdefault(line, len(ids)) for line in a ]
+    idb = [ ids.setdefault(line, len(ids)) for line in b ]
+    matches = GetMatchingLines(ida, idb, maxcost, maxwork)
+    return MatchesToOpcodes(matches, len(a), len(b))
+
+def GetMatchingLines(a, b, maxcost=MAX_COST, maxwork=None):
+    """Get the lines that are common to both sequences
+    @param a: list of line ids
+    @param b: list of line ids
+    @keyword maxcost: maximum edit distance to search for in a range
+    @keyword maxwork: work budget of the Myers search (None for default)
+    @return: sorted list of (i, j) index pairs where a[i] == b[j]
+
+    """
+    if maxwork is None:
+        maxwork = WORK_PER_LINE * (len(a) + len(b)) + maxcost * maxcost
+    budget = [maxwork] # Shared by all ranges
+
+    matches = list()
+    ranges = [(0, len(a), 0, len(b))]
+    while ranges:
+        alo, ahi, blo, bhi = ranges.pop()
+
+        # Strip common prefix and suffix
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi))
+
+        if alo == ahi or blo == bhi:
+            continue
+
+        # Split the range on the lines that are unique to both sides
+        anchors = _UniqueAnchors(a, alo, ahi, b, blo, bhi)
+        if anchors:
+            lasta, lastb = alo, blo
+            for i, j in anchors:
+                matches.append((i, j))
+                ranges.append((lasta, i, lastb, j))
+                lasta, lastb = i + 1, j + 1
+            ranges.append((lasta, ahi, lastb, bhi))
+        else:
+            matches.extend(_MyersRange(a, alo, ahi, b, blo, bhi,
+                                       maxcost, budget))
+
+    matches.sort()
+    return matches
+
+def MatchesToOpcodes(matches, alen, blen):
+    """Convert a sorted list of matching line pairs to opcodes
+    @param matches: sorted list of (i, j) tuples
+    @param alen: length of first sequence
+    @param blen: length of second sequence
+    @return: list of (tag, i1, i2, j1, j2) tuples
+
+    """
+    opcodes = list()
+    i = j = 0
+    idx = 0
+    count = len(matches)
+    while idx < count:
+        mi, mj = matches[idx]
+        if mi > i and mj > j:
+            opcodes.append((OP_REPLACE, i, mi, j, mj))
+        elif mi > i:
+            opcodes.append((OP_DELETE, i, mi, j, j))
+        elif mj > j:
+            opcodes.append((OP_INSERT, i, i, j, mj))
+
+        # Collect the run of consecutive matches
+        end = idx + 1
+        while end < count and matches[end][0] == mi + (end - idx) and \
+              matches[end][1] == mj + (end - idx):
+            end += 1
+        size = end - idx
+        opcodes.append((OP_EQUAL, mi, mi + size, mj, mj + size))
+        i, j = mi + size, mj + size
+        idx = end
+
+    if i < alen and j < blen:
+        opcodes.append((OP_REPLACE, i, alen, j, blen))
+    elif i < alen:
+        opcodes.append((OP_DELETE, i, alen, j, j))
+    elif j < blen:
+        opcodes.append((OP_INSERT, i, i, j, blen))
+    return opcodes
+
+def CountChanges(opcodes):
+    """Get the number of changed blocks in a list of opcodes
+    @param opcodes: list of opcodes
+    @return: int
+
+    """
+    return len([ op for op in opcodes if op[0] != OP_EQUAL ])
+
+#--------------------------------------------------------------------------#
+# Internal helpers
+
+def _UniqueAnchors(a, alo, ahi, b, blo, bhi):
+    """Find the longest increasing sequence of lines that occur exactly once
+    in both a[alo:ahi] and b[blo:bhi].
+    @return: list of (i, j) tuples
+
+    """
+    # Position in a of the lines occurring once, None if more than once
+    unique = dict()
+    for i in xrange(alo, ahi):
+        line = a[i]
+        if line in unique:
+            unique[line] = None
+        else:
+            unique[line] = i
+
+    # Position in b of the lines that are unique in a
+    inb = dict()
+    for j in xrange(blo, bhi):
+        line = b[j]
+        if unique.get(line) is not None:
+            if line in inb:
+                inb[line] = None
+            else:
+                inb[line] = j
+
+    pairs = [ (unique[line], j) for line, j in inb.iteritems()
+              if j is not None ]
+    if not pairs:
+        return list()
+    pairs.sort()
+
+    # Patience sort the b positions to find the longest increasing run
+    tails = list()      # Smallest b position ending a run of each length
+    tailidx = list()    # Index in pairs of each tail
+    backref = [None] * len(pairs)
+    for idx, (i, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos:
+            backref[idx] = tailidx[pos - 1]
+        if pos == len(tails):
+            tails.append(j)
+            tailidx.append(idx)
+        else:
+            tails[pos] = j
+            tailidx[pos] = idx
+
+    anchors = list()
+    idx = tailidx[-1]
+    while idx is not None:
+        anchors.append(pairs[idx])
+        idx = backref[idx]
+    anchors.reverse()
+    return anchors
+
+def _MyersRange(a, alo, ahi, b, blo, bhi, maxcost, budget):
+    """Find the matching lines in a range using the Myers algorithm. Lines
+    that do not occur in the other side can never match so they are left out
+    of the comparison.
+    @param budget: [remaining work]
+    @return: list of (i, j) tuples
+
+    """
+    bset = set(b[blo:bhi])
+    aidx = [ i for i in xrange(alo, ahi) if a[i] in bset ]
+    aset = set([ a[i] for i in aidx ])
+    bidx = [ j for j in xrange(blo, bhi) if b[j] in aset ]
+    if not aidx or not bidx:
+        return list()
+
+    seqa = [ a[i] for i in aidx ]
+    seqb = [ b[j] for j in bidx ]
+    matches = _Myers(seqa, seqb, maxcost, budget)
+    return [ (aidx[x], bidx[y]) for x, y in matches ]
+
+def _Myers(a, b, maxcost, budget):
+    """Myers greedy shortest edit script algorithm. When the edit distance
+    is greater than maxcost the path to the furthest point reached is kept
+    and the search is restarted from there, so the result is not minimal
+    but the running time stays linear in the size of the difference. Once
+    the work budget is used up the rest is searched FALLBACK_COST edits at
+    a time.
+    @param budget: [remaining work]
+    @return: list of matching (x, y) pairs
+
+    """
+    n, m = len(a), len(b)
+    matches = list()
+    x0 = y0 = 0
+    while x0 < n and y0 < m:
+        if budget[0] <= 0:
+            # Out of budget, continue with short searches
+            part, end = _MyersStep(a, x0, n, b, y0, m, FALLBACK_COST, [n + m])
+        else:
+            part, end = _MyersStep(a, x0, n, b, y0, m, maxcost, budget)
+        matches.extend(part)
+        if end is None:
+            break
+        x0, y0 = end
+    return matches
+
+def _MyersStep(a, x0, n, b, y0, m, maxcost, budget):
+    """Search for the shortest edit script from (x0, y0) to (n, m) using
+    at most maxcost edits and the remaining work budget.
+    @param budget: [remaining work]
+    @return: (matches, end) where end is None if (n, m) was reached or
+             the point the search should be continued from
+
+    """
+    w, h = n - x0, m - y0
+    maxd = min(w + h, maxcost)
+    offset = maxd + 1
+    v = [0] * (2 * maxd + 3)
+    trace = list()
+    work = 0
+    for d in xrange(maxd + 1):
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            start = x
+            while x < w and y < h and a[x0 + x] == b[y0 + y]:
+                x += 1
+                y += 1
+            work += x - start + 1
+            v[offset + k] = x
+            if x >= w and y >= h:
+                budget[0] -= work
+                return _MyersBacktrack(trace, d, w, h, x0, y0), None
+        trace.append(v[offset - d:offset + d + 1])
+        if work >= budget[0]:
+            break
+    budget[0] -= work
+
+    # Too many differences, continue from the furthest point reached. Points
+    # that drift away from the diagonal to the end lose score so that the
+    # search does not run off along one of the sequences.
+    best = None
+    score = None
+    dist = len(trace) - 1
+    frontier = trace.pop()
+    for idx, x in enumerate(frontier):
+        y = x - (idx - dist)
+        if x <= w and 0 <= y <= h:
+            value = x + y - 2.0 * abs(x * h - y * w) / (w + h)
+            if best is None or value > score:
+                best, score = (x, y), value
+    if best is None:
+        return list(), None
+    return _MyersBacktrack(trace, dist, best[0], best[1], x0, y0), \
+           (x0 + best[0], y0 + best[1])
+
+def _MyersBacktrack(trace, dist, x, y, x0, y0):
+    """Walk the saved Myers frontiers back to the start to find the
+    matching pairs on the shortest path.
+    @return: list of (x, y) tuples offset by (x0, y0)
+
+    """
+    matches = list()
+    for d in xrange(dist, 0, -1):
+        prev = trace[d - 1]     # Frontier of d - 1, k in -(d-1)...(d-1)
+        k = x - y
+        if k == -d or (k != d and prev[k - 1 + d - 1] < prev[k + 1 + d - 1]):
+            pk = k + 1
+            px = prev[pk + d - 1]
+            sx, sy = px, px - pk + 1
+        else:
+            pk = k - 1
+            px = prev[pk + d - 1]
+            sx, sy = px + 1, px - pk
+        while x > sx and y > sy:
+            x -= 1
+            y -= 1
+            matches.append((x0 + x, y0 + y))
+        x, y = px, px - pk
+
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        matches.append((x0 + x, y0 + y))
+    matches.reverse()
+    return matches
@@ -0,0 +1,456 @@
+###############################################################################
+# Name: DirWatcher.py                                                         #
+# Purpose: Shared directory watch service for the project tree                #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Directory Watch Service
+
+A single service thread that monitors all of the directories that are
+expanded in the project tree. On Linux the kernel's inotify interface is
+used so that nothing is done while the file system is idle. On all other
+platforms (or if inotify is unavailable) the directories are polled for
+modification time changes from the same single thread.
+
+Subscribers register a path along with an arbitrary data object (the tree
+node). When something in a watched directory changes the callback is called
+from the service thread with (added, modified, deleted, data) for every
+subscriber of that directory.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+import stat
+import errno
+import select
+import struct
+import threading
+import time
+
+#-----------------------------------------------------------------------------#
+# Globals
+
+# inotify event masks (see sys/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+                 IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF |
+                 IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+# Seconds to wait for more events before notifying subscribers
+SETTLE_DELAY = 0.2
+
+#-----------------------------------------------------------------------------#
+
+def getMTime(path):
+    """ Get last modified times of all items in path """
+    fileinfo = {}
+    try:
+        for item in os.listdir(path):
+            try:
+                fileinfo[item] = os.stat(os.path.join(path, item))[stat.ST_MTIME]
+            except OSError:
+                pass
+    except OSError:
+        pass
+    return fileinfo
+
+def _listNames(path):
+    """Get the set of names in the given directory"""
+    try:
+        return set(os.listdir(path))
+    except OSError:
+        return set()
+
+#-----------------------------------------------------------------------------#
+
+class _Inotify(object):
+    """Minimal ctypes wrapper around the Linux inotify api"""
+    def __init__(self):
+        super(_Inotify, self).__init__()
+
+        import ctypes
+        import ctypes.util
+
+        # Attributes
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                                 use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self.fd = self._libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(self._get_errno(), "inotify_init failed")
+
+    def AddWatch(self, path):
+        """Add a watch for the given directory
+        @return: watch descriptor
+
+        """
+        if isinstance(path, unicode):
+            path = path.encode(sys.getfilesystemencoding() or 'utf-8')
+        wd = self._libc.inotify_add_watch(self.fd, path, IN_WATCH_MASK)
+        if wd < 0:
+            raise OSError(self._get_errno(), "inotify_add_watch failed")
+        return wd
+
+    def RemoveWatch(self, wd):
+        """Remove the watch descriptor"""
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def ReadEvents(self):
+        """Read the currently pending events
+        @return: list of (wd, mask, name) tuples
+
+        """
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except OSError, msg:
+            if msg.errno in (errno.EINTR, errno.EAGAIN):
+                return list()
+            raise
+
+        events = list()
+        hsize = _EVENT_HEADER.size
+        pos = 0
+        while pos + hsize <= len(buf):
+            wd, mask, cookie, nlen = _EVENT_HEADER.unpack_from(buf, pos)
+            pos += hsize
+            name = buf[pos:pos + nlen].rstrip('\0')
+            pos += nlen
+            events.append((wd, mask, name))
+        return events
+
+    def Close(self):
+        """Close the inotify instance"""
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+#-----------------------------------------------------------------------------#
+
+class DirectoryWatchService(threading.Thread):
+    """Single thread that watches all directories open in the project tree"""
+    def __init__(self, callback, delay=2):
+        """Create the watch service
+        @param callback: callable(added, modified, deleted, data) called from
+                         the service thread when a watched directory changes.
+        @keyword delay: polling interval (seconds) for the fallback monitor
+
+        """
+        super(DirectoryWatchService, self).__init__()
+
+        # Attributes
+        self.setDaemon(True)
+        self._callback = callback
+        self.delay = max(1, int(delay))
+        self._lock = threading.RLock()
+        self._active = True
+        self._watches = dict()  # path -> dict(subscribers=[], state=)
+        self._wds = dict()      # inotify watch descriptor -> path
+        self._started = False
+        self._lastpoll = 0
+        self._notify = None
+        self._wakeup = None
+
+        if sys.platform.startswith('linux'):
+            try:
+                self._notify = _Inotify()
+                self._wakeup = os.pipe()
+            except (OSError, AttributeError, ImportError):
+                self._notify = None
+
+    UsesInotify = property(lambda self: self._notify is not None)
+
+    def AddWatch(self, path, data):
+        """Subscribe data to change notifications for path
+        @param path: directory path
+        @param data: object passed back to the callback (i.e tree node)
+
+        """
+        self._lock.acquire()
+        try:
+            watch = self._watches.get(path, None)
+            if watch is None:
+                watch = dict(subscribers=list(), wd=None)
+                if self._notify is not None:
+                    try:
+                        watch['wd'] = self._notify.AddWatch(path)
+                        self._wds[watch['wd']] = path
+                    except OSError:
+                        # Most likely out of watches, poll this one
+                        watch['wd'] = None
+                if watch['wd'] is None:
+                    watch['state'] = getMTime(path)
+                else:
+                    watch['state'] = _listNames(path)
+                self._watches[path] = watch
+
+            if data not in watch['subscribers']:
+                watch['subscribers'].append(data)
+        finally:
+            self._lock.release()
+
+        if not self._started and self._active:
+            self._started = True
+            self.start()
+
+    def RemoveWatch(self, path, data=None):
+        """Unsubscribe from notifications for path
+        @param path: directory path
+        @keyword data: subscriber to remove (None to remove all)
+
+        """
+        self._lock.acquire()
+        try:
+            watch = self._watches.get(path, None)
+            if watch is None:
+                return
+
+            if data is not None and data in watch['subscribers']:
+                watch['subscribers'].remove(data)
+            elif data is None:
+                del watch['subscribers'][:]
+
+            if not watch['subscribers']:
+                del self._watches[path]
+                wd = watch['wd']
+                if wd is not None and self._wds.pop(wd, None) is not None:
+                    self._notify.RemoveWatch(wd)
+        finally:
+            self._lock.release()
+
+    def IsWatching(self, path):
+        """Is the given path being watched
+        @return: bool
+
+        """
+        return path in self._watches
+
+    def Shutdown(self):
+        """Stop the service"""
+        self._active = False
+        if self._wakeup is not None:
+            try:
+                os.write(self._wakeup[1], 'x')
+            except OSError:
+                pass
+
+    def run(self):
+        """Service the watches until shutdown"""
+        try:
+            while self._active:
+                if self._notify is not None:
+                    self._WaitForEvents()
+                else:
+                    self._Sleep(self.delay)
+
+                if self._active:
+                    self._PollWatches()
+        finally:
+            if self._notify is not None:
+                self._notify.Close()
+                for fd in self._wakeup:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
+
+    #---- Implementation ----#
+
+    def _Sleep(self, delay):
+        """Sleep for delay seconds checking for the kill signal"""
+        for i in xrange(delay):
+            if not self._active:
+                return
+            time.sleep(1)
+
+    def _Dispatch(self, path, added, modified, deleted):
+        """Notify all subscribers of path of the changes"""
+        self._lock.acquire()
+        try:
+            watch = self._watches.get(path, None)
+            subscribers = list()
+            if watch is not None:
+                subscribers = list(watch['subscribers'])
+        finally:
+            self._lock.release()
+
+        for data in subscribers:
+            self._callback(list(added), list(modified), list(deleted), data)
+
+    def _PollWatches(self):
+        """Check all directories that are not handled by inotify. Polling
+        waits for the full delay since the last pass.
+
+        """
+        self._lock.acquire()
+        try:
+            polled = [ path for path, watch in self._watches.iteritems()
+                       if watch['wd'] is None ]
+        finally:
+            self._lock.release()
+
+        if self._notify is not None and polled:
+            # Mixed mode, limit the polling to the configured delay
+            now = time.time()
+            if now - self._lastpoll < self.delay:
+                return
+            self._lastpoll = now
+
+        for path in polled:
+            new = getMTime(path)
+            self._lock.acquire()
+            try:
+                watch = self._watches.get(path, None)
+                if watch is None:
+                    continue
+                old = watch['state']
+                watch['state'] = new
+            finally:
+                self._lock.release()
+
+            modified, added = list(), list()
+            for key, mtime in new.iteritems():
+                if key not in old:
+                    added.append(key)
+                elif mtime > old[key]:
+                    modified.append(key)
+            deleted = [ key for key in old if key not in new ]
+
+            if added or modified or deleted:
+                self._Dispatch(path, added, modified, deleted)
+
+    def _WaitForEvents(self):
+        """Block until inotify reports changes and then dispatch them"""
+        rfd = self._wakeup[0]
+        timeout = None
+        if self._HasPolledWatches():
+            timeout = self.delay
+
+        try:
+            ready = select.select([self._notify.fd, rfd], [], [], timeout)[0]
+        except select.error, msg:
+            if msg[0] == errno.EINTR:
+                return
+            raise
+
+        if rfd in ready or self._notify.fd not in ready:
+            return
+
+        # Let bursts of activity (checkouts, builds) settle into one batch
+        events = list()
+        while self._notify.fd in ready and self._active:
+            events.extend(self._notify.ReadEvents())
+            ready = select.select([self._notify.fd], [], [], SETTLE_DELAY)[0]
+
+        changes = dict() # path -> (added, modified, deleted)
+        overflow = False
+        self._lock.acquire()
+        try:
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+
+                path = self._wds.get(wd, None)
+                if path is None:
+                    continue
+
+                if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                    # The directory itself is gone, the parent's watch will
+                    # report the removal.
+                    if mask & IN_IGNORED:
+                        del self._wds[wd]
+                        watch = self._watches.get(path, None)
+                        if watch is not None and watch['wd'] == wd:
+                            watch['wd'] = None
+                            watch['state'] = getMTime(path)
+                    continue
+
+                if not name:
+                    continue
+
+                added, modified, deleted = changes.setdefault(path,
+                                                (set(), set(), set()))
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    if name in deleted:
+                        deleted.discard(name)
+                        modified.add(name)
+                    else:
+                        added.add(name)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    modified.discard(name)
+                    if name in added:
+                        added.discard(name)
+                    else:
+                        deleted.add(name)
+                elif name not in added:
+                    modified.add(name)
+
+            # Keep the name snapshots current for overflow recovery
+            for path, (added, modified, deleted) in changes.iteritems():
+                watch = self._watches.get(path, None)
+                if watch is not None and watch['wd'] is not None:
+                    watch['state'].difference_update(deleted)
+                    watch['state'].update(added)
+
+            if overflow:
+                changes = self._Resync()
+        finally:
+            self._lock.release()
+
+        for path, (added, modified, deleted) in changes.iteritems():
+            if added or modified or deleted:
+                self._Dispatch(path, added, modified, deleted)
+
+    def _Resync(self):
+        """Recover from an event queue overflow by comparing listings
+        @return: dict(path=(added, modified, deleted))
+        @note: must be called with the lock held
+
+        """
+        changes = dict()
+        for path, watch in self._watches.iteritems():
+            if watch['wd'] is None:
+                continue
+
+            new = _listNames(path)
+            old = watch['state']
+            watch['state'] = new
+            # Without mtimes every surviving entry may have been modified
+            changes[path] = (new - old, new & old, old - new)
+        return changes
+
+    def _HasPolledWatches(self):
+        """Are any of the watched directories being polled"""
+        self._lock.acquire()
+        try:
+            for watch in self._watches.itervalues():
+                if watch['wd'] is None:
+                    return True
+        finally:
+            self._lock.release()
+        return False
@@ -20,6 +20,7 @@ import os
 import sys
 import datetime
 import re
+import time
 
 # Local imports
 import SourceControl
@@ -27,9 +28,209 @@ DecodeString = SourceControl.DecodeString
 
 #-----------------------------------------------------------------------------#
 # Globals
-UNKPAT = re.compile('#[ \t]+[a-zA-Z0-9]+') # hmmm
-RELPAT = re.compile('#[ \t]+\.{1,2}' + re.escape(os.sep)) # relative paths
 COMPAT = re.compile('commit [a-z0-9]{40}') # Commit line in log
+FIXED_REV = re.compile('^[0-9a-fA-F]{40}$') # Full commit id
+
+# Log record format for paged history (fields separated by \x1f)
+LOG_FORMAT = '--format=%H%x1f%an <%ae>%x1f%at%x1f%B'
+
+# Status command options
+STATUS_V2 = ['status', '--porcelain=v2', '-z', '--ignored',
+             '--untracked-files=normal']
+STATUS_V1 = ['status', '--porcelain', '-z', '--ignored',
+             '--untracked-files=normal']
+
+#-----------------------------------------------------------------------------#
+
+class GitStatusSnapshot(object):
+    """Status of a whole git working tree taken from a single
+    git status --porcelain call. Status queries for any path in the
+    working tree are answered from the snapshot.
+
+    """
+    def __init__(self, root):
+        """Create the snapshot
+        @param root: repository root directory
+
+        """
+        super(GitStatusSnapshot, self).__init__()
+
+        # Attributes
+        self.root = root.rstrip(os.sep) + os.sep
+        self.timestamp = time.time()
+        self.entries = dict()   # relpath -> status string
+        self.untracked = set()  # untracked relpaths (files and dirs)
+        self.ignored = set()    # ignored relpaths (files and dirs)
+
+    def __len__(self):
+        return len(self.entries)
+
+    #---- Parsing ----#
+
+    def _AddRecord(self, fields, codes):
+        """Add a changed path record
+        @param fields: list of record fields
+        @param codes: XY status code string
+
+        """
+        path = self._RelPath(fields[-1])
+        if 'U' in codes or codes in ('AA', 'DD'):
+            status = 'conflict'
+        elif 'A' in codes or 'R' in codes or 'C' in codes:
+            status = 'added'
+        elif 'D' in codes:
+            status = 'deleted'
+        else:
+            status = 'modified'
+        self.entries[path] = status
+
+    def _RelPath(self, path):
+        """Convert a path from git output to a native relative path"""
+        path = DecodeString(path.rstrip('/'), sys.getfilesystemencoding())
+        if os.sep != '/':
+            path = path.replace('/', os.sep)
+        return path
+
+    def Parse(self, stream, bufsize=65536):
+        """Parse the -z output of git status (porcelain v1 or v2) as it
+        is read from the stream.
+        @param stream: file like object
+
+        """
+        pending = ''
+        skip = False # next field is the original path of a rename
+        while True:
+            chunk = stream.read(bufsize)
+            if not chunk:
+                break
+
+            records = (pending + chunk).split('\0')
+            pending = records.pop()
+            for record in records:
+                if skip:
+                    skip = False
+                else:
+                    skip = self.ParseRecord(record)
+
+        if pending and not skip:
+            self.ParseRecord(pending)
+
+    def ParseRecord(self, record):
+        """Parse a single NUL terminated status record
+        @return: bool (True if the next record is a rename source)
+
+        """
+        if len(record) < 3:
+            return False
+
+        kind = record[0]
+        if record[1] == ' ' and kind in '12u?!#':
+            # Porcelain v2
+            if kind == '1':
+                fields = record.split(' ', 8)
+                self._AddRecord(fields, fields[1])
+            elif kind == '2':
+                fields = record.split(' ', 9)
+                self._AddRecord(fields, fields[1])
+                return True
+            elif kind == 'u':
+                fields = record.split(' ', 10)
+                self.entries[self._RelPath(fields[-1])] = 'conflict'
+            elif kind == '?':
+                self.untracked.add(self._RelPath(record[2:]))
+            elif kind == '!':
+                self.ignored.add(self._RelPath(record[2:]))
+            return False
+
+        # Porcelain v1 "XY path"
+        codes, path = record[:2], record[3:]
+        if codes == '??':
+            self.untracked.add(self._RelPath(path))
+        elif codes == '!!':
+            self.ignored.add(self._RelPath(path))
+        else:
+            self._AddRecord([path], codes.strip())
+            return 'R' in codes or 'C' in codes
+        return False
+
+    #---- Queries ----#
+
+    def RelativePath(self, path):
+        """Get the path relative to the repository root
+        @return: string ('' for the root) or None if not in the repository
+
+        """
+        path = os.path.normpath(path)
+        if path + os.sep == self.root:
+            return u''
+        elif path.startswith(self.root):
+            return path[len(self.root):]
+        return None
+
+    def IsUntracked(self, relpath):
+        """Is the relative path (or one of its parents) untracked or
+        ignored.
+        @param relpath: path relative to the repository root
+
+        """
+        while relpath:
+            if relpath in self.untracked or relpath in self.ignored:
+                return True
+            relpath = os.path.dirname(relpath)
+        return False
+
+    def GetStatus(self, path, recursive=False, status=None):
+        """Get the status information for the given path in the same
+        format as SourceControl.status.
+        @param path: absolute path
+        @keyword recursive: include all files below a directory
+        @keyword status: dict to put the status in
+
+        """
+        if status is None:
+            status = dict()
+
+        rel = self.RelativePath(path)
+        if rel is None or self.IsUntracked(rel):
+            return status
+
+        if not os.path.isdir(path):
+            if rel in self.entries:
+                status[os.path.basename(rel)] = dict(status=self.entries[rel])
+            elif os.path.exists(path):
+                status[os.path.basename(rel)] = dict(status='uptodate')
+            return status
+
+        # Changed entries (this includes deleted files that are not on disk)
+        prefix = rel and rel + os.sep
+        for entry, estatus in self.entries.iteritems():
+            if not entry.startswith(prefix):
+                continue
+            name = entry[len(prefix):]
+            if recursive or os.sep not in name:
+                status[name] = dict(status=estatus)
+
+        # Everything else that is tracked is up to date
+        for root, dirs, files in os.walk(path):
+            relroot = root[len(path):].strip(os.sep)
+            for name in list(dirs) + files:
+                if name == '.git':
+                    continue
+                key = os.path.join(relroot, DecodeString(name))
+                if key in status:
+                    continue
+                if self.IsUntracked(os.path.join(prefix, key)):
+                    if name in dirs:
+                        dirs.remove(name)
+                    continue
+                status[key] = dict(status='uptodate')
+
+            if not recursive:
+                break
+            elif '.git' in dirs:
+                dirs.remove('.git')
+
+        return status
 
 #-----------------------------------------------------------------------------#
 
@@ -40,10 +241,15 @@ class GIT(SourceControl.SourceControl):
     """
     name = 'GIT'
     command = 'git'
+    metadir = '.git'
 
     def __repr__(self):
         return 'GIT.GIT()'
 
+    def isFixedRevision(self, rev):
+        """Only full commit ids always refer to the same commit"""
+        return bool(FIXED_REV.match(rev))
+
     def isControlled(self, path):
         """ Is the path controlled by GIT?
         The repository directory is only kept in the root of the
@@ -56,11 +262,10 @@ class GIT(SourceControl.SourceControl):
             return False
 
         # Path is in repo path so now check if it is tracked or not
-        for item in self.untrackedFiles(path):
-            if path.startswith(item):
-                return False
-        else:
-            return True
+        snapshot = self.statusSnapshot(root)
+        if snapshot is None:
+            return False
+        return not snapshot.IsUntracked(snapshot.RelativePath(path) or u'')
 
     def findRoot(self, path):
         """Find the repository root for given path"""
@@ -154,6 +359,94 @@ class GIT(SourceControl.SourceControl):
 
         return history
 
+    def historyPage(self, paths, skip=0, count=None, history=None):
+        """Get a page of the combined history of the given paths. Only one
+        git log call is made per repository.
+        @param paths: list of paths
+        @keyword skip: number of newest commits to skip
+        @keyword count: max number of commits to get (None for all)
+        @keyword history: list to store the history in
+
+        """
+        if history is None:
+            history = list()
+
+        # Group the paths by repository
+        repos = dict()
+        for path in paths:
+            path = os.path.normpath(path)
+            repo = self.findRoot(path)
+            if repo is None:
+                continue
+            rel = path[len(repo):]
+            repos.setdefault(repo, list()).append(rel or '.')
+
+        # The pages of more than one repository are merged by date, so the
+        # entries to skip can come from any of them. Get everything up to
+        # the end of the page from each one and slice the merged history.
+        merge = len(repos) > 1
+        first = len(history)
+        for repo, files in repos.iteritems():
+            if merge:
+                options = ['log', '-z', LOG_FORMAT]
+                if count:
+                    options.append('--max-count=%d' % (skip + count))
+            else:
+                options = ['log', '-z', LOG_FORMAT, '--skip=%d' % skip]
+                if count:
+                    options.append('--max-count=%d' % count)
+            if len(files) == 1 and files[0] != '.':
+                hpath = os.path.join(repo, files[0])
+            else:
+                hpath = repo
+
+            out = self.run(repo, options + ['--'] + files)
+            if out is None:
+                continue
+
+            pending = ''
+            while True:
+                chunk = out.stdout.read(65536)
+                if not chunk:
+                    break
+                records = (pending + chunk).split('\0')
+                pending = records.pop()
+                for record in records:
+                    self.parseLogRecord(hpath, record, history)
+            self.parseLogRecord(hpath, pending, history)
+            self.logOutput(out)
+
+        if merge:
+            merged = history[first:]
+            merged.sort(key=lambda x: x['date'], reverse=True)
+            if count:
+                merged = merged[skip:skip + count]
+            else:
+                merged = merged[skip:]
+            history[first:] = merged
+        return history
+
+    def parseLogRecord(self, path, record, history):
+        """Parse a single record of the paged log output
+        @param path: path the history is for
+        @param record: LOG_FORMAT record
+        @param history: list to add the history item to
+
+        """
+        fields = record.lstrip('\n').split('\x1f', 3)
+        if len(fields) != 4:
+            return
+
+        rev, author, stamp, log = fields
+        try:
+            date = datetime.datetime.fromtimestamp(int(stamp))
+        except ValueError:
+            return
+
+        history.append(dict(path=path, revision=DecodeString(rev),
+                            author=DecodeString(author), date=date,
+                            log=DecodeString(log).strip()))
+
     def remove(self, paths):
         """ Recursively remove paths from source control """
         # Reverse paths so that files get deleted first
@@ -175,121 +468,55 @@ class GIT(SourceControl.SourceControl):
 
     def status(self, paths, recursive=False, status=None):
         """Get the status of all given paths """
-        # NOTE: uptodate files are not listed in output of status
-        codes = {' ':'uptodate', 'N':'added', 'C':'conflict', 'D':'deleted',
-                 'M':'modified'}
-
-        def modpath(fname):
-            fname = fname.strip().rstrip(os.sep)
-            fname = fname.replace(relpath, '', 1).lstrip(os.sep)
-            return fname
+        if status is None:
+            status = dict()
 
         root, files = self.splitFiles(paths)
-        out = self.run(root, ['status'] + files)
-        repo = self.findRoot(root)
-        relpath = root.replace(repo, '', 1).lstrip(os.sep)
-        unknown = list()
-        if out is not None:
-            # Check to see that the directory is actually being managed by git.
-            # It is possible that the directory is below a git root but not
-            # under git's control (for example a build directory).
-            for line in out.stderr:
-                if "did not match any file" in line:
-                    self.logOutput(out)
-                    return status
-            
-            save = []
-            for line in out.stdout:
-                # save the stdout so it can be parsed again below
-                save.append(line)
-                
-                self.log(line)
-                current = dict()
-                line = line.lstrip('#').strip()
-                if line.startswith('new file:'):
-                    fname = line.replace('new file:', '', 1).strip()
-                    status[modpath(fname)] = dict(status='added')
-                elif line.startswith('modified:'):
-                    fname = line.replace('modified:', '', 1).strip()
-                    status[modpath(fname)] = dict(status='modified')
-                elif line.startswith('deleted:'):
-                    fname = line.replace('deleted:', '', 1).strip()
-                    status[modpath(fname)] = dict(status='deleted')
-                else:
-                    continue
-            
-            # Some untracked files are listed in the git output and don't show
-            # up in the git-ls-files below.  Note that the files are relative
-            # to the root directory and not the repository directory.
-            untracked = self.parseOutputForUntrackedFiles(repo, save)
-            for fname in untracked:
-                relname = fname.replace(repo, '', 1).lstrip(os.sep)
-                unknown.append(relname)
-
-        if out is not None:
-            self.logOutput(out)
+        snapshot = self.statusSnapshot(root)
+        if snapshot is None:
+            return status
 
-        # Find other untracked files that don't show up in the git-status output
-        out = self.run(root, ['ls-files', '--others', '-t'] + files)
-        if out:
-            for line in out.stdout:
-                self.log(line)
-                if len(line):
-                    fname = line.lstrip('?').strip()
-                    unknown.append(modpath(fname))
+        if not files or files == ['.']:
+            return snapshot.GetStatus(root, recursive, status)
 
-        if out is not None:
-            self.logOutput(out)
+        for fname in files:
+            snapshot.GetStatus(os.path.join(root, fname), recursive, status)
+        return status
 
-        # Find up to date files
-        unknown += status.keys()
-        for path in os.listdir(root):
-            if path not in unknown:
-                status[path] = dict(status='uptodate')
+    def statusSnapshot(self, path):
+        """Get the status of the whole working tree that path belongs to
+        with a single git status call.
+        @param path: any path in the repository
+        @return: GitStatusSnapshot or None
 
-        return status
+        """
+        repo = self.findRoot(path)
+        if repo is None:
+            return None
 
-    def untrackedFiles(self, path):
-        """ Find the untracked files under the given path """
-        root = self.splitFiles(path)[0]
-        repo = self.findRoot(root)
-        out = self.run(root, ['status'], mergeerr=True)
-        unknown = list()
-        if out:
-            unknown = self.parseOutputForUntrackedFiles(repo, out.stdout)
+        for options in (STATUS_V2, STATUS_V1):
+            out = self.run(repo, options)
+            if out is None:
+                return None
+
+            snapshot = GitStatusSnapshot(repo)
+            snapshot.Parse(out.stdout)
+            err = out.stderr.read()
             self.closeProcess(out)
-        return unknown
-    
-    def parseOutputForUntrackedFiles(self, repo, output):
-        """Parse git-status output and return all untracked files"""
-        unknown = list()
-        start_unknown = False
-        for line in output:
-            if start_unknown:
-                line = line.strip()
-                if re.search(UNKPAT, line):
-                    tmp = line.split(u"#", 1)
-                    tmp = os.path.normpath(os.path.join(repo, tmp[-1].strip()))
-                    unknown.append(tmp)
-                elif re.search(RELPAT, line):
-                    tmp = line.split(u"#", 1)[-1].strip()
-                    if tmp == u'.' + os.sep and repo not in unknown:
-                        unknown.append(repo)
-                    else:
-                        btrack = tmp.count(u"..")
-                        rpath = repo.rsplit(os.sep, btrack)[0]
-                        npath = tmp.split(os.sep, btrack)[-1]
-                        unknown.append(os.path.join(rpath, npath))
-                # TODO: There are still some bugs in this when the call
-                #       comes from the isControlled method. Workaround fix
-                #       in UI based on icon status. This still should/needs
-                #       to be fixed though...
+            # Fallback to porcelain v1 for git versions older than 2.11
+            if out.returncode != 0 and 'porcelain' in err:
                 continue
-            elif line.startswith('# Untracked files:'):
-                start_unknown = True
-            else:
-                pass
-        return unknown
+            elif err:
+                self.log(u"[err] " + DecodeString(err))
+            return snapshot
+        return None
+
+    def untrackedFiles(self, path):
+        """ Find the untracked files under the given path """
+        snapshot = self.statusSnapshot(path)
+        if snapshot is None:
+            return list()
+        return [ os.path.join(snapshot.root, x) for x in snapshot.untracked ]
 
     def update(self, paths):
         """ Recursively update paths """
@@ -308,39 +535,88 @@ class GIT(SourceControl.SourceControl):
                 self.logOutput(out)
 
     def fetch(self, paths, rev=None, date=None):
-        """ Fetch a copy of the paths from the repository """
+        """ Fetch a copy of the paths from the repository. The files of each
+        repository are read with a single git cat-file --batch call.
+
+        """
+        if date:
+            self.log("[git] date not currently supported")
+
+        if rev:
+            spec = rev
+        else:
+            spec = 'HEAD'
+
+        # Group the requests by repository keeping the order of the output
         output = []
+        requests = dict()
         for path in paths:
             if os.path.isdir(path):
                 continue
-            root, files = self.splitFiles(path)
+            output.append(None)
             repo = self.findRoot(path)
+            if repo is None:
+                continue
+            relpath = path.replace(repo, u'', 1).strip(os.path.sep)
+            relpath = relpath.replace(os.path.sep, '/')
+            requests.setdefault(repo, list()).append((len(output) - 1,
+                                                      u'%s:%s' % (spec, relpath)))
+
+        for repo, items in requests.iteritems():
+            out = self.run(repo, ['cat-file', '--batch'])
+            if out is None:
+                continue
 
-            # Adjust file names
-            files = [ os.path.join(root, f).replace(repo, u'', 1).strip(os.path.sep) for f in files ]
-            if rev:
-                options = rev + u':%s'
-            else:
-                options = 'HEAD:%s'
-
-            if date:
-                self.logOutput("[git] date not currently supported")
+            names = list()
+            for idx, name in items:
+                if isinstance(name, unicode):
+                    name = name.encode(sys.getfilesystemencoding() or 'utf-8')
+                names.append(name)
+            data, err = out.communicate('\n'.join(names) + '\n')
+            self.closeProcess(out)
+            if err:
+                self.log(u"[err] " + DecodeString(err))
 
-            for f in files:
-                out = self.run(root, ['show'] + [options % f])
-                if out:
-                    content = out.stdout.read() 
-                    self.logOutput(out)
-                    if content.strip():
-                        output.append(content)
-                    else:
-                        output.append(None)
-                else:
-                    output.append(None)
+            blobs = parseCatFileBatch(data, len(items))
+            for (idx, name), content in zip(items, blobs):
+                if content is not None and content.strip():
+                    output[idx] = content
         return output
 
 #-----------------------------------------------------------------------------#
 # Utility functions
+def parseCatFileBatch(data, count):
+    """Split the output of git cat-file --batch into the contents of the
+    requested objects.
+    @param data: output of the command
+    @param count: number of objects that were requested
+    @return: list of strings, None for objects that could not be found
+
+    """
+    results = list()
+    pos = 0
+    while len(results) < count:
+        end = data.find('\n', pos)
+        if end == -1:
+            break
+        header = data[pos:end].split()
+        pos = end + 1
+        # Found objects have a "<sha> <type> <size>" header, others
+        # are reported as "<name> missing" or "<name> ambiguous".
+        if len(header) == 3 and header[2].isdigit() and \
+           header[1] in ('blob', 'tree', 'commit', 'tag'):
+            size = int(header[2])
+            if header[1] == 'blob':
+                results.append(data[pos:pos + size])
+            else:
+                results.append(None)
+            pos += size + 1
+        else:
+            results.append(None)
+
+    results.extend([None] * (count - len(results)))
+    return results
+
 def checkDirectory(directory):
     """Checks if a given directory is the git head"""
     if os.path.isdir(directory):
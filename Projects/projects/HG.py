@@ -30,9 +30,14 @@ class HG(SourceControl.SourceControl):
     """ Mercurial source control class """
     name = 'Mercurial'
     command = 'hg'
+    metadir = '.hg'
 
     def __repr__(self):
         return 'HG.HG()'
+
+    def isFixedRevision(self, rev):
+        """Only full changeset ids always refer to the same changeset"""
+        return bool(re.match('^[0-9a-fA-F]{40}$', rev))
         
 #    def getAuthOptions(self, path):
 #        """ Get the repository authentication info """
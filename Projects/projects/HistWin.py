@@ -24,8 +24,10 @@ __revision__ = "$Revision$"
 #--------------------------------------------------------------------------#
 # Imports
 import wx
+import os
 import re
 import sys
+import bisect
 
 # Local Imports
 from projects.SourceControl import DecodeString
@@ -44,8 +46,13 @@ _ = wx.GetTranslation
 
 DATE_FORMAT = '%Y-%m-%d %I:%M %p'
 
+# Number of log entries to retrieve at a time
+PAGE_SIZE = 200
+
 edEVT_UPDATE_ITEMS = wx.NewEventType()
 EVT_UPDATE_ITEMS = wx.PyEventBinder(edEVT_UPDATE_ITEMS, 1)
+edEVT_HISTORY_PAGE = wx.NewEventType()
+EVT_HISTORY_PAGE = wx.PyEventBinder(edEVT_HISTORY_PAGE, 1)
 class UpdateItemsEvent(wx.PyCommandEvent):
     """Event to signal that items need updating"""
     def __init__(self, etype, eid, value=[]):
@@ -58,11 +65,113 @@ class UpdateItemsEvent(wx.PyCommandEvent):
 
 #--------------------------------------------------------------------------#
 
+class HistoryIndex(object):
+    """Inverted index of the words in a set of history entries. Each word
+    maps to the set of entry indexes that contain it so that a search only
+    has to look at the entries that can match instead of every loaded one.
+
+    """
+    WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+    def __init__(self):
+        super(HistoryIndex, self).__init__()
+
+        # Attributes
+        self._postings = dict()   # word -> set(entry indexes)
+        self._words = list()      # Sorted words for prefix lookups
+        self._dirty = False
+        self._count = 0
+
+    Count = property(lambda self: self._count)
+
+    @classmethod
+    def Tokenize(cls, text):
+        """Split the text into a list of lowercase search words
+        @param text: string
+
+        """
+        return cls.WORD_RE.findall(DecodeString(text).lower())
+
+    def Add(self, item):
+        """Add a history entry to the index
+        @param item: history item dictionary
+        @return: index of the entry
+
+        """
+        idx = self._count
+        self._count += 1
+        text = u' '.join([DecodeString(item['revision']),
+                          item['date'].strftime(DATE_FORMAT),
+                          DecodeString(item['author']),
+                          DecodeString(item['log'])])
+        for word in set(self.Tokenize(text)):
+            posting = self._postings.get(word)
+            if posting is None:
+                self._postings[word] = posting = set()
+                self._dirty = True
+            posting.add(idx)
+        return idx
+
+    def _PrefixPostings(self, prefix):
+        """Get the entries containing a word that starts with prefix"""
+        if self._dirty:
+            self._words = sorted(self._postings)
+            self._dirty = False
+
+        rval = set()
+        start = bisect.bisect_left(self._words, prefix)
+        for word in self._words[start:]:
+            if not word.startswith(prefix):
+                break
+            rval.update(self._postings[word])
+        return rval
+
+    def Search(self, query):
+        """Find the entries matching all words in the query. The last word
+        is matched as a prefix as it may still be being typed.
+        @param query: search string
+        @return: set of matching entry indexes or None if the query is empty
+
+        """
+        words = self.Tokenize(query)
+        if not words:
+            return None
+
+        last = words.pop()
+        postings = list()
+        for word in set(words):
+            posting = self._postings.get(word)
+            if not posting:
+                return set()
+            postings.append(posting)
+
+        # Intersect starting from the smallest posting list
+        postings.sort(key=len)
+        if postings:
+            rval = set(postings[0])
+            for posting in postings[1:]:
+                rval.intersection_update(posting)
+                if not rval:
+                    return rval
+            rval.intersection_update(self._PrefixPostings(last))
+        else:
+            rval = self._PrefixPostings(last)
+        return rval
+
+#--------------------------------------------------------------------------#
+
 SB_INFO = 0
 SB_PROG = 1
 class HistoryWindow(wx.Frame):
-    """Window for displaying the Revision History of a file"""
-    def __init__(self, parent, title, node, data):
+    """Window for displaying the Revision History of a set of files"""
+    def __init__(self, parent, title, nodes):
+        """Create the window
+        @param parent: parent window
+        @param title: window title
+        @param nodes: list of (node, data) tuples to show the history of.
+                      All paths should be in the same repository.
+
+        """
         super(HistoryWindow, self).__init__(parent, title=title,
                                             style=wx.DEFAULT_DIALOG_STYLE)
 
@@ -78,7 +187,7 @@ class HistoryWindow(wx.Frame):
         statbar = eclib.ProgressStatusBar(self)
         statbar.SetStatusWidths([-1, 125])
         self.SetStatusBar(statbar)
-        self._ctrls = HistoryPane(self, node, data)
+        self._ctrls = HistoryPane(self, nodes)
 
         # Layout
         self._DoLayout()
@@ -129,7 +238,7 @@ class HistoryWindow(wx.Frame):
 
 class HistoryPane(wx.Panel):
     """Panel for housing the the history window controls"""
-    def __init__(self, parent, node, data):
+    def __init__(self, parent, nodes):
         super(HistoryPane, self).__init__(parent)
 
         # Attributes
@@ -146,7 +255,8 @@ class HistoryPane(wx.Panel):
                                 style=wx.TE_MULTILINE | wx.TE_READONLY)
         self._btn = wx.Button(self, label=_("Compare Revisions"))
         self._btn.Disable()
-        self.path = data['path']
+        self._nodes = nodes
+        self.paths = [ data['path'] for node, data in nodes ]
         self.selected = -1
 
         # Layout
@@ -161,8 +271,8 @@ class HistoryPane(wx.Panel):
         self.Bind(ScCommand.EVT_CMD_COMPLETE, self.OnEndScCommand)
 
         # Start lookup
-        wx.CallAfter(self.GetParent().StartBusy)
-        self.srcCtrl.ScCommand([(node, data)], 'history', self._list.Populate)
+        self._list.SetPageLoader(self.LoadPage)
+        self._list.LoadNextPage()
 
     def _DoLayout(self):
         """Layout the controls on the panel"""
@@ -193,21 +303,54 @@ class HistoryPane(wx.Panel):
         """Get the ListCtrl used by this window"""
         return self._list
 
+    def LoadPage(self, skip, count):
+        """Start retrieving a page of the history
+        @param skip: number of entries already loaded
+        @param count: number of entries to get
+
+        """
+        wx.CallAfter(self.GetParent().StartBusy)
+        self.srcCtrl.ScCommand(self._nodes, 'historyPage',
+                               self._list.AddPage, skip=skip, count=count)
+
+    def GetComparePath(self):
+        """Get the path to compare the revisions of. If the history is of
+        more than one file the user is asked which one to compare.
+        @return: path or None if cancelled
+
+        """
+        if len(self.paths) == 1:
+            return self.paths[0]
+
+        common = os.path.dirname(os.path.commonprefix(self.paths))
+        choices = [ path[len(common):].lstrip(os.sep) for path in self.paths ]
+        dlg = wx.SingleChoiceDialog(self, _("Choose the file to compare"),
+                                    _("Compare Revisions"), choices)
+        path = None
+        if dlg.ShowModal() == wx.ID_OK:
+            path = self.paths[dlg.GetSelection()]
+        dlg.Destroy()
+        return path
+
     def OnButton(self, evt):
         """Handle button events"""
+        path = self.GetComparePath()
+        if path is None:
+            return
+
         self.GetParent().StartBusy()
         self._btn.Enable(False)
         selected = self.getSelectedItems()
         if not selected:
-            self.srcCtrl.CompareRevisions(self.path)
+            self.srcCtrl.CompareRevisions(path)
         elif len(selected) == 1:
             rev = self._list.GetItem(selected[0], self._list.REV_COL)
             rev = rev.GetText().strip()
-            self.srcCtrl.CompareRevisions(self.path, rev1=rev)
+            self.srcCtrl.CompareRevisions(path, rev1=rev)
         else:
             rev1 = self._list.GetItem(selected[0], self._list.REV_COL).GetText().strip()
             rev2 = self._list.GetItem(selected[-1], self._list.REV_COL).GetText().strip()
-            self.srcCtrl.CompareRevisions(self.path, rev1=rev1, rev2=rev2)
+            self.srcCtrl.CompareRevisions(path, rev1=rev1, rev2=rev2)
 
     def OnEndScCommand(self, evt):
         """Handle when a source control event has completed"""
@@ -286,7 +429,11 @@ class HistoryPane(wx.Panel):
 #-----------------------------------------------------------------------------#
 
 class HistList(eclib.EBaseListCtrl):
-    """List for displaying a files revision history"""
+    """List for displaying a files revision history. The history is
+    retrieved in pages, the next page is requested when the list is
+    scrolled near its end.
+
+    """
     REV_COL  = 0
     DATE_COL = 1
     AUTH_COL = 2
@@ -298,10 +445,21 @@ class HistList(eclib.EBaseListCtrl):
 
         # Attributes
         self._frame = parent.GetTopLevelParent()
-        self._data = {}
+        self._data = list()     # All loaded entries
+        self._shown = list()    # Entries matching the current filter
+        self._query = None      # Indexes matching the current filter
+        self._qtext = u''       # Current filter query
+        self._index = HistoryIndex()
+        self._loader = None     # callable(skip, count)
+        self._loading = False
+        self._complete = False
 
         # Event Handlers
         self.Bind(EVT_UPDATE_ITEMS, self.OnUpdateItems)
+        self.Bind(EVT_HISTORY_PAGE, self.OnHistoryPage)
+        self.Bind(wx.EVT_SCROLLWIN, self.OnScroll)
+        self.Bind(wx.EVT_MOUSEWHEEL, self.OnScroll)
+        self.Bind(wx.EVT_LIST_ITEM_FOCUSED, self.OnScroll)
 
         # Setup columns
         self.InsertColumn(self.REV_COL, _("Rev #"))
@@ -311,39 +469,31 @@ class HistList(eclib.EBaseListCtrl):
 
         self.SendSizeEvent()
 
+    def _PrepItem(self, item):
+        """Add the display fields to a history item"""
+        # Shorten log message for list item
+        if 'shortlog' not in item:
+            item['shortlog'] = log = item['log'].strip()
+            if len(log) > 45:
+                log = DecodeString(log[:45]) + u'...'
+                item['shortlog'] = log
+
+    def _AppendItem(self, item):
+        """Append a row for the history item"""
+        index = self.InsertStringItem(sys.maxint, item['revision'])
+        self.SetStringItem(index, 1, item['date'].strftime(DATE_FORMAT))
+        self.SetStringItem(index, 2, item['author'])
+        self.SetStringItem(index, 3, item['shortlog'])
+
     def OnUpdateItems(self, evt):
-        """ Update and add items to the list """
-        if not self._data:
-            dlg = wx.MessageDialog(self,
-               _('The history information for the requested file could ' \
-                 'not be retrieved.  Please make sure that you have ' \
-                 'network access.'),
-               _('History information could not be retrieved'),
-               style=wx.OK|wx.ICON_ERROR)
-            dlg.ShowModal()
-            dlg.Destroy()
-            self.GetGrandParent().GetParent().Destroy()
-            return
+        """ Update the list to show the given items """
+        items = evt.GetValue()
+        self._shown = items
 
         index = -1
         append = False
         self.Freeze()
-        for item in self._data:
-            # Shorten log message for list item
-            if 'shortlog' not in item:
-                item['shortlog'] = log = item['log'].strip()
-                if len(log) > 45:
-                    log = DecodeString(log[:45]) + u'...'
-                    item['shortlog'] = log
-
-            # Create a key for searching all fields
-            if 'key' not in item:
-                unilog = DecodeString(item['log'])
-                item['key'] = ('%s %s %s %s' % (item['revision'],
-                                               item['date'].strftime(DATE_FORMAT),
-                                               item['author'],
-                                               re.sub(r'\s+', u' ', unilog))).lower()
-
+        for item in items:
             if append:
                 index = self.InsertStringItem(sys.maxint, u'')
             else:
@@ -364,41 +514,105 @@ class HistList(eclib.EBaseListCtrl):
                 self.DeleteItem(i)
 
         self.Thaw()
+        self.CheckLoadMore()
+
+    def OnHistoryPage(self, evt):
+        """Add a newly retrieved page of history to the list"""
+        page = evt.GetValue()
+        self._loading = False
+        self._frame.StopBusy()
+        if not page and not self._data:
+            dlg = wx.MessageDialog(self,
+               _('The history information for the requested file could ' \
+                 'not be retrieved.  Please make sure that you have ' \
+                 'network access.'),
+               _('History information could not be retrieved'),
+               style=wx.OK|wx.ICON_ERROR)
+            dlg.ShowModal()
+            dlg.Destroy()
+            self.GetGrandParent().GetParent().Destroy()
+            return
+        elif page is None:
+            # Retrieval failed, the page is requested again on the next scroll
+            return
+
+        self._complete = len(page) < PAGE_SIZE
+
+        # Index the new items before checking them against the filter
+        first = len(self._data)
+        for item in page:
+            self._PrepItem(item)
+            self._data.append(item)
+            self._index.Add(item)
+        if self._qtext:
+            self._query = self._index.Search(self._qtext)
+
+        # Only the new items need to be added to the view
+        self.Freeze()
+        for idx in xrange(first, len(self._data)):
+            if self._query is None or idx in self._query:
+                item = self._data[idx]
+                self._shown.append(item)
+                self._AppendItem(item)
+        self.Thaw()
+
+        self.CheckLoadMore()
+
+    def OnScroll(self, evt):
+        """Check if more history is needed when the view is scrolled"""
+        evt.Skip()
+        wx.CallAfter(self.CheckLoadMore)
+
+    def CheckLoadMore(self):
+        """Request the next page if the end of the list is visible"""
+        if not self or self._loading or self._complete:
+            return
+
+        visible = self.GetTopItem() + self.GetCountPerPage()
+        if visible >= self.GetItemCount() - (PAGE_SIZE / 4):
+            self.LoadNextPage()
+
+    def LoadNextPage(self):
+        """Request the next page of history from the loader"""
+        if self._loader is not None and not self._loading:
+            self._loading = True
+            self._loader(len(self._data), PAGE_SIZE)
+
+    def SetPageLoader(self, loader):
+        """Set the callable to request pages with
+        @param loader: callable(skip, count)
+
+        """
+        self._loader = loader
 
     def GetFullLog(self, rev, timestamp):
         """Get the full log entry for the given revision"""
-        for item in self._data:
+        for item in self._shown:
             if item['revision'] == rev and \
                item['date'].strftime(DATE_FORMAT) == timestamp:
                 return item['log']
         else:
             return wx.EmptyString
 
-    def Populate(self, data):
-        """Populate the list with the history data
+    def AddPage(self, data):
+        """Add a page of history data to the list
+        @param data: list of history items or None if retrieval failed
         @note: called from background thread!
 
         """
-        if data:
-           data.sort(key=lambda x: x['date'], reverse=True) 
-        self._data = data
-        wx.PostEvent(self, UpdateItemsEvent(edEVT_UPDATE_ITEMS, -1, data))
-        wx.CallAfter(self._frame.StopBusy)
+        wx.PostEvent(self, UpdateItemsEvent(edEVT_HISTORY_PAGE, -1, data))
 
     def Filter(self, query):
-        """ Filter list entries based on search query """
-        query = [x for x in query.strip().lower().split() if x]
-        if query:
-            newdata = []
-            for item in self._data:
-                i = 0
-                for word in query:
-                    if word in item['key']:
-                        i += 1
-                if i == len(query):
-                    newdata.append(item)
+        """ Filter list entries based on search query
+        @param query: words to search the revision, date, author and log for
+
+        """
+        self._qtext = query
+        self._query = self._index.Search(query)
+        if self._query is not None:
+            newdata = [ self._data[idx] for idx in sorted(self._query) ]
         else:
-            newdata = self._data
+            newdata = list(self._data)
 
         evt = UpdateItemsEvent(edEVT_UPDATE_ITEMS, self.GetId(), newdata)
         wx.PostEvent(self, evt)
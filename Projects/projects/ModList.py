@@ -473,23 +473,23 @@ class RepoModList(eclib.EBaseListCtrl):
 
     def ShowRevisionHistory(self):
         """Show the revision history for the selected files
-        @postcondition: History dialog is shown for each selected file
+        @postcondition: History dialog is shown for the selected files
 
         """
         paths = self.GetSelectedPaths()
-        pos = wx.DefaultPosition
-        win = None
-
-        for path in paths:
-            if win is not None:
-                pos = win.GetPosition()
-                pos = (pos[0] + 22, pos[1] + 22)
+        if not paths:
+            return
 
-            # Log lookup and ScCommands are handled by HistoryWindow
-            win = HistoryWindow(self, path, None, dict(path=path))
-            win.Show()
-            if pos != wx.DefaultPosition:
-                win.SetPosition(pos)
+        # All of the files are in the repository being shown so the
+        # history for all of them is retrieved by one window.
+        # Log lookup and ScCommands are handled by HistoryWindow
+        if len(paths) == 1:
+            title = paths[0]
+        else:
+            title = u", ".join([ os.path.basename(path) for path in paths ])
+        nodes = [ (None, dict(path=path)) for path in paths ]
+        win = HistoryWindow(self, title, nodes)
+        win.Show()
 
     def UpdatePathStatus(self, path):
         """Run an status update job
@@ -500,6 +500,7 @@ class RepoModList(eclib.EBaseListCtrl):
         src_c = self._ctrl.GetSCSystem(path)
         if src_c is not None:
             self._path = path
+            self._ctrl.InvalidateStatus(path)
             ed_thread.EdThreadPool().QueueJob(self._ctrl.StatusWithTimeout,
                                               src_c, None, dict(path=path),
                                               dict(recursive=True))
@@ -69,8 +69,6 @@ __scid__ = "$Id$"
 # Imports
 import wx
 import os
-import time
-import threading
 import stat
 import fnmatch
 import re
@@ -82,6 +80,7 @@ import wx.lib.delayedresult
 import projects.ConfigDialog as ConfigDialog
 import projects.ScCommand as ScCommand
 import projects.FileIcons as FileIcons
+import projects.DirWatcher as DirWatcher
 from projects.HistWin import HistoryWindow
 import projects.ProjCmnDlg as ProjCmnDlg
 
@@ -103,6 +102,10 @@ EVEN_PROJECT_COLOR = wx.SystemSettings_GetColour(wx.SYS_COLOUR_3DLIGHT)
 ODD_BACKGROUND_COLOR = wx.SystemSettings_GetColour(wx.SYS_COLOUR_LISTBOX)
 EVEN_BACKGROUND_COLOR = wx.SystemSettings_GetColour(wx.SYS_COLOUR_LISTBOX)
 
+# Folder expansion
+EXPAND_CHUNK = 200  # Nodes added per pass of the event loop
+EXPAND_PAGE = 1000  # Nodes shown before the "Show more" node
+
 # i18n support
 _ = wx.GetTranslation
 
@@ -195,66 +198,47 @@ class SyncNodesEvent(SimpleEvent):
 
 #-----------------------------------------------------------------------------#
 
-class WatcherThread(threading.Thread):
-    """Thread class for monitoring directories for changes"""
-    def __init__(self, parent, path, flag=True, data=None, delay=2):
-        super(WatcherThread, self).__init__()
+class ExpandJob(object):
+    """State of a directory node whose contents are being added"""
+    def __init__(self, node, path):
+        super(ExpandJob, self).__init__()
 
         # Attributes
-        self.parent = parent
+        self.node = node
         self.path = path
-        self.flag = flag
-        self.data = data
-        self.delay = max(1, int(delay))
-
-    def run(self):
-        """Start the watcher"""
-        # Continuously compare directory listings for
-        old = self.getMTime(self.path)
-        while True:
-            if not self.flag:
-                return
+        self.entries = list()   # [(name, isdir, haschildren),] in tree order
+        self.pos = 0            # Entries added so far
+        self.limit = 0          # End of the current page
+        self.skip = set()       # Names added or deleted by a sync
+        self.error = None
+        self.placeholder = None # Loading node
+        self.more = None        # Show more node
+
+    def Read(self, filters):
+        """Read the directory contents, called on a worker thread
+        @param filters: fnmatch patterns of names to leave out
 
-            modified, added = [], []
-            new = self.getMTime(self.path)
-
-            for key, mtime in new.items():
-                if key not in old:
-                    added.append(key)
-                else:
-                    if mtime > old[key]:
-                        modified.append(key)
-                    del old[key]
-            deleted = old.keys()
-
-            # Set file list up for next pass
-            old = new
-
-            # Do callback if something changed
-            if added or modified or deleted:
-                evt = SyncNodesEvent(ppEVT_SYNC_NODES, -1,
-                                     (added, modified, deleted, self.data))
-                wx.PostEvent(self.parent, evt)
-
-            # Check for the kill signal every second until the delay is finished
-            for i in xrange(self.delay):
-                if not self.flag:
-                    return
-                time.sleep(1)
-
-    @staticmethod
-    def getMTime(path):
-        """ Get last modified times of all items in path """
-        fileinfo = {}
-        try:
-            for item in os.listdir(path):
-                try:
-                    fileinfo[item] = os.stat(os.path.join(path, item))[stat.ST_MTIME]
-                except OSError:
-                    pass
-        except OSError:
-            pass
-        return fileinfo
+        """
+        entries = list()
+        for name in os.listdir(self.path):
+            if name.endswith('\r'):
+                continue
+            for pattern in filters:
+                if fnmatch.fnmatchcase(name, pattern):
+                    break
+            else:
+                itempath = os.path.join(self.path, name)
+                isdir = os.path.isdir(itempath)
+                haschildren = False
+                if isdir:
+                    try:
+                        haschildren = bool(os.listdir(itempath))
+                    except OSError:
+                        pass
+                entries.append((int(not isdir), name.lower(),
+                                name, isdir, haschildren))
+        entries.sort()
+        self.entries = [ entry[2:] for entry in entries ]
 
 #-----------------------------------------------------------------------------#
 
@@ -267,18 +251,19 @@ class MyTreeCtrl(wx.TreeCtrl):
 
     def OnCompareItems(self, item1, item2):
         """Compare the text of two tree items"""
+        # Nodes without data (loading, show more) go after the files
         data = self.GetPyData(item1)
         if data is not None:
             path1 = int(not os.path.isdir(data['path']))
         else:
-            path1 = 0
+            path1 = 2
         tup1 = (path1, self.GetItemText(item1).lower())
 
         data2 = self.GetPyData(item2)
         if data2 is not None:
             path2 = int(not os.path.isdir(data2['path']))
         else:
-            path2 = 0
+            path2 = 2
         tup2 = (path2, self.GetItemText(item2).lower())
 
         #self.log.WriteText('compare: ' + t1 + ' <> ' + t2 + '\n')
@@ -332,9 +317,12 @@ class ProjectTree(wx.Panel):
         self.config = ConfigDialog.ConfigData()
         self.srcCtrl = ScCommand.SourceController(self)
 
-        # Threads that watch directories corresponding to open folders
+        # Service that watches directories corresponding to open folders
         self._ttimer = wx.Timer(self) # Thread cleanup timer
-        self.watchers = {}
+        self.watcher = DirWatcher.DirectoryWatchService(self._OnDirChanged)
+
+        # Folders being filled in, path -> ExpandJob
+        self._expanding = dict()
 
         # Information for copy/cut/paste of files
         self.clipboard = {'files' : [], 'delete' : False}
@@ -353,6 +341,7 @@ class ProjectTree(wx.Panel):
         # Bind events
         self.Bind(wx.EVT_TREE_ITEM_EXPANDING, self.OnItemExpanding, self.tree)
         self.Bind(wx.EVT_TREE_ITEM_COLLAPSED, self.OnItemCollapsed, self.tree)
+        self.Bind(wx.EVT_TREE_DELETE_ITEM, self.OnDeleteItem, self.tree)
         #self.Bind(wx.EVT_TREE_BEGIN_LABEL_EDIT, self.OnBeginEdit, self.tree)
         self.Bind(wx.EVT_TREE_END_LABEL_EDIT, self.OnEndEdit, self.tree)
         self.Bind(wx.EVT_TREE_ITEM_ACTIVATED, self.OnActivate, self.tree)
@@ -387,7 +376,8 @@ class ProjectTree(wx.Panel):
         self.Bind(wx.EVT_MENU,
                   lambda evt: self.onPopupPaste(), id=ID_POPUP_PASTE)
         self.Bind(wx.EVT_MENU,
-                  lambda evt: self.scStatus(self.getSelectedNodes()),
+                  lambda evt: self.scStatus(self.getSelectedNodes(),
+                                            refresh=True),
                   id=ID_POPUP_REFRESH)
         self.Bind(wx.EVT_MENU,
                   lambda evt: self.onPopupSCDiff(), id=ID_POPUP_DIFF)
@@ -433,9 +423,8 @@ class ProjectTree(wx.Panel):
             ed_msg.Unsubscribe(self.OnPageChanged)
             ed_msg.Unsubscribe(self.OnPageClosing)
 
-            # Kill all watcher threads
-            for watcher in self.watchers.keys():
-                watcher.flag = False
+            # Stop the directory watcher
+            self.watcher.Shutdown()
 
     def _setupIcons(self):
         """ Setup the icons used by the tree and menus """
@@ -502,9 +491,6 @@ class ProjectTree(wx.Panel):
             path = data['path']
             if path not in projects:
                 data = data.copy()
-                if 'watcher' in data:
-                    data['watcher'].flag = False
-                    del data['watcher']
                 del data['path']
 
                 self.config.addProject(path, options=data)
@@ -644,16 +630,35 @@ class ProjectTree(wx.Panel):
         if not parent.IsOk():
             return
 
+        # The working tree changed so the cached status is stale
+        data = self.tree.GetPyData(parent)
+        if data is not None and 'path' in data:
+            self.srcCtrl.InvalidateStatus(data['path'])
+
+            # Repository created or removed
+            markers = [ getattr(sc['instance'], 'metadir', None)
+                        for sc in self.config.getSCSystems().values() ]
+            for name in added + deleted:
+                if name in markers:
+                    self.srcCtrl.InvalidateDetection(data['path'])
+                    break
+
         for child in self.getChildren(parent):
             children[self.tree.GetItemText(child)] = child
 
+        # Leave the synced names out of the nodes still to be added
+        if data is not None and data.get('path') in self._expanding:
+            job = self._expanding[data['path']]
+            job.skip.update([ os.path.basename(name)
+                              for name in added + deleted ])
+
         # Sort so that files in directories get operated on
         # before the directories themselves
         added = list(reversed(sorted(added)))
         modified = list(reversed(sorted(modified)))
         deleted = list(reversed(sorted(deleted)))
 
-        # Collapse all directory nodes so their watcher threads are cleaned up
+        # Collapse all directory nodes so their watches are cleaned up
         for item in deleted:
             if item in children:
                 node = children[item]
@@ -710,28 +715,11 @@ class ProjectTree(wx.Panel):
         self.tree.Refresh()
 
     def OnThreadCleanup(self, evt):
-        """Cleanup watcher threads"""
-        anyalive = False
-        to_del = list()
-        for t, needjoin in self.watchers.iteritems():
-            if needjoin:
-                if t.isAlive():
-                    t.join(.1)
-
-                if t.isAlive():
-                    anyalive = True
-                else:
-                    to_del.append(t)
-
-        # Cleanup the map of dead threads
-        for t in to_del:
-            del self.watchers[t]
-
-        # Cleanup SourceController threads
+        """Cleanup source control threads"""
         scthreads = self.srcCtrl.CleanupThreads()
 
         # If still alive wait another second and check again
-        if anyalive or bool(scthreads):
+        if bool(scthreads):
             self._ttimer.Start(1000, True)
 
     def OnUpdateFont(self, msg):
@@ -849,10 +837,19 @@ class ProjectTree(wx.Panel):
                 os.rename(path, newpath)
                 data['path'] = newpath
             except OSError:
-                pass
+                return
+
+            # Move the watch of an expanded folder to its new name
+            if self.watcher.IsWatching(path):
+                self.watcher.RemoveWatch(path, node)
+                self.watcher.AddWatch(newpath, node)
 
     def OnItemExpanding(self, event):
-        """When an item is expanded, track the contents of that directory"""
+        """When an item is expanded, track the contents of that directory.
+        The directory is read in the background and the nodes are added a
+        chunk at a time so that large directories don't block the ui.
+
+        """
         parent = event.GetItem()
         if not parent:
             return
@@ -862,33 +859,122 @@ class ProjectTree(wx.Panel):
             return
 
         path = data['path']
-        if not os.path.isdir(path):
+        if not os.path.isdir(path) or path in self._expanding:
             return
 
-        try:
-            for item in os.listdir(path):
-                self.addPath(parent, item)
-        except (OSError, IOError), msg:
-            util.Log("[projects][err] OnItemExpanding: %s" % msg)
+        # Show the dummy node from self.addFolder while loading
+        job = ExpandJob(parent, path)
+        job.placeholder = self.tree.GetFirstChild(parent)[0]
+        if job.placeholder.IsOk():
+            self.tree.SetItemText(job.placeholder, _("Loading..."))
+        else:
+            job.placeholder = self.tree.AppendItem(parent, _("Loading..."))
+        self._expanding[path] = job
+
+        filters = self.config.getFilters()
+        def read():
+            """Read the directory"""
+            try:
+                job.Read(filters)
+            except (OSError, IOError), msg:
+                job.error = msg
+            wx.CallAfter(self._OnDirectoryRead, job)
+        ed_thread.EdThreadPool().QueueJob(read)
+
+    def _OnDirectoryRead(self, job):
+        """Start adding the nodes of a directory that was read
+        @param job: ExpandJob
+
+        """
+        if not self or self._expanding.get(job.path, None) is not job:
+            return # Destroyed or collapsed while reading
+
+        parent = job.node
+        if job.error is not None:
+            util.Log("[projects][err] OnItemExpanding: %s" % job.error)
+            del self._expanding[job.path]
             self.tree.SetItemImage(parent, self.icons['folder-inaccessible'],
                                    wx.TreeItemIcon_Normal)
             self.tree.SetItemImage(parent, self.icons['folder-inaccessible'],
                                    wx.TreeItemIcon_Expanded)
-            self.tree.Delete(self.tree.GetFirstChild(parent)[0])
+            self.tree.Delete(job.placeholder)
+        elif not job.entries:
+            # Empty folder, put the dummy node back and collapse it
+            del self._expanding[job.path]
+            self.tree.SetItemText(job.placeholder, '')
+            self.tree.Collapse(parent)
+        else:
+            job.limit = min(len(job.entries), EXPAND_PAGE)
+            self.addDirectoryWatcher(parent)
+            self._addChunk(job)
+
+    def _addChunk(self, job):
+        """Add the next chunk of nodes of the current page of a directory
+        @param job: ExpandJob
+
+        """
+        if not self or self._expanding.get(job.path, None) is not job:
             return
 
-        # Delete dummy node from self.addFolder
-        if self.tree.GetChildrenCount(parent):
-            self.tree.Delete(self.tree.GetFirstChild(parent)[0])
-            self.tree.SortChildren(parent)
-            self.addDirectoryWatcher(parent)
-            self.scStatus([parent])
+        parent = job.node
+        end = min(job.pos + EXPAND_CHUNK, job.limit)
+        self.tree.Freeze()
+        try:
+            for name, isdir, haschildren in job.entries[job.pos:end]:
+                if name not in job.skip:
+                    self.addPath(parent, name, isdir, haschildren)
+        finally:
+            self.tree.Thaw()
+        job.pos = end
+        if job.pos < job.limit:
+            wx.CallAfter(self._addChunk, job)
+            return
+
+        # The page is done, replace the loading node
+        self.tree.Delete(job.placeholder)
+        job.placeholder = None
+        remaining = len(job.entries) - job.pos
+        if remaining:
+            job.more = self.tree.AppendItem(parent,
+                                            _("Show %d more...") % remaining)
         else:
-            # Is empty folder so clear has children flag and veto
-            # event as it causes the tree ctrl to become emptied on msw.
-#            self.tree.SetItemHasChildren(parent, False)
-            event.Veto()
-    
+            del self._expanding[job.path]
+
+        self.scStatus([parent])
+
+    def showMore(self, node):
+        """Add the next page of nodes to a directory
+        @param node: "Show more" node that was activated
+        @return: bool (False if node isn't a "Show more" node)
+
+        """
+        parent = self.tree.GetItemParent(node)
+        data = self.tree.GetPyData(parent)
+        if not data or 'path' not in data:
+            return False
+
+        job = self._expanding.get(data['path'], None)
+        if job is None or job.more != node:
+            return False
+
+        self.tree.SetItemText(node, _("Loading..."))
+        job.placeholder = node
+        job.more = None
+        job.limit = min(len(job.entries), job.pos + EXPAND_PAGE)
+        self._addChunk(job)
+        return True
+
+    def OnDeleteItem(self, event):
+        """Stop filling in a directory whose node was deleted"""
+        item = event.GetItem()
+        if item:
+            data = self.tree.GetPyData(item)
+            if data and 'path' in data:
+                job = self._expanding.get(data['path'], None)
+                if job is not None and job.node == item:
+                    del self._expanding[data['path']]
+        event.Skip()
+
     def scExecuteCommand(self, nodes):
         """ Execute a custom command with the current control system"""
 
@@ -936,18 +1022,44 @@ class ProjectTree(wx.Panel):
         """ Send an checkout command to current control system """
         self.scCommand(nodes, 'checkout')
 
-    def scStatus(self, nodes):
-        """ Send an status command to current control system """
-        self.scCommand(nodes, 'status')
+    def scStatus(self, nodes, refresh=False):
+        """ Send an status command to current control system
+        @keyword refresh: bypass the cached status
+
+        """
+        self.scCommand(nodes, 'status', refresh=refresh)
 
     def scHistory(self, nodes):
         """ Open source control history window """
         if not nodes:
             return
 
+        # Open one window per repository so that the history of all of the
+        # selected files in it is retrieved together.
+        repos = dict()
+        order = list()
         for node in self.getSelectedNodes():
             data = self.tree.GetPyData(node)
-            win = HistoryWindow(self, data['path'], node, data)
+            if data is None or 'path' not in data:
+                continue
+            sc = self.srcCtrl.GetSCSystem(data['path'])
+            repo = None
+            if sc is not None:
+                repo = sc['instance'].getRepository(data['path'])
+            if repo is None:
+                repo = data['path']
+            if repo not in repos:
+                order.append(repo)
+            repos.setdefault(repo, list()).append((node, data))
+
+        for repo in order:
+            items = repos[repo]
+            if len(items) == 1:
+                title = items[0][1]['path']
+            else:
+                title = u", ".join([ os.path.basename(data['path'])
+                                     for node, data in items ])
+            win = HistoryWindow(self, title, items)
             win.Show()
 
     def scCommit(self, nodes):
@@ -1089,12 +1201,13 @@ class ProjectTree(wx.Panel):
 
         self.GetParent().StopBusy()
 
-    def prepUpdates(self, node, data, status, sc):
+    def prepUpdates(self, node, data, status, sc, snapshot=None):
         """Prepare the tree updates
         @param node: node to update
         @param data: node data
         @param status: source control status dictionary
         @param sc: Source control system
+        @keyword snapshot: repository status snapshot the status came from
 
         """
         updates = list()
@@ -1120,11 +1233,13 @@ class ProjectTree(wx.Panel):
                         updates.append((self.tree.SetItemImage, child,
                                         icon, wx.TreeItemIcon_Expanded))
 
-                    # Update children status if opened
+                    # Update children status if opened, answered from the
+                    # same repository snapshot when possible.
                     if child.IsOk() and self.tree.IsExpanded(child):
                         self.srcCtrl.StatusWithTimeout(sc,
                                                        child,
-                                                       self.tree.GetPyData(child))
+                                                       self.tree.GetPyData(child),
+                                                       snapshot=snapshot)
                 else:
                     icon = self.icons.get('file-' + \
                                           status[text].get('status', ''))
@@ -1195,11 +1310,20 @@ class ProjectTree(wx.Panel):
         # Run the actual Diff job
         self.srcCtrl.CompareRevisions(path)
 
+    def _OnDirChanged(self, added, modified, deleted, node):
+        """DirectoryWatchService callback, called from the service thread.
+        Posts the changes back to the tree for synchronization.
+
+        """
+        evt = SyncNodesEvent(ppEVT_SYNC_NODES, -1,
+                             (added, modified, deleted, node))
+        wx.PostEvent(self, evt)
+
     def addDirectoryWatcher(self, node):
         """
-        Add a directory watcher thread to the given node
+        Add a directory watch for the given node
 
-        Directory watchers keep tree nodes and the file system
+        Directory watches keep tree nodes and the file system
         constantly in sync
 
         Required Arguments:
@@ -1214,17 +1338,11 @@ class ProjectTree(wx.Panel):
         except wx.PyAssertionError:
             return
 
-        path = data['path']
-        # Start a directory watcher to keep branch in sync.
-        # When the flag variable is emptied, the thread stops.
-        data['watcher'] = WatcherThread(self, path, True, node)
-        data['watcher'].start()
-        # Store reference to the thread so it can be stopped later
-        # NOTE: Mapping points to false and will be set to True if
-        #       the thread should be joined.
-        self.watchers[data['watcher']] = False
-
-    def addPath(self, parent, name):
+        # Subscribe the node to changes in its directory. All directories
+        # share the single watch service thread.
+        self.watcher.AddWatch(data['path'], node)
+
+    def addPath(self, parent, name, isdir=None, haschildren=None):
         """
         Add a file system path to the given node
 
@@ -1235,6 +1353,10 @@ class ProjectTree(wx.Panel):
         parent -- tree node to add the new node to
         name -- name of the item to add
 
+        Optional Arguments:
+        isdir -- the path is a directory (checked if None)
+        haschildren -- the directory isn't empty (checked if None)
+
         Returns: newly created node or None if the path isn't a file or
             directory.  It will also return None if the path is being
             filtered out.
@@ -1261,10 +1383,10 @@ class ProjectTree(wx.Panel):
             self.log("[projects][err] addPath - invalid data: %s" % repr(data))
             return
 
-        parentpath = data['path']
-        itempath = os.path.join(parentpath, name)
-        if os.path.isdir(itempath):
-            node = self.addFolder(parent, name)
+        if isdir is None:
+            isdir = os.path.isdir(os.path.join(data['path'], name))
+        if isdir:
+            node = self.addFolder(parent, name, haschildren)
         else:
             node = self.addFile(parent, name)
 
@@ -1277,7 +1399,7 @@ class ProjectTree(wx.Panel):
             self.tree.SetItemBackgroundColour(node, self.tree.GetItemBackgroundColour(parent))
         return node
 
-    def addFolder(self, parent, name):
+    def addFolder(self, parent, name, haschildren=None):
         """
         Add a folder to the given tree node
 
@@ -1285,6 +1407,9 @@ class ProjectTree(wx.Panel):
         parent -- node to add the folder to
         name -- name of node to add
 
+        Optional Arguments:
+        haschildren -- the folder isn't empty (checked if None)
+
         Returns: newly created node
 
         """
@@ -1294,7 +1419,9 @@ class ProjectTree(wx.Panel):
         # has children.  This item is deleted when the folder is expanded.
         self.tree.AppendItem(node, '')
         fpath = os.path.join(parentpath, name)
-        if len(os.listdir(fpath)):
+        if haschildren is None:
+            haschildren = len(os.listdir(fpath))
+        if haschildren:
             self.tree.SetItemHasChildren(node)
 
         self.tree.SetPyData(node, {'path' : fpath})
@@ -1328,19 +1455,21 @@ class ProjectTree(wx.Panel):
         if not item:
             return
 
-        # Collapse all children first so that their watchers get deleted
+        # Collapse all children first so that their watches get removed
         self.tree.CollapseAllChildren(item)
 
         self.tree.DeleteChildren(item)
         self.tree.AppendItem(item, '')  # <- Dummy node workaround for MSW
 
-        # Kill the watcher thread
+        # Stop watching the folder
         data = self.tree.GetPyData(item)
-        if data and 'watcher' in data:
-            data['watcher'].flag = False
-            self.watchers[data['watcher']] = True
-            if not self._ttimer.IsRunning():
-                self._ttimer.Start(1000, True)
+        if data and 'path' in data:
+            self._expanding.pop(data['path'], None)
+            self.watcher.RemoveWatch(data['path'], item)
+
+        # Reap any finished source control threads
+        if not self._ttimer.IsRunning():
+            self._ttimer.Start(1000, True)
 
     def OnContextMenu(self, event):
         """ Handle showing context menu to show the commands """
@@ -1692,6 +1821,7 @@ class ProjectTree(wx.Panel):
             if data:
                 fname = data.get('path', None)
             if fname is None:
+                self.showMore(node)
                 continue
 
             try:
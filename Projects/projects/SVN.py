@@ -15,9 +15,14 @@ class SVN(SourceControl):
     """ Subversion source control class """
     name = 'Subversion'
     command = 'svn'
+    metadir = '.svn'
 
     def __repr__(self):
         return 'SVN.SVN()'
+
+    def isFixedRevision(self, rev):
+        """Revision numbers are fixed, keywords like HEAD are not"""
+        return rev.isdigit()
         
     def getAuthOptions(self, path):
         """ Get the repository authentication info """
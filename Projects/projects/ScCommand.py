@@ -34,6 +34,7 @@ import ed_thread
 
 # Local Imports
 from projects.ConfigDialog import ConfigData
+from projects.SourceControl import SourceControl, DecodeString
 import projects.diffwin as diffwin
 
 #--------------------------------------------------------------------------#
@@ -136,9 +137,291 @@ def SourceControlTask(parent, pid, task, etype, args=None, kwargs=None):
 
 #--------------------------------------------------------------------------#
 
+class StatusCache(object):
+    """Cache of source control status results by repository. Every
+    repository has a generation number that is increased when its working
+    tree changes, which invalidates all entries taken under an older
+    generation. Entries also expire after ttl seconds. Concurrent requests
+    for the same entry wait for the query that is already running instead
+    of starting another one.
+
+    """
+    def __init__(self, ttl=30):
+        super(StatusCache, self).__init__()
+
+        # Attributes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = dict()    # key -> (repo, generation, time, value)
+        self._pending = dict()    # key -> threading.Event
+        self._generation = dict() # repo -> generation
+
+    def Get(self, key, repo, query, timeout=None):
+        """Get the cached value for key or run query to get it
+        @param key: cache key
+        @param repo: repository the entry belongs to
+        @param query: callable that returns the value (None if it failed)
+        @keyword timeout: max seconds to wait on a query in another thread
+        @return: value or None
+
+        """
+        while True:
+            self._lock.acquire()
+            try:
+                gen = self._generation.setdefault(repo, 0)
+                entry = self._entries.get(key, None)
+                if entry is not None and entry[1] == gen and \
+                   (time.time() - entry[2]) < self.ttl:
+                    return entry[3]
+
+                event = self._pending.get(key, None)
+                if event is None:
+                    # Run the query in this thread
+                    event = threading.Event()
+                    self._pending[key] = event
+                    break
+            finally:
+                self._lock.release()
+
+            event.wait(timeout)
+            if not event.isSet():
+                return None # Timed out
+
+        value = None
+        try:
+            value = query()
+        finally:
+            self._lock.acquire()
+            try:
+                if value is not None and self.ttl > 0:
+                    self._entries[key] = (repo, gen, time.time(), value)
+                del self._pending[key]
+            finally:
+                self._lock.release()
+            event.set()
+        return value
+
+    def Invalidate(self, path=None):
+        """Invalidate the entries of all repositories that contain path or
+        are contained in path.
+        @keyword path: changed path (None to invalidate everything)
+
+        """
+        if path is not None:
+            path = path.rstrip(os.sep) + os.sep
+
+        self._lock.acquire()
+        try:
+            changed = list()
+            for repo in self._generation:
+                rpath = repo.rstrip(os.sep) + os.sep
+                if path is None or path.startswith(rpath) or \
+                   rpath.startswith(path):
+                    self._generation[repo] += 1
+                    changed.append(repo)
+
+            # Drop the entries that can no longer be used
+            for key, entry in self._entries.items():
+                if entry[0] in changed:
+                    del self._entries[key]
+        finally:
+            self._lock.release()
+
+#--------------------------------------------------------------------------#
+
+class DetectionCache(object):
+    """Bounded least recently used cache of source control detection
+    results. Results are stored by directory, for controlled paths under the
+    repository root and for uncontrolled paths (negative results) under each
+    directory that was checked.
+
+    """
+    def __init__(self, maxsize=1024):
+        super(DetectionCache, self).__init__()
+
+        # Attributes
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = dict() # directory -> [(root, system key), tick]
+        self._tick = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def Get(self, path):
+        """Get the cached result for the directory
+        @return: (root, system key) or None if not cached. A negative result
+                 is (None, None).
+
+        """
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(path, None)
+            if entry is None:
+                return None
+            self._tick += 1
+            entry[1] = self._tick
+            return entry[0]
+        finally:
+            self._lock.release()
+
+    def Set(self, path, root, key):
+        """Cache the detection result for the directory
+        @param path: directory path
+        @param root: repository root or None
+        @param key: system key or None
+
+        """
+        self._lock.acquire()
+        try:
+            self._tick += 1
+            self._entries[path] = [(root, key), self._tick]
+            if len(self._entries) > self.maxsize:
+                # Evict the least recently used quarter of the entries
+                lru = sorted(self._entries.iteritems(),
+                             key=lambda item: item[1][1])
+                for dpath, entry in lru[:max(1, self.maxsize / 4)]:
+                    del self._entries[dpath]
+        finally:
+            self._lock.release()
+
+    def Invalidate(self, path=None):
+        """Remove all entries for path and the directories below it, as
+        well as the entries that resolved to a root below path.
+        @keyword path: directory path (None to clear all)
+
+        """
+        self._lock.acquire()
+        try:
+            if path is None:
+                self._entries.clear()
+                return
+
+            path = os.path.normpath(path)
+            prefix = path.rstrip(os.sep) + os.sep
+            for dpath, entry in self._entries.items():
+                root = entry[0][0]
+                if dpath == path or dpath.startswith(prefix) or \
+                   (root is not None and (root == path or
+                                          root.startswith(prefix))):
+                    del self._entries[dpath]
+        finally:
+            self._lock.release()
+
+    def CountLookup(self, hit):
+        """Add a lookup to the statistics
+        @param hit: bool (False for a miss)
+
+        """
+        self._lock.acquire()
+        try:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        finally:
+            self._lock.release()
+
+    def GetStats(self):
+        """Get the cache statistics
+        @return: dict(hits=int, misses=int, size=int)
+
+        """
+        self._lock.acquire()
+        try:
+            return dict(hits=self.hits, misses=self.misses,
+                        size=len(self._entries))
+        finally:
+            self._lock.release()
+
+#--------------------------------------------------------------------------#
+
+class BlobCache(object):
+    """Size bounded least recently used cache of file contents fetched from
+    a repository. Contents are stored by (path, revision) so only fixed
+    revisions should be cached.
+
+    """
+    def __init__(self, maxsize=32 * 1024 * 1024):
+        super(BlobCache, self).__init__()
+
+        # Attributes
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = dict() # (path, revision) -> [content, tick]
+        self._size = 0
+        self._tick = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    Size = property(lambda self: self._size)
+
+    def Get(self, key):
+        """Get the cached content
+        @param key: (path, revision)
+        @return: string or None if not cached
+
+        """
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return None
+            self._tick += 1
+            entry[1] = self._tick
+            return entry[0]
+        finally:
+            self._lock.release()
+
+    def Set(self, key, content):
+        """Cache the content of a file revision. Contents larger than a
+        quarter of the cache size are not stored.
+        @param key: (path, revision)
+        @param content: string
+
+        """
+        if len(content) > self.maxsize / 4:
+            return
+
+        self._lock.acquire()
+        try:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._tick += 1
+            self._entries[key] = [content, self._tick]
+            self._size += len(content)
+            if self._size > self.maxsize:
+                # Evict the least recently used entries until a quarter
+                # of the cache is free.
+                lru = sorted(self._entries.iteritems(),
+                             key=lambda item: item[1][1])
+                for ekey, entry in lru:
+                    if self._size <= (self.maxsize * 3) / 4:
+                        break
+                    del self._entries[ekey]
+                    self._size -= len(entry[0])
+        finally:
+            self._lock.release()
+
+    def Clear(self):
+        """Remove all cached contents"""
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self._size = 0
+        finally:
+            self._lock.release()
+
+#--------------------------------------------------------------------------#
+
 class SourceController(object):
     """Source control command controller"""
-    CACHE = dict()
+    CACHE = DetectionCache()
+    BLOBS = BlobCache()
 
     def __init__(self, owner):
         """Create the SourceController
@@ -153,6 +436,7 @@ class SourceController(object):
         self.config = ConfigData() # Singleton config data instance
         self.tempdir = None
         self.scThreads = {}
+        self._statusCache = StatusCache(self.config.getStatusCacheTTL())
 
         # Number of seconds to allow a source control command to run
         # before timing out
@@ -243,121 +527,346 @@ class SourceController(object):
                                                       rev2=rev2, date2=date2))
 
     def Diff(self, path, rev1, date1, rev2, date2):
-        """ Do the actual diff of two files by sending the files
-        to be compared to the appropriate diff program.
+        """ Do the actual diff of a file, or of the controlled files under
+        a directory, with the builtin diff or the configured diff program.
+        The revisions are fetched into memory with one fetch call and only
+        written to temporary files when an external diff program is used.
+        The builtin diffs of a directory are shown in a single window.
 
         @return: tuple (None, err_code)
-        @todo: cleanup and simplify this method
 
         """
-        # Only do files
-        if os.path.isdir(path):
-            for fname in os.listdir(path):
-                self.CompareRevisions(fname, rev1=rev1, date1=date1,
-                                             rev2=rev2, date2=date2)
-            return
-
-        # Check if path is under source control
         sc = self.GetSCSystem(path)
         if sc is None:
-            return None
+            return (None, SC_ERROR_RETRIEVAL_FAIL)
+
+        if os.path.isdir(path):
+            single = False
+            paths = self._ListFiles(sc, path,
+                                    not (rev1 or date1 or rev2 or date2))
+            diffs = list()
+        else:
+            single = True
+            paths = [path]
+            diffs = None
+
+        if rev1:
+            ext1 = rev1
+        elif date1:
+            ext1 = date1
+        else:
+            ext1 = 'previous'
 
-        content1 = content2 = ext1 = ext2 = None
+        if rev2:
+            ext2 = rev2
+        else:
+            ext2 = date2
 
-        # Grab the first specified revision
-        if rev1 or date1:
-            content1 = sc['instance'].fetch([path], rev=rev1, date=date1)
-            if content1 and content1[0] is None:
-                return (None, SC_ERROR_RETRIEVAL_FAIL)
+        content1 = content2 = None
+        if rev1 or date1 or not (rev2 or date2):
+            content1 = self.FetchRevisions(sc, paths, rev1, date1)
+        if rev2 or date2:
+            content2 = self.FetchRevisions(sc, paths, rev2, date2)
+
+        for idx, fname in enumerate(paths):
+            # Compare two revisions or a revision to the working copy
+            if content1 is not None and content2 is not None:
+                old, oldext = content2[idx], ext2
+                new, newext = content1[idx], ext1
+                if new is None:
+                    old = None
+            elif content1 is not None:
+                old, oldext = content1[idx], ext1
+                new = newext = None
             else:
-                content1 = content1[0]
-                if rev1:
-                    ext1 = rev1
-                elif date1:
-                    ext1 = date1
+                old, oldext = content2[idx], ext2
+                new = newext = None
 
-        # Grab the second specified revision
-        if rev2 or date2:
-            content2 = sc['instance'].fetch([path], rev=rev2, date=date2)
-            if content2 and content2[0] is None:
+            if old is None:
+                if single:
+                    return (None, SC_ERROR_RETRIEVAL_FAIL)
+                continue
+
+            if not self._CompareContents(fname, old, oldext, new, newext,
+                                         single, diffs):
                 return (None, SC_ERROR_RETRIEVAL_FAIL)
+
+        if diffs:
+            # Show all changed files of the directory in one window
+            base = os.path.basename(path.rstrip(os.sep))
+            if content1 is not None and content2 is not None:
+                left = u'%s.%s' % (base, ext2)
+                right = u'%s.%s' % (base, ext1)
             else:
-                content2 = content2[0]
-                if rev2:
-                    ext2 = rev2
-                elif date2:
-                    ext2 = date2
-
-        if not (rev1 or date1 or rev2 or date2):
-            content1 = sc['instance'].fetch([path])
-            if content1 and content1[0] is None:
-                return (None, SC_ERROR_RETRIEVAL_FAIL)
+                left = u'%s.%s' % (base, (content1 is None) and ext2 or ext1)
+                right = path
+            wx.CallAfter(diffwin.ShowDiff, self._parent, left, right,
+                         diffwin.CombineDiffs(diffs))
+
+        return (None, SC_ERROR_NONE)
+
+    def FetchRevisions(self, sc, paths, rev=None, date=None):
+        """Get the contents of a revision of the given files. Contents of
+        fixed revisions (see SourceControl.isFixedRevision) are kept in a
+        size bounded cache, the others are always fetched.
+        @param sc: source control system
+        @param paths: list of file paths
+        @keyword rev: revision
+        @keyword date: date of revision
+        @return: list of strings (None for files that could not be fetched)
+
+        """
+        cacheable = bool(rev) and not date and \
+                    sc['instance'].isFixedRevision(rev)
+        contents = [None] * len(paths)
+        missing = list()
+        for idx, fname in enumerate(paths):
+            content = None
+            if cacheable:
+                content = SourceController.BLOBS.Get((fname, rev))
+            if content is None:
+                missing.append(idx)
             else:
-                content1 = content1[0]
-                ext1 = 'previous'
-
-        if not self.tempdir:
-            self.tempdir = tempfile.mkdtemp()
-
-        # Write temporary files
-        path1 = path2 = None
-        if content1 and content2:
-            path = os.path.join(self.tempdir, os.path.basename(path))
-            path1 = '%s.%s' % (path, ext1)
-            path2 = '%s.%s' % (path, ext2)
-            tfile = open(path1, 'w')
-            tfile.write(content1)
-            tfile.close()
-            tfile2 = open(path2, 'w')
-            tfile2.write(content2)
-            tfile2.close()
-        elif content1:
-            path1 = path
-            path = os.path.join(self.tempdir, os.path.basename(path))
-            path2 = '%s.%s' % (path, ext1)
-            tfile = open(path2, 'w')
-            tfile.write(content1)
-            tfile.close()
-        elif content2:
-            path1 = path
-            path = os.path.join(self.tempdir, os.path.basename(path))
-            path2 = '%s.%s' % (path, ext2)
-            tfile2 = open(path2, 'w')
-            tfile2.write(content2)
-            tfile2.close()
-
-        # If both content retrieval failed exit with error
-        if None in (path2, path1):
-            return (None, SC_ERROR_RETRIEVAL_FAIL)
+                contents[idx] = content
+
+        if missing:
+            fetched = sc['instance'].fetch([ paths[idx] for idx in missing ],
+                                           rev=rev, date=date)
+            for idx, content in zip(missing, fetched or list()):
+                contents[idx] = content
+                if cacheable and content is not None:
+                    SourceController.BLOBS.Set((paths[idx], rev), content)
+        return contents
+
+    def _CompareContents(self, path, old, oldext, new=None, newext=None,
+                         show=True, diffs=None):
+        """Show the differences between a revision of a file and another
+        revision or the working copy.
+        @param path: path of the file
+        @param old: content of the old revision
+        @param oldext: name of the old revision
+        @keyword new: content of the new revision or None for working copy
+        @keyword newext: name of the new revision
+        @keyword show: show the file even if there are no differences
+        @keyword diffs: list to collect builtin diffs in instead of showing
+                        them, as (left name, right name, diff) tuples
+        @return: bool
+
+        """
+        if new is None:
+            try:
+                handle = open(path, 'rb')
+                current = handle.read()
+                handle.close()
+            except (IOError, OSError):
+                return False
+        else:
+            current = new
+
+        if not show and current == old:
+            return True
+
+        base = os.path.basename(path)
+        oldname = u'%s.%s' % (base, oldext)
+        if new is None:
+            newname = path
+        else:
+            newname = u'%s.%s' % (base, newext)
 
         # Run comparison program
         if self.config.getBuiltinDiff() or not self.config.getDiffProgram():
-            diffwin.GenerateDiff(path2, path1, html=True)
-        elif isinstance(path2, basestring) and isinstance(path2, basestring):
-            subprocess.call([self.config.getDiffProgram(), path2, path1])
+            diff = diffwin.GenerateDiff(DecodeString(old).splitlines(True),
+                                        DecodeString(current).splitlines(True))
+            if diffs is not None:
+                diffs.append((oldname, newname, diff))
+            else:
+                wx.CallAfter(diffwin.ShowDiff, self._parent,
+                             oldname, newname, diff)
         else:
-            return (None, SC_ERROR_RETRIEVAL_FAIL)
+            # External programs need the revisions as files
+            if not self.tempdir:
+                self.tempdir = tempfile.mkdtemp()
+            tmpdir = tempfile.mkdtemp(dir=self.tempdir)
+            oldname = os.path.join(tmpdir, oldname)
+            tfile = open(oldname, 'wb')
+            tfile.write(old)
+            tfile.close()
+            if new is not None:
+                newname = os.path.join(tmpdir, newname)
+                tfile = open(newname, 'wb')
+                tfile.write(new)
+                tfile.close()
+            subprocess.call([self.config.getDiffProgram(), oldname, newname])
+        return True
 
-        return (None, SC_ERROR_NONE)
+    def _ListFiles(self, sc, path, modified=False):
+        """Get the controlled files under a directory from its status
+        @param sc: source control system
+        @param path: directory path
+        @keyword modified: only get the files changed in the working copy
+        @return: sorted list of file paths
+
+        """
+        if modified:
+            wanted = ('modified', 'conflict')
+        else:
+            wanted = ('modified', 'conflict', 'uptodate')
+
+        status = self.GetStatus(sc, path, recursive=True)[0]
+        paths = list()
+        for name, info in status.iteritems():
+            fname = os.path.join(path, name)
+            if info.get('status', None) in wanted and \
+               not os.path.isdir(fname):
+                paths.append(fname)
+        return sorted(paths)
 
     def GetSCSystem(self, path):
-        """ Determine source control system being used on path if any
-        @todo: possibly cache paths that are found to be under source control
-               and the systems the belong to in order to improve performance
+        """ Determine source control system being used on path if any.
+        The system is found by looking for the metadata directory of each
+        system in the path's directory and its parents. Results, including
+        negative ones, are cached by directory in a bounded LRU cache that
+        resolves paths by their repository root. Files and directories must
+        also be tracked by the system.
+
+        """
+        path = os.path.normpath(path)
+        if os.path.isdir(path):
+            sc = self._DetectSystem(path, path)
+        else:
+            sc = self._DetectSystem(path, os.path.dirname(path))
+        if sc is not None and not self._IsTracked(sc, path):
+            return None
+        return sc
+
+    def _DetectSystem(self, path, dname):
+        """Find the system that controls the directory dname
+        @param path: path being checked
+        @param dname: directory of path
+        @return: source control system or None
 
         """
-        # XXX: Experimental caching of paths to speed up commands.
-        #      Currently the improvements are quite measurable, need
-        #      to monitor memory usage and end cases though.
         systems = self.config.getSCSystems()
-        if path in SourceController.CACHE:
-            return systems[SourceController.CACHE[path]]
+        cache = SourceController.CACHE
+
+        # Walk up towards the root checking the cache and the file system
+        checked = list()
+        directory = dname
+        while True:
+            result = cache.Get(directory)
+            if result is not None:
+                root, key = result
+                if key is None:
+                    cache.CountLookup(True)
+                    for cpath in checked:
+                        cache.Set(cpath, None, None)
+                    return None
+                instance = systems.get(key, dict()).get('instance', None)
+                if not getattr(instance, 'metadir', None) or \
+                   self._HasMarker(instance, root):
+                    cache.CountLookup(True)
+                    for cpath in checked:
+                        cache.Set(cpath, root, key)
+                    return systems[key]
+
+                # Marker has been removed since the result was cached
+                cache.Invalidate(root)
+                continue
 
+            found = self._FindMarker(systems, directory)
+            if found is not None:
+                cache.CountLookup(False)
+                cache.Set(directory, directory, found)
+                for cpath in checked:
+                    cache.Set(cpath, directory, found)
+                return systems[found]
+
+            checked.append(directory)
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+
+        # Ask the systems that don't have a metadata directory
+        cache.CountLookup(False)
         for key, value in systems.items():
+            if getattr(value['instance'], 'metadir', None):
+                continue
             if value['instance'].isControlled(path):
-                SourceController.CACHE[path] = key
+                cache.Set(dname, dname, key)
                 return value
 
+        for cpath in checked:
+            cache.Set(cpath, None, None)
+        return None
+
+    @staticmethod
+    def _FindMarker(systems, directory):
+        """Find the system whose metadata directory is in directory
+        @return: system key or None
+
+        """
+        for key, value in systems.iteritems():
+            instance = value['instance']
+            if getattr(instance, 'metadir', None) and \
+               SourceController._HasMarker(instance, directory):
+                return key
+        return None
+
+    @staticmethod
+    def _HasMarker(instance, directory):
+        """Does directory have the metadata directory of the system"""
+        metadir = os.path.join(directory, instance.metadir)
+        if not os.path.isdir(metadir):
+            return False
+
+        # Directories with common names (CVS) also need a metadata file
+        metafiles = getattr(instance, 'metafiles', None)
+        if not metafiles:
+            return True
+        for fname in metafiles:
+            if os.path.isfile(os.path.join(metadir, fname)):
+                return True
+        return False
+
+    def _IsTracked(self, sc, path):
+        """Is the file or directory tracked by the system. Systems with a
+        status snapshot are answered from the cached snapshot of the
+        repository, the others are asked directly.
+        @param sc: source control system
+        @param path: file or directory path
+        @return: bool
+
+        """
+        instance = sc['instance']
+        if not self._HasSnapshot(instance):
+            return instance.isControlled(path)
+
+        repo = self._GetWorkingRoot(instance, path)
+        snapshot = self._GetSnapshot(instance, repo, path)
+        if snapshot is None:
+            # Status unknown so go by the metadata directory
+            return True
+        elif os.path.isdir(path):
+            # Directories are tracked unless they or a parent are untracked
+            rel = snapshot.RelativePath(path)
+            return rel is not None and not snapshot.IsUntracked(rel)
+        return bool(snapshot.GetStatus(path))
+
+    def InvalidateDetection(self, path=None):
+        """Clear cached source control detection results for path
+        @keyword path: directory (None to clear all)
+
+        """
+        SourceController.CACHE.Invalidate(path)
+
+    def GetDetectionStats(self):
+        """Get the hit/miss statistics of the detection cache
+        @return: dict(hits=int, misses=int, size=int)
+
+        """
+        return SourceController.CACHE.GetStats()
+
     def IsSingleRepository(self, paths):
         """
         Are all paths from the same repository ?
@@ -400,14 +909,32 @@ class SourceController(object):
         self.scThreads[cjob] = False
 
     def RunScCommand(self, nodes, command, callback, **options):
-        """Does the running of the command
+        """Does the running of the command. The callback of a paged
+        command is always called, with None if the command could not run.
         @param nodes: list [(node, data), (node2, data2), ...]
         @param command: command string
         @param callback: callable or None
         @return: (command, None)
 
         """
-        concurrentcmds = ['status', 'history']
+        if command not in ['historyPage'] or callback is None:
+            return self._RunScCommand(nodes, command, callback, **options)
+
+        # The caller waits for the page so tell it when there won't be one
+        answered = list()
+        def PageCallback(result):
+            answered.append(True)
+            callback(result)
+
+        try:
+            return self._RunScCommand(nodes, command, PageCallback, **options)
+        finally:
+            if not answered:
+                callback(None)
+
+    def _RunScCommand(self, nodes, command, callback, **options):
+        """Run the command, see L{RunScCommand}"""
+        concurrentcmds = ['status', 'history', 'historyPage']
         NODE, DATA, SC = 0, 1, 2
         nodeinfo = []
         sc = None
@@ -451,6 +978,12 @@ class SourceController(object):
             for node, data, sc in nodeinfo:
                 data['sclock'] = command
 
+        # Commands that change the working tree and explicit refresh
+        # requests both make the cached status stale.
+        if options.pop('refresh', False) or command not in concurrentcmds:
+            for node, data, sc in nodeinfo:
+                self.InvalidateStatus(data['path'])
+
         rc = True
         try:
             # Find correct method
@@ -470,7 +1003,8 @@ class SourceController(object):
                     sc['instance'].clearOutputHook()
         finally:
             # Only update status if last command didn't time out
-            if command not in ['history', 'revert', 'update'] and rc:
+            if command not in ['history', 'historyPage', 'revert', 'update'] \
+               and rc:
                 for node, data, sc in nodeinfo:
                     self.StatusWithTimeout(sc, node, data)
 
@@ -481,23 +1015,134 @@ class SourceController(object):
 
         return (command, None)
 
-    def StatusWithTimeout(self, sc, node, data, recursive=False):
-        """Run a SourceControl status command with a timeout
+    def InvalidateStatus(self, path=None):
+        """Invalidate the cached status of the repository containing path
+        @keyword path: path that changed (None to invalidate all)
+
+        """
+        self._statusCache.Invalidate(path)
+
+    def StatusWithTimeout(self, sc, node, data, recursive=False,
+                          snapshot=None):
+        """Run a SourceControl status command with a timeout. Results are
+        shared through the status cache so that a repository is only
+        queried once until its working tree changes.
         @param sc: SourceControll instance
         @param node: tree node, data
         @param data: data dict(path='')
+        @keyword snapshot: repository status snapshot to answer from
 
         """
         status = {}
         try:
-            rval = self._TimeoutCommand(None, sc['instance'].status,
-                                        [data['path']],
-                                        recursive=recursive,
-                                        status=status)
+            status, snapshot = self.GetStatus(sc, data['path'], recursive,
+                                              snapshot)
         except Exception, msg:
             # TODO: needs logging
             print "ERROR:", msg
 
         evt = SourceControlEvent(ppEVT_STATUS, self._pid,
-                                 (node, data, status, sc))
+                                 (node, data, status, sc, snapshot))
         wx.PostEvent(self._parent, evt)
+
+    def GetStatus(self, sc, path, recursive=False, snapshot=None):
+        """Get the status of a path through the status cache
+        @param sc: source control system
+        @param path: absolute path
+        @keyword recursive: include all files below a directory
+        @keyword snapshot: repository status snapshot to answer from
+        @return: (status dict, snapshot or None)
+
+        """
+        status = dict()
+        instance = sc['instance']
+        self._statusCache.ttl = self.config.getStatusCacheTTL()
+
+        # Cache by the working copy directory, as the invalidation is
+        # done by file system path.
+        repo = self._GetWorkingRoot(instance, path)
+
+        # Only reuse the snapshot for paths in the same repository
+        if snapshot is not None and repo != os.path.normpath(snapshot.root):
+            snapshot = None
+
+        if snapshot is None:
+            snapshot = self._GetSnapshot(instance, repo, path)
+
+        if snapshot is not None:
+            snapshot.GetStatus(path, recursive, status)
+        else:
+            # System can't do whole repository status so cache the
+            # result for the path.
+            def query():
+                return self._RunWithTimeout(instance.status, [path],
+                                            recursive=recursive,
+                                            status=dict())
+            rval = self._statusCache.Get((instance.name, path,
+                                          bool(recursive)),
+                                         repo, query, self.scTimeout)
+            if rval is not None:
+                status.update(rval)
+        return status, snapshot
+
+    def _GetSnapshot(self, instance, repo, path):
+        """Get the cached status snapshot of a repository
+        @param instance: SourceControl instance
+        @param repo: working copy directory of path
+        @param path: path in the repository
+        @return: snapshot or None if the system has no snapshots
+
+        """
+        if not self._HasSnapshot(instance):
+            return None
+        return self._statusCache.Get((instance.name, repo), repo,
+                                     lambda: self._RunWithTimeout(
+                                                instance.statusSnapshot, path),
+                                     self.scTimeout)
+
+    @staticmethod
+    def _GetWorkingRoot(instance, path):
+        """Get the nearest directory at or above path that has the
+        metadata directory of the system. This is the working copy root for
+        systems that keep it only at the top and the directory itself for
+        the ones that keep one in every directory (CVS).
+        @param instance: SourceControl instance
+        @param path: absolute path
+        @return: directory path
+
+        """
+        path = os.path.normpath(path)
+        if os.path.isdir(path):
+            directory = path
+        else:
+            directory = os.path.dirname(path)
+
+        metadir = getattr(instance, 'metadir', None)
+        if metadir:
+            root = directory
+            while True:
+                if os.path.exists(os.path.join(root, metadir)):
+                    return root
+                parent = os.path.dirname(root)
+                if parent == root:
+                    break
+                root = parent
+        return directory
+
+    @staticmethod
+    def _HasSnapshot(instance):
+        """Does the system override SourceControl.statusSnapshot"""
+        method = getattr(type(instance), 'statusSnapshot', None)
+        return getattr(method, 'im_func', None) is not \
+               SourceControl.statusSnapshot.im_func
+
+    def _RunWithTimeout(self, method, *args, **kwargs):
+        """Run method with the command timeout
+        @return: return value of method or None if it timed out
+
+        """
+        result = list()
+        self._TimeoutCommand(result.append, method, *args, **kwargs)
+        if len(result):
+            return result[0]
+        return None
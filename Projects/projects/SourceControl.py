@@ -17,7 +17,11 @@ that is used for all source control operations (i.e., cvs, svn, etc.).
 This can also be overridden by the user in the config dialog.  The name
 attribute is simply a string that is displayed in the config dialog when
 changing settings.  For example, 'Subversion' would be for the subversion
-system, 'CVS' for the CVS system, etc.
+system, 'CVS' for the CVS system, etc.  Subclasses should also set metadir
+to the name of the directory the system keeps its metadata in (i.e. '.svn')
+so that controlled paths can be detected without running any commands, and
+metafiles to the files of which one must be in it when the directory name
+is a common one (i.e. 'CVS').
 
 If you have created a new source control system subclass, it can be added
 to the Projects pane in the ConfigDialog package.  Simply import the 
@@ -76,6 +80,12 @@ class SourceControl(object):
     # Name to use in config panel
     name = ''  
 
+    # Name of the directory the system keeps its metadata in
+    metadir = None
+
+    # Files of which at least one must be in metadir (empty for any)
+    metafiles = ()
+
     # Username, password, and environments for given repositories
     repositories = {}
 
@@ -369,6 +379,68 @@ class SourceControl(object):
         except:
             pass
 
+    def statusSnapshot(self, path):
+        """
+        Get the status of the whole repository that contains path
+
+        Systems that can report the status of a whole working tree in one
+        command should override this so that status requests for many
+        paths in the same repository only need to run one command.
+
+        Required Arguments:
+        path -- absolute path to a file or directory in the repository
+
+        Returns: object with a root attribute (the repository path) and a
+            GetStatus(path, recursive, status) method that returns the same
+            dictionary as status, or None if not supported.
+
+        """
+        return None
+
+    def isFixedRevision(self, rev):
+        """
+        Does the revision name always refer to the same revision
+
+        Systems should override this to accept their revision ids, as
+        only the contents of fixed revisions are cached. Names such as
+        branches, tags and HEAD can refer to another revision later.
+
+        Required Arguments:
+        rev -- revision name
+
+        Returns: boolean, False unless overridden
+
+        """
+        return False
+
+    def historyPage(self, paths, skip=0, count=None, history=None):
+        """
+        Retrieve one page of the combined history of the given paths
+
+        Systems that can page through their log should override this to
+        return at most count entries after skipping the newest skip entries.
+        The default implementation returns the complete history as the
+        first page and nothing after that.
+
+        Required Arguments:
+        paths -- list of paths to retrieve the history of
+
+        Keyword Arguments:
+        skip -- number of entries to skip
+        count -- max number of entries to return (None for all)
+        history -- list to store the history elements in
+
+        Returns: list of dictionaries in the same format as history
+
+        """
+        if history is None:
+            history = list()
+
+        if not skip:
+            self.history(paths, history)
+            history.sort(key=lambda x: x.get('date', None), reverse=True)
+        return history
+
     @staticmethod
     def setOutputHook(hook):
         """Hook the output from all logging commands
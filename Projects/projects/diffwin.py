@@ -23,49 +23,66 @@ __revision__ = "$Revision$"
 #--------------------------------------------------------------------------#
 # Dependancies
 import wx
+import wx.stc
 import os
 import tempfile
 import webbrowser
 
 # Local libs
 import difflib
+import projects.DiffEngine as DiffEngine
 
 # Editra libs
 import ed_stc
 import util
 
+#--------------------------------------------------------------------------#
+# Globals
+_ = wx.GetTranslation
+
+# Number of lines to add to the display at a time
+RENDER_CHUNK = 500
+
+# Markers used to highlight the changed lines
+MARK_DEL = 22
+MARK_ADD = 23
+MARK_CHG = 24
+
 #--------------------------------------------------------------------------#
 
 class DiffWindow(wx.Frame):
     """Creates a window for displaying file diffs"""
-    def __init__(self, parent, id, title, files):
-        """Initialize the Window"""
-        wx.Frame.__init__(self, parent, id, title, size=(600, 400))
-        
+    def __init__(self, parent, title, left, right, diff=None):
+        """Initialize the Window
+        @param parent: parent window
+        @param title: window title
+        @param left: path to left file
+        @param right: path to right file
+        @keyword diff: precomputed result of GenerateDiff
+
+        """
+        wx.Frame.__init__(self, parent, title=title, size=(800, 600))
+
         self.CreateStatusBar()
 
         sizer = wx.BoxSizer(wx.VERTICAL)
-#        self._book = DiffBook(self, files)
-#        sizer.Add(self._book, 1, wx.EXPAND)
+        self._panel = DisplayPanel(self, left, right, diff)
+        sizer.Add(self._panel, 1, wx.EXPAND)
         self.SetSizer(sizer)
 
-    def OpenDiffs(self, flist):
-        """Open a list of diffed files
-        @param flist: list of file paths
-        @type flist: [(a1, a2), (b1, b2), ...]
-
-        """
-        self._book.OpenFiles(flist)
-
 #--------------------------------------------------------------------------#
 
 class DisplayPanel(wx.Panel):
-    """Creates a panel for displaying the diff in a side by side"""
-    def __init__(self, parent, left, right):
+    """Creates a panel for displaying the diff in a side by side. The
+    diff is added to the display in chunks as the view is scrolled.
+
+    """
+    def __init__(self, parent, left, right, diff=None):
         """Create the diff panel
         @param parent: parent window of this panel
         @param left: path to left file
         @param right: path to right file
+        @keyword diff: precomputed result of GenerateDiff
 
         """
         wx.Panel.__init__(self, parent)
@@ -75,17 +92,22 @@ class DisplayPanel(wx.Panel):
         self._left = (left, DiffCtrl(self))
         self._left[1].SetUseVerticalScrollBar(False)
         self._right = (right, DiffCtrl(self))
-        self._difftxt = self.Generate()
+        self._lines = (list(), list())
+        self._opcodes = list()
+        self._next = 0      # Index of next opcode to render
+        self._offset = 0    # Rows of the next opcode already rendered
+        if diff is None:
+            diff = self.Generate()
+        if diff is not None:
+            self._lines = diff[:2]
+            self._opcodes = diff[2]
         
         # Layout panel
         self._DoLayout()
         self._PopulateCtrls()
 
         # Event Handlers
-#         self._left[1].Bind(wx.EVT_MOUSEWHEEL, self.OnScrollLeft)
-        self._right[1].Bind(wx.EVT_MOUSEWHEEL, self.OnScrollRight)
-        self._right[1].Bind(wx.EVT_SCROLLBAR, self.OnScrollRight)
-        self._right[1].Bind(wx.EVT_SCROLLWIN, self.OnScrollRight)
+        self._right[1].Bind(wx.stc.EVT_STC_UPDATEUI, self.OnUpdateUI)
 
     def _DoLayout(self):
         """Layout the window"""
@@ -96,26 +118,52 @@ class DisplayPanel(wx.Panel):
         self.SetInitialSize()
 
     def _PopulateCtrls(self):
-        """Populate the text ctrls"""
-        ltxt = GetLines(self._left[0])
-        if ltxt != -1:
-            for line in ltxt:
-                self._left[1].AppendLine(line)
-        rtxt = GetLines(self._right[0])
-        if rtxt != -1:
-            for line in rtxt:
-                self._right[1].AppendLine(line)
-        diffs = 0
-        for item in self._difftxt:
-            if item.startswith(u'+') or item.startswith(u'-'):
-                diffs = diffs + 1
+        """Populate the text ctrls with the first chunk of the diff"""
+        diffs = DiffEngine.CountChanges(self._opcodes)
         self.GetTopLevelParent().SetStatusText("%d Differences" % diffs, 0)
-        self._left[1].SetReadOnly(True)
-        self._right[1].SetReadOnly(True)
+        self.RenderMore()
+
+    def RenderMore(self, count=RENDER_CHUNK):
+        """Add the next rows of the diff to the display. Each change is
+        padded with blank lines so both sides stay aligned.
+        @keyword count: number of rows to add
+
+        """
+        llines, rlines = self._lines
+        ltxt = list()
+        rtxt = list()
+        lmarks = list()
+        rmarks = list()
+        row = self._right[1].GetLineCount() - 1
+        while count > 0 and self._next < len(self._opcodes):
+            tag, i1, i2, j1, j2 = self._opcodes[self._next]
+            rows = max(i2 - i1, j2 - j1)
+            start = self._offset
+            end = min(rows, start + count)
+            ltxt.extend(_Rows(llines, i1 + start, i1 + end, i2))
+            rtxt.extend(_Rows(rlines, j1 + start, j1 + end, j2))
+            if tag != DiffEngine.OP_EQUAL:
+                if tag == DiffEngine.OP_REPLACE:
+                    lmark = rmark = MARK_CHG
+                else:
+                    lmark, rmark = MARK_DEL, MARK_ADD
+                lmarks.extend([ (row + i, lmark) for i in xrange(end - start) ])
+                rmarks.extend([ (row + i, rmark) for i in xrange(end - start) ])
+            row += end - start
+            count -= end - start
+            if end == rows:
+                self._next += 1
+                self._offset = 0
+            else:
+                self._offset = end
+
+        if ltxt or rtxt:
+            self._left[1].AppendLines(ltxt, lmarks)
+            self._right[1].AppendLines(rtxt, rmarks)
 
     def Generate(self):
-        """Generate the diff text from the displays left/right files
-        and refresh the display.
+        """Generate the diff from the displays left/right files
+        @return: (left lines, right lines, opcodes) or None on error
 
         """
         diff = GenerateDiff(self._left[0], self._right[0])
@@ -128,17 +176,21 @@ class DisplayPanel(wx.Panel):
         else:
             return diff
 
-#     def OnScrollLeft(self, evt):
-#         """Make both windows have matching scroll position"""
-#         self._fromleft = True
-#         if not self._fromRight:
-#             wx.PostEvent(self._right[1], evt)
-#         evt.Skip()
+    def OnUpdateUI(self, evt):
+        """Make both windows have matching scroll position and add more
+        of the diff when the end of the display is reached.
 
-    def OnScrollRight(self, evt):
-        """Make both windows have matching scroll position"""
-        wx.PostEvent(self._left[1], evt)
+        """
         evt.Skip()
+        rctrl = self._right[1]
+        first = rctrl.GetFirstVisibleLine()
+        if self._left[1].GetFirstVisibleLine() != first:
+            self._left[1].ScrollToLine(first)
+
+        if self._next < len(self._opcodes):
+            last = first + rctrl.LinesOnScreen()
+            if last >= rctrl.GetLineCount() - (RENDER_CHUNK / 2):
+                self.RenderMore()
 
 #--------------------------------------------------------------------------#
 class DiffCtrl(ed_stc.EditraStc):
@@ -148,7 +200,13 @@ class DiffCtrl(ed_stc.EditraStc):
         
         # Configure the control
         self.FoldingOnOff(False)
-#         self.SetReadOnly(True)
+        self.MarkerDefine(MARK_DEL, wx.stc.STC_MARK_BACKGROUND,
+                          background=wx.Colour(255, 200, 200))
+        self.MarkerDefine(MARK_ADD, wx.stc.STC_MARK_BACKGROUND,
+                          background=wx.Colour(200, 255, 200))
+        self.MarkerDefine(MARK_CHG, wx.stc.STC_MARK_BACKGROUND,
+                          background=wx.Colour(255, 240, 180))
+        self.SetReadOnly(True)
 
     def AppendLine(self, line):
         """Adds a line to the control. The line is checked
@@ -158,32 +216,48 @@ class DiffCtrl(ed_stc.EditraStc):
         """
         self.AppendText(line)
 
+    def AppendLines(self, lines, marks=None):
+        """Add a block of lines to the end of the control
+        @param lines: list of lines ending with a newline
+        @keyword marks: list of (line, marker) tuples to set
+
+        """
+        self.SetReadOnly(False)
+        self.AppendText(''.join(lines))
+        for line, mark in marks or list():
+            self.MarkerAdd(line, mark)
+        self.SetReadOnly(True)
+
 #--------------------------------------------------------------------------#
 # Utility Functions
 
 _tmpfiles = list()
 ERR_DIFF_LFAILED = -1
 ERR_DIFF_RFAILED = -2
-# Unfortunatly wx.html.HtmlWindow does not handle the css generated
-# by difflib so this will use an external webbrowser till wx.webkit
-# is ready.
 def GenerateDiff(left, right, tabwidth=8, html=False):
     """Generate the delta between the two files.
-    @param left: path to left file
-    @param right: path to right file
+    @param left: path to left file or list of its lines
+    @param right: path to right file or list of its lines
     @keyword tabwidth: tab stop spacing (only for html mode)
     @keyword html: If set to True the diff will be generated as HTML and
                    opened as a new tab in the systems webbrowser.
+    @return: (left lines, right lines, opcodes) or an ERR_DIFF_* code
 
     """
     # Get Lines to diff
-    lfile = GetLines(left)
-    if lfile == -1:
-        return ERR_DIFF_LFAILED
+    if isinstance(left, basestring):
+        lfile = GetLines(left)
+        if lfile == -1:
+            return ERR_DIFF_LFAILED
+    else:
+        lfile = left
 
-    rfile = GetLines(right)
-    if rfile == -1:
-        return ERR_DIFF_RFAILED
+    if isinstance(right, basestring):
+        rfile = GetLines(right)
+        if rfile == -1:
+            return ERR_DIFF_RFAILED
+    else:
+        rfile = right
 
     if html:
         gen = difflib.HtmlDiff(tabwidth)
@@ -195,7 +269,41 @@ def GenerateDiff(left, right, tabwidth=8, html=False):
         tmp.close()
         webbrowser.open(name)
     else:
-        return difflib.Differ().compare(lfile, rfile)
+        return (lfile, rfile, DiffEngine.GetOpcodes(lfile, rfile))
+
+def ShowDiff(parent, left, right, diff=None):
+    """Open a window showing the differences between two files
+    @param parent: parent window
+    @param left: path to left file
+    @param right: path to right file
+    @keyword diff: precomputed result of GenerateDiff
+
+    """
+    title = u"%s: %s - %s" % (_("Compare"), os.path.basename(left),
+                              os.path.basename(right))
+    win = DiffWindow(parent, title, left, right, diff)
+    win.Show()
+
+def CombineDiffs(diffs):
+    """Join the diffs of several files to show them in one window. The
+    diff of each file starts with a row holding the names of its sides.
+    @param diffs: list of (left name, right name, GenerateDiff result)
+    @return: (left lines, right lines, opcodes)
+
+    """
+    llines = list()
+    rlines = list()
+    opcodes = list()
+    for left, right, (lfile, rfile, fopcodes) in diffs:
+        i, j = len(llines), len(rlines)
+        llines.append(u"%s\n" % left)
+        rlines.append(u"%s\n" % right)
+        opcodes.append((DiffEngine.OP_EQUAL, i, i + 1, j, j + 1))
+        llines.extend(lfile)
+        rlines.extend(rfile)
+        opcodes.extend([ (tag, i + 1 + i1, i + 1 + i2, j + 1 + j1, j + 1 + j2)
+                         for tag, i1, i2, j1, j2 in fopcodes ])
+    return (llines, rlines, opcodes)
 
 def CleanupTempFiles():
     """Cleanup all temporary diff files"""
@@ -205,6 +313,26 @@ def CleanupTempFiles():
         except OSError:
             pass
 
+def _Rows(lines, start, end, stop):
+    """Get the text for a range of display rows of one side of a change.
+    Rows past the end of the side's lines are left blank.
+    @param lines: all lines of the file
+    @param start: first line index
+    @param end: last line index (exclusive)
+    @param stop: end of the change on this side
+
+    """
+    rows = list()
+    for idx in xrange(start, end):
+        if idx < stop:
+            line = lines[idx]
+            if not line.endswith('\n'):
+                line += '\n'
+            rows.append(line)
+        else:
+            rows.append('\n')
+    return rows
+
 def GetLines(fname):
     """Gets all the lines from the given file
     @return: list of lines or -1 on error
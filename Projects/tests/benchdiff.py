@@ -0,0 +1,74 @@
+###############################################################################
+# Name: benchdiff.py                                                          #
+# Purpose: Benchmark of the line diff engine                                  #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Time DiffEngine.GetOpcodes on large inputs where about 30% of the lines are
+changed. Inputs with few distinct lines have no unique lines to anchor on,
+so all of the work is done by the Myers search.
+
+Usage: python benchdiff.py [lines]
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import sys
+import time
+import random
+sys.path.append('..')
+
+import projects.DiffEngine as DiffEngine
+
+#-----------------------------------------------------------------------------#
+# Globals
+LINES = 100000
+CHANGED = 0.3
+DISTINCT = (100000, 2000, 51)
+
+#-----------------------------------------------------------------------------#
+
+def MakeInput(count, distinct, changed, seed=1):
+    """Make two versions of a file with count lines
+    @return: (a, b) lists of lines
+
+    """
+    rand = random.Random(seed)
+    lines = [ 'line %d\n' % idx for idx in range(distinct) ]
+    a = [ rand.choice(lines) for idx in xrange(count) ]
+    b = list(a)
+    for idx in xrange(count):
+        if rand.random() < changed:
+            b[idx] = rand.choice(lines)
+    return a, b
+
+def main(args):
+    count = LINES
+    if args:
+        count = int(args[0])
+
+    sys.stdout.write('%-10s %10s %10s %10s\n' % \
+                     ('distinct', 'seconds', 'equal', 'changes'))
+    for distinct in DISTINCT:
+        a, b = MakeInput(count, distinct, CHANGED)
+        start = time.time()
+        opcodes = DiffEngine.GetOpcodes(a, b)
+        elapsed = time.time() - start
+        equal = sum([ i2 - i1 for tag, i1, i2, j1, j2 in opcodes
+                      if tag == DiffEngine.OP_EQUAL ])
+        sys.stdout.write('%-10d %10.3f %10d %10d\n' % \
+                         (distinct, elapsed, equal,
+                          DiffEngine.CountChanges(opcodes)))
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,83 @@
+# -*- mode:Python;  cursor-type: (bar. 1)-*-
+import sys, random
+sys.path.append('..')
+
+from nose.tools import *
+
+import projects.DiffEngine as DiffEngine
+
+def apply_opcodes(a, b, opcodes):
+    """Rebuild b from a and the opcodes checking that they are consistent"""
+    result = list()
+    i = j = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        eq_((i1, j1), (i, j))
+        if tag == DiffEngine.OP_EQUAL:
+            eq_(a[i1:i2], b[j1:j2])
+            result.extend(a[i1:i2])
+        else:
+            result.extend(b[j1:j2])
+        i, j = i2, j2
+    eq_((i, j), (len(a), len(b)))
+    return result
+
+class TestDiffEngine(object):
+    def testIdentical(self):
+        lines = ['a\n', 'b\n', 'c\n']
+        eq_(DiffEngine.GetOpcodes(lines, list(lines)),
+            [(DiffEngine.OP_EQUAL, 0, 3, 0, 3)])
+
+    def testEmpty(self):
+        eq_(DiffEngine.GetOpcodes([], []), [])
+        eq_(DiffEngine.GetOpcodes([], ['a\n']),
+            [(DiffEngine.OP_INSERT, 0, 0, 0, 1)])
+        eq_(DiffEngine.GetOpcodes(['a\n'], []),
+            [(DiffEngine.OP_DELETE, 0, 1, 0, 0)])
+
+    def testChange(self):
+        a = ['a\n', 'b\n', 'c\n', 'd\n']
+        b = ['a\n', 'x\n', 'c\n', 'd\n', 'e\n']
+        eq_(DiffEngine.GetOpcodes(a, b),
+            [(DiffEngine.OP_EQUAL, 0, 1, 0, 1),
+             (DiffEngine.OP_REPLACE, 1, 2, 1, 2),
+             (DiffEngine.OP_EQUAL, 2, 4, 2, 4),
+             (DiffEngine.OP_INSERT, 4, 4, 4, 5)])
+
+    def testMinimal(self):
+        # Without unique lines the result comes from the Myers search
+        a = list('abcabba')
+        b = list('cbabac')
+        opcodes = DiffEngine.GetOpcodes(a, b)
+        apply_opcodes(a, b, opcodes)
+        common = sum([ i2 - i1 for tag, i1, i2, j1, j2 in opcodes
+                       if tag == DiffEngine.OP_EQUAL ])
+        eq_(common, 4)
+
+    def testRandom(self):
+        rand = random.Random(42)
+        for count in range(200):
+            a = [ rand.randint(0, 5) for x in range(rand.randint(0, 60)) ]
+            b = [ rand.randint(0, 5) for x in range(rand.randint(0, 60)) ]
+            for maxcost in (DiffEngine.MAX_COST, 3):
+                opcodes = DiffEngine.GetOpcodes(a, b, maxcost=maxcost)
+                eq_(apply_opcodes(a, b, opcodes), b)
+            # Without budget everything is compared by the fallback search
+            opcodes = DiffEngine.GetOpcodes(a, b, maxwork=0)
+            eq_(apply_opcodes(a, b, opcodes), b)
+
+    def testFewDistinctLines(self):
+        # Many changes between lines that all occur many times leave no
+        # unique lines, the result must stay consistent and find most of
+        # the unchanged lines once the work budget is used up.
+        rand = random.Random(7)
+        a = [ rand.randint(0, 50) for x in range(20000) ]
+        b = list(a)
+        for idx in range(len(b)):
+            if rand.random() < 0.3:
+                b[idx] = rand.randint(0, 50)
+        for maxwork in (None, 0):
+            opcodes = DiffEngine.GetOpcodes(a, b, maxwork=maxwork)
+            eq_(apply_opcodes(a, b, opcodes), b)
+            common = sum([ i2 - i1 for tag, i1, i2, j1, j2 in opcodes
+                           if tag == DiffEngine.OP_EQUAL ])
+            assert common > len(a) * 0.65, common
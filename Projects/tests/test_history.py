@@ -0,0 +1,128 @@
+# -*- mode:Python;  cursor-type: (bar. 1)-*-
+import sys, StringIO
+sys.path.append('..')
+
+from nose.tools import *
+
+import projects.GIT as GIT
+from projects.HistWin import HistoryIndex
+
+# Canned git log -z output in the GIT.LOG_FORMAT format, newest first
+PAGE1 = ['a' * 40 + '\x1fJane <jane@example.com>\x1f1325376000\x1f'
+         'Fix the status cache\n\nInvalidate on refresh.\n',
+         '\n' + 'b' * 40 + '\x1fJohn <john@example.com>\x1f1325289600\x1f'
+         'Add history paging\n']
+PAGE2 = ['\n' + 'c' * 40 + '\x1fJane <jane@example.com>\x1f1325203200\x1f'
+         'Fixup the watcher thread\n',
+         '\n' + 'd' * 40 + '\x1fJohn <john@example.com>\x1f1325116800\x1f'
+         'Initial import\n']
+
+def log_record(rev, timestamp):
+    return '%s\x1fJane <jane@example.com>\x1f%d\x1fCommit %s\n' % \
+           (rev * 40, timestamp, rev)
+
+class FakeOutput(object):
+    def __init__(self, records):
+        self.stdout = StringIO.StringIO('\0\n'.join(records))
+
+class PagedGit(GIT.GIT):
+    """Git with canned logs of two repositories, newest first"""
+    LOGS = {'/repo1/': [ log_record(rev, 1325376000 - day * 86400)
+                         for rev, day in zip('abcdef', (0, 1, 4, 5, 6, 9)) ],
+            '/repo2/': [ log_record(rev, 1325376000 - day * 86400)
+                         for rev, day in zip('uvwxyz', (2, 3, 7, 8, 10, 11)) ]}
+
+    def findRoot(self, path):
+        return '/%s/' % path.split('/')[1]
+
+    def run(self, directory, options, env=dict(), mergeerr=False):
+        skip = count = 0
+        for option in options:
+            if option.startswith('--skip='):
+                skip = int(option.split('=')[1])
+            elif option.startswith('--max-count='):
+                count = int(option.split('=')[1])
+        records = self.LOGS[directory][skip:]
+        if count:
+            records = records[:count]
+        return FakeOutput(records)
+
+    def logOutput(self, p, close=True):
+        pass
+
+def parse_page(records):
+    """Parse canned log records into history items"""
+    history = list()
+    scm = GIT.GIT()
+    for record in records:
+        scm.parseLogRecord('/repo/README', record, history)
+    return history
+
+def build_index(*pages):
+    index = HistoryIndex()
+    for page in pages:
+        for item in parse_page(page):
+            index.Add(item)
+    return index
+
+class TestHistoryIndex(object):
+    def testParseLogRecord(self):
+        history = parse_page(PAGE1 + ['', 'garbage'])
+        eq_(len(history), 2)
+        eq_(history[0]['revision'], 'a' * 40)
+        eq_(history[0]['author'], 'Jane <jane@example.com>')
+        eq_(history[0]['log'], 'Fix the status cache\n\nInvalidate on refresh.')
+        eq_(history[1]['path'], '/repo/README')
+        assert history[0]['date'] > history[1]['date']
+
+    def testEmptyQuery(self):
+        index = build_index(PAGE1)
+        eq_(index.Search(u''), None)
+        eq_(index.Search(u'  ...'), None)
+
+    def testSearch(self):
+        index = build_index(PAGE1)
+        eq_(index.Search(u'jane'), set([0]))
+        eq_(index.Search(u'JOHN paging'), set([1]))
+        eq_(index.Search(u'john cache'), set())
+        eq_(index.Search(u'nosuchword'), set())
+        # The last word is a prefix as it may still be typed
+        eq_(index.Search(u'invalid'), set([0]))
+        eq_(index.Search(u'invalidate jan'), set([0]))
+        eq_(index.Search(u'invalid jane'), set())
+
+    def testAppendPages(self):
+        index = build_index(PAGE1, PAGE2)
+        eq_(index.Count, 4)
+        eq_(index.Search(u'jane'), set([0, 2]))
+        eq_(index.Search(u'john'), set([1, 3]))
+        eq_(index.Search(u'dddd'), set([3]))
+
+    def testStaleIndex(self):
+        # Searching builds the sorted word list used for prefix lookups,
+        # adding a page with new words must invalidate it.
+        index = build_index(PAGE1)
+        eq_(index.Search(u'fix'), set([0]))
+        eq_(index.Search(u'jane thr'), set())
+        for item in parse_page(PAGE2):
+            index.Add(item)
+        eq_(index.Search(u'fix'), set([0, 2]))
+        eq_(index.Search(u'jane thr'), set([2]))
+        eq_(index.Search(u'import'), set([3]))
+
+class TestHistoryPage(object):
+    def revisions(self, history):
+        return ''.join(item['revision'][0] for item in history)
+
+    def testSingleRepository(self):
+        scm = PagedGit()
+        eq_(self.revisions(scm.historyPage(['/repo1/README'], 2, 3)), 'cde')
+
+    def testMergedPages(self):
+        # Paging through two repositories gives each entry once, by date
+        scm = PagedGit()
+        paths = ['/repo1/README', '/repo2/README']
+        pages = [ self.revisions(scm.historyPage(paths, skip, 5))
+                  for skip in (0, 5, 10, 15) ]
+        eq_(pages, ['abuvc', 'dewxf', 'yz', ''])
+        eq_(self.revisions(scm.historyPage(paths)), ''.join(pages))
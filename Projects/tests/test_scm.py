@@ -1,5 +1,6 @@
 # -*- mode:Python;  cursor-type: (bar. 1)-*-
 import os, sys, re, shutil
+import StringIO
 sys.path.append('..')
 
 from nose.tools import *
@@ -100,6 +101,27 @@ class TestGit(SCMBase):
     
     def testGitExists(self):
         eq_(GIT.checkDirectory(self.root), True)
+
+    def testStatusSnapshot(self):
+        snapshot = self.scm.statusSnapshot(os.path.join(self.root, 'subdir'))
+        status = snapshot.GetStatus(os.path.join(self.root, 'subdir'))
+        assert 'README.subdir' in status
+        eq_(status['README.subdir']['status'], 'uptodate')
+        status = snapshot.GetStatus(self.root)
+        eq_(status['README']['status'], 'uptodate')
+
+    def testParsePorcelain(self):
+        snapshot = GIT.GitStatusSnapshot(self.root)
+        output = '1 .M N... 100644 100644 100644 abc abc README\0' \
+                 '2 R. N... 100644 100644 100644 abc abc R100 new\0old\0' \
+                 'u UU N... 100644 100644 100644 100644 a b c both\0' \
+                 '? scratch/\0! build/\0'
+        snapshot.Parse(StringIO.StringIO(output), bufsize=7)
+        eq_(snapshot.entries, {'README' : 'modified', 'new' : 'added',
+                               'both' : 'conflict'})
+        eq_(snapshot.untracked, set(['scratch']))
+        eq_(snapshot.ignored, set(['build']))
+        assert snapshot.IsUntracked(os.path.join('scratch', 'file.txt'))
     
 
 class TestSVN(SCMBase):
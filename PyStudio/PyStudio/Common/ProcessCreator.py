@@ -57,7 +57,7 @@ class ProcessCreator(object):
             return os.getenv("PATH")
         return ""
 
-    def createprocess(self, stderr=PIPE):
+    def createprocess(self, stderr=PIPE, stdin=None):
         if self.pythonpath:
             if wx.Platform == "__WXMSW__":
                 os.environ["PYTHONPATH"] = os.pathsep.join(self.pythonpath)
@@ -75,7 +75,7 @@ class ProcessCreator(object):
         util.Log("[%s][info] Using CWD: %s" % (self.info, parentPath))
         util.Log("[%s][info] Starting command: %s" % (self.info, repr(cmdline)))
         return Popen(cmdline,
-                    bufsize=1048576, stdout=PIPE, stderr=stderr,
+                    bufsize=1048576, stdin=stdin, stdout=PIPE, stderr=stderr,
                     cwd=parentPath, env=self.environment,
                     creationflags=self.creationflags)
 
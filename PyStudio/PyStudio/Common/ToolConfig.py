@@ -35,6 +35,7 @@ PYTOOL_CONFIG = "PyTool.Config"
 TLC_PYTHON_PATH = "PythonPath"
 TLC_ALL_PYTHON_PATHS = "AllPythonPaths"
 TLC_COMPILE_ON_SAVE = "CheckCompileOnSave"
+TLC_COMPILE_AS_YOU_TYPE = "CheckCompileAsYouType"
 TLC_LOAD_LAST_PROJECT = "AutoLoadProject"
 TLC_LAST_PROJECT = "LastProjectFile"
 TLC_TRAP_EXCEPTIONS = "TrapExceptions"
@@ -143,6 +144,7 @@ class GeneralConfigPanel(wx.Panel):
         self._rm_path = eclib.PlateButton(self, bmp=bmp)
         self._rm_path.ToolTip = wx.ToolTip(_("Remove selected python executable"))
         self._check_on_save_cb = wx.CheckBox(self, label=_("Check for syntax errors on save"))
+        self._check_typing_cb = wx.CheckBox(self, label=_("Check for syntax errors while typing"))
         self._load_proj_cb = wx.CheckBox(self, label=_("Load Last Project"))
 
         # Setup
@@ -153,6 +155,7 @@ class GeneralConfigPanel(wx.Panel):
         self.Bind(wx.EVT_BUTTON, self.OnAddPyExe, self._add_path)
         self.Bind(wx.EVT_BUTTON, self.OnRemovePyExe, self._rm_path)
         self.Bind(wx.EVT_CHECKBOX, self.OnCheckBox, self._check_on_save_cb)
+        self.Bind(wx.EVT_CHECKBOX, self.OnCheckBox, self._check_typing_cb)
 
     def __DoLayout(self):
         sizer = wx.BoxSizer(wx.VERTICAL)
@@ -183,6 +186,9 @@ class GeneralConfigPanel(wx.Panel):
         self._check_on_save_cb.ToolTip = wx.ToolTip(_("Mark syntax errors in buffer after save"))
         self._check_on_save_cb.SetValue(GetConfigValue(TLC_COMPILE_ON_SAVE, True))
         sizer.Add(self._check_on_save_cb, 0, wx.ALL, 5)
+        self._check_typing_cb.ToolTip = wx.ToolTip(_("Mark syntax errors in buffer when typing pauses"))
+        self._check_typing_cb.SetValue(GetConfigValue(TLC_COMPILE_AS_YOU_TYPE, True))
+        sizer.Add(self._check_typing_cb, 0, wx.ALL, 5)
         # Project
         self._load_proj_cb.ToolTip = wx.ToolTip(_("Automatically reload last project at startup."))
         self._load_proj_cb.SetValue(GetConfigValue(TLC_LOAD_LAST_PROJECT, True))
@@ -198,6 +204,9 @@ class GeneralConfigPanel(wx.Panel):
         if e_obj is self._check_on_save_cb:
             config[TLC_COMPILE_ON_SAVE] = e_obj.Value
             Profile_Set(PYTOOL_CONFIG, config)
+        elif e_obj is self._check_typing_cb:
+            config[TLC_COMPILE_AS_YOU_TYPE] = e_obj.Value
+            Profile_Set(PYTOOL_CONFIG, config)
         elif e_obj is self._load_proj_cb:
             config[TLC_LOAD_LAST_PROJECT] = e_obj.Value
             Profile_Set(PYTOOL_CONFIG, config)
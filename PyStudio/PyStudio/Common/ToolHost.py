@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+# Name: ToolHost.py
+# Purpose: Long running tool processes
+# Author: Cody Precord <cprecord@editra.org>
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>
+# License: wxWindows License
+##############################################################################
+"""
+Runs the PyStudio tools (pylint, pep8, module finder and compile check) in
+long running toolserver processes of the configured Python interpreter
+instead of starting the interpreter for every check. The processes are kept
+for each interpreter and PYTHONPATH and are restarted when they exit or the
+configured interpreter changes.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import json
+import threading
+from subprocess import PIPE
+import pkg_resources
+
+# Local Imports
+from PyStudio.Common import ToolConfig
+from PyStudio.Common.ProcessCreator import ProcessCreator
+
+# Editra Libraries
+import util
+
+#-----------------------------------------------------------------------------#
+# Globals
+
+MAX_PROCESSES = 2   # Processes for each interpreter and PYTHONPATH
+MAX_PYTHONPATHS = 4 # Different PYTHONPATHs to keep processes for
+
+_HOSTS = dict()     # (python, pythonpath) -> [ToolHost,]
+_LRU = list()       # Keys of _HOSTS, most recently used last
+_LOCK = threading.Lock()
+
+#-----------------------------------------------------------------------------#
+
+class ToolHostError(Exception):
+    """Error communicating with a tool process"""
+    pass
+
+#-----------------------------------------------------------------------------#
+
+class ToolHost(object):
+    """Connection to a toolserver process"""
+    def __init__(self, python, pythonpath=None):
+        """Create the host, the process is started on the first call
+        @param python: path of the Python interpreter
+        @keyword pythonpath: list of directories to set as PYTHONPATH
+
+        """
+        super(ToolHost, self).__init__()
+
+        # Attributes
+        self.python = python
+        self.pythonpath = pythonpath
+        self._process = None
+        self._devnull = None
+        self._lock = threading.Lock()
+        self._busy = False
+        self._users = 0     # Callers that got the host from GetToolHost
+        self._closed = False
+
+    Busy = property(lambda self: self._busy or self._users > 0)
+
+    def _Start(self):
+        """Start the toolserver process"""
+        script = pkg_resources.resource_filename("PyStudio.Common",
+                                                 "toolserver.py")
+        self._devnull = open(os.devnull, 'w')
+        creator = ProcessCreator("ToolHost", ".", [self.python, script],
+                                 self.pythonpath)
+        self._process = creator.createprocess(stderr=self._devnull,
+                                              stdin=PIPE)
+        creator.restorepath()
+
+    def _Request(self, msg):
+        """Send a request and read the response
+        @param msg: dict
+        @return: dict
+
+        """
+        data = json.dumps(msg)
+        self._process.stdin.write("%d\n%s" % (len(data), data))
+        self._process.stdin.flush()
+        header = self._process.stdout.readline()
+        if not header:
+            raise IOError("Tool process exited")
+        data = self._process.stdout.read(int(header.strip()))
+        return json.loads(data.decode('utf-8'))
+
+    def Call(self, cmd, cwd=None, **args):
+        """Run a tool command in the process. The process is (re)started
+        if it is not running and the request is retried once if the process
+        fails while handling it.
+        @param cmd: command name
+        @keyword cwd: working directory to run the command in
+        @return: command result
+        @raise ToolHostError: when the command fails
+
+        """
+        msg = dict(cmd=cmd, cwd=cwd, args=args)
+        self._lock.acquire()
+        self._busy = True
+        try:
+            for attempt in (0, 1):
+                if not self.IsRunning():
+                    if self._closed:
+                        raise ToolHostError(u"Tool process was closed")
+                    self._Start()
+                try:
+                    reply = self._Request(msg)
+                except (IOError, OSError, ValueError), err:
+                    util.Log("[ToolHost][err] %s failed: %s" % (cmd, err))
+                    self.Stop()
+                    if attempt:
+                        raise ToolHostError(unicode(err))
+                else:
+                    break
+        finally:
+            self._busy = False
+            self._lock.release()
+
+        if not reply.get('ok', False):
+            raise ToolHostError(reply.get('error', u''))
+        return reply.get('result', None)
+
+    def Release(self):
+        """Give back a host that was returned by L{GetToolHost}"""
+        _LOCK.acquire()
+        try:
+            self._users -= 1
+        finally:
+            _LOCK.release()
+
+    def Close(self):
+        """Stop the process and do not start it again"""
+        self._closed = True
+        self.Stop()
+
+    def IsRunning(self):
+        """Is the process running
+        @return: bool
+
+        """
+        return self._process is not None and self._process.poll() is None
+
+    def Stop(self):
+        """Stop the process"""
+        process = self._process
+        self._process = None
+        if process is not None:
+            try:
+                process.stdin.close()
+                if process.poll() is None:
+                    process.kill()
+                process.wait()
+            except (IOError, OSError):
+                pass
+        if self._devnull is not None:
+            self._devnull.close()
+            self._devnull = None
+
+#-----------------------------------------------------------------------------#
+
+def GetToolHost(info, pythonpath=None):
+    """Get a tool process for the configured Python interpreter. An idle
+    process is preferred, the hosts of interpreters that are no longer
+    configured are stopped. The host is marked busy until the caller gives
+    it back with L{ToolHost.Release}, so that it is not handed out again
+    before the callers command is started.
+    @param info: tool name for logging
+    @keyword pythonpath: list of directories to set as PYTHONPATH
+    @return: (bool, ToolHost or error message)
+
+    """
+    flag, python = ToolConfig.GetPythonExecutablePath(info)
+    if not flag:
+        return (False, python)
+
+    key = (python, tuple(pythonpath or ()))
+    _LOCK.acquire()
+    try:
+        # Configuration changed, stop the processes of other interpreters
+        for other in [ other for other in _LRU if other[0] != python ]:
+            _StopHosts(other)
+
+        if key in _LRU:
+            _LRU.remove(key)
+        _LRU.append(key)
+        while len(_LRU) > MAX_PYTHONPATHS:
+            _StopHosts(_LRU[0])
+
+        hosts = _HOSTS.setdefault(key, list())
+        idle = [ host for host in hosts if not host.Busy ]
+        if idle:
+            host = idle[0]
+        else:
+            if len(hosts) < MAX_PROCESSES:
+                hosts.append(ToolHost(python, pythonpath))
+            host = hosts[-1]
+        host._users += 1
+        return (True, host)
+    finally:
+        _LOCK.release()
+
+def RunTool(info, cmd, pythonpath=None, cwd=None, **args):
+    """Run a command in a tool process
+    @param info: tool name for logging
+    @param cmd: command name
+    @keyword pythonpath: list of directories to set as PYTHONPATH
+    @keyword cwd: working directory to run the command in
+    @return: command result
+    @raise ToolHostError: if no Python is configured or the command fails
+
+    """
+    flag, host = GetToolHost(info, pythonpath)
+    if not flag:
+        raise ToolHostError(host)
+    try:
+        return host.Call(cmd, cwd, **args)
+    finally:
+        host.Release()
+
+def StopAll():
+    """Stop all tool processes"""
+    _LOCK.acquire()
+    try:
+        for key in list(_LRU):
+            _StopHosts(key)
+    finally:
+        _LOCK.release()
+
+def _StopHosts(key):
+    """Stop the processes of an interpreter and PYTHONPATH
+    @note: _LOCK must be held by caller
+
+    """
+    if key in _LRU:
+        _LRU.remove(key)
+    for host in _HOSTS.pop(key, list()):
+        host.Close()
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# Name: toolserver.py
+# Purpose: Long running process that runs the PyStudio tools
+# Author: Cody Precord <cprecord@editra.org>
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>
+# License: wxWindows License
+##############################################################################
+"""
+Tool server that is started with the configured Python interpreter by
+L{PyStudio.Common.ToolHost}. It reads requests from stdin and writes the
+responses to stdout so that pylint, pep8, the module finder and the compile
+check run in a process that already has them imported.
+
+Each message is a line with the decimal length of the data followed by the
+data, a JSON object. Requests are {"cmd": name, "args": {...}} and the
+responses {"ok": bool, "result": value, "error": string}.
+
+This script does not depend on Editra and works with Python 2 and 3.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+import json
+import time
+import traceback
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+#-----------------------------------------------------------------------------#
+# Globals
+
+# Modules loaded from a path (findmodule) and module indexes by directory
+_MODULES = dict()
+_INDEXES = dict()
+
+# Start time of the last pylint run
+_LINT = dict(time=0)
+
+#-----------------------------------------------------------------------------#
+
+def ReadMessage(stream):
+    """Read a message
+    @param stream: binary input stream
+    @return: object or None at end of input
+
+    """
+    header = stream.readline()
+    if not header:
+        return None
+    data = stream.read(int(header.strip()))
+    return json.loads(data.decode('utf-8'))
+
+def WriteMessage(stream, msg):
+    """Write a message
+    @param stream: binary output stream
+    @param msg: json serializable object
+
+    """
+    data = json.dumps(msg).encode('utf-8')
+    stream.write(("%d\n" % len(data)).encode('ascii'))
+    stream.write(data)
+    stream.flush()
+
+def Capture(funct, *args):
+    """Run a function with stdout and stderr redirected
+    @return: (stdout, stderr)
+
+    """
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = StringIO(), StringIO()
+    try:
+        try:
+            funct(*args)
+        except SystemExit:
+            pass
+        except Exception:
+            traceback.print_exc()
+        return (sys.stdout.getvalue(), sys.stderr.getvalue())
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+def LoadModule(path):
+    """Load a module from a file, the module is loaded once
+    @param path: path of the python file
+
+    """
+    if path not in _MODULES:
+        name = os.path.splitext(os.path.basename(path))[0]
+        name = "_toolserver_%s" % name
+        try:
+            from importlib import util as imputil
+            spec = imputil.spec_from_file_location(name, path)
+            module = imputil.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        except ImportError:
+            # Python 2
+            import imp
+            module = imp.load_source(name, path)
+        _MODULES[path] = module
+    return _MODULES[path]
+
+#-----------------------------------------------------------------------------#
+# Commands
+
+def DoLint(args):
+    """Run pylint. The modules parsed by the previous runs stay cached
+    unless their file was modified since then.
+    @param args: dict(argv=[pylint arguments,])
+    @return: dict(stdout, stderr)
+
+    """
+    def Lint(argv):
+        from pylint import lint
+        try:
+            from astroid import MANAGER
+        except ImportError:
+            try:
+                from logilab.astng import MANAGER
+            except ImportError:
+                MANAGER = None
+
+        cache = getattr(MANAGER, 'astroid_cache',
+                        getattr(MANAGER, 'astng_cache', dict()))
+        for name, module in list(cache.items()):
+            path = getattr(module, 'file', None)
+            try:
+                stale = not path or os.path.getmtime(path) >= _LINT['time']
+            except (OSError, TypeError):
+                stale = True
+            if stale:
+                del cache[name]
+
+        _LINT['time'] = time.time()
+        lint.Run(argv)
+
+    stdout, stderr = Capture(Lint, args['argv'])
+    return dict(stdout=stdout, stderr=stderr)
+
+def DoPep8(args):
+    """Run pep8
+    @param args: dict(path=file to check)
+    @return: dict(stdout, stderr)
+
+    """
+    def Pep8(path):
+        import pep8
+        argv = sys.argv
+        sys.argv = ['pep8', path]
+        try:
+            pep8._main()
+        finally:
+            sys.argv = argv
+
+    stdout, stderr = Capture(Pep8, args['path'])
+    return dict(stdout=stdout, stderr=stderr)
+
+def DoCompile(args):
+    """Compile a file or source text without writing a bytecode file
+    @param args: dict(path=file to compile, source=optional text to compile
+                 instead of the file contents)
+    @return: error text, empty if the file compiled
+
+    """
+    path = args['path']
+    source = args.get('source')
+    if source is None:
+        handle = open(path, 'rb')
+        try:
+            source = handle.read()
+        finally:
+            handle.close()
+        source = source.replace(b'\r\n', b'\n')
+    else:
+        source = source.replace(u'\r\n', u'\n')
+
+    try:
+        compile(source, path, 'exec')
+    except SyntaxError:
+        etype, err = sys.exc_info()[:2]
+        return ''.join(traceback.format_exception_only(etype, err))
+    except Exception:
+        etype, err = sys.exc_info()[:2]
+        return "%s: %s" % (etype.__name__, err)
+    return ''
+
+def DoFindModule(args):
+    """Find modules with findmodule, the module index stays loaded between
+    requests.
+    @param args: dict(script, text, localpath, firstmatch, indexdir)
+    @return: list of paths
+
+    """
+    findmodule = LoadModule(args['script'])
+    path = list(sys.path)
+    path.insert(0, os.path.dirname(args['script']))
+    if args.get('localpath'):
+        path.insert(0, args['localpath'])
+
+    indexdir = args.get('indexdir')
+    finder = findmodule.ModuleFinder(path, args.get('firstmatch', False))
+    if indexdir:
+        if indexdir not in _INDEXES:
+            _INDEXES[indexdir] = findmodule.ModuleIndex(indexdir)
+        finder.SetIndex(_INDEXES[indexdir])
+
+    if args.get('text'):
+        return finder.Find(args['text'])
+    finder.UpdateIndex()
+    return list()
+
+COMMANDS = dict(lint=DoLint, pep8=DoPep8, compile=DoCompile,
+                findmodule=DoFindModule, ping=lambda args: True,
+                version=lambda args: list(sys.version_info[:2]))
+
+#-----------------------------------------------------------------------------#
+
+def Serve(instream, outstream):
+    """Handle requests until the input is closed
+    @param instream: binary input stream
+    @param outstream: binary output stream
+
+    """
+    while True:
+        try:
+            msg = ReadMessage(instream)
+        except ValueError:
+            break
+        if msg is None:
+            break
+
+        cmd = COMMANDS.get(msg.get('cmd'), None)
+        try:
+            if cmd is None:
+                raise ValueError("Unknown command: %s" % msg.get('cmd'))
+            os.chdir(msg.get('cwd') or os.curdir)
+            reply = dict(ok=True, result=cmd(msg.get('args', dict())))
+        except Exception:
+            reply = dict(ok=False, error=traceback.format_exc())
+        WriteMessage(outstream, reply)
+
+#--------------------------------------------------------------------------#
+# Main
+if __name__ == '__main__':
+    # Like running with -c, the current directory comes first on the path
+    sys.path[0] = ''
+    if sys.platform == 'win32':
+        import msvcrt
+        msvcrt.setmode(sys.stdin.fileno(), os.O_BINARY)
+        msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY)
+    instream = getattr(sys.stdin, 'buffer', sys.stdin)
+    outstream = getattr(sys.stdout, 'buffer', sys.stdout)
+    # Keep stray output of the tools out of the message stream
+    sys.stdout = sys.stderr
+    Serve(instream, outstream)
@@ -21,7 +21,6 @@ import wx
 import eclib
 
 # Local imports
-import rpdb2
 from PyStudio.Common.PyStudioUtils import RunProcInThread
 from PyStudio.Debugger.RpdbDebugger import RpdbDebugger
 from PyStudio.Debugger.PasswordDialog import PasswordDialog
@@ -133,6 +132,7 @@ running) on local or remote machine:"""
     def _onserverlist(self, res):
         """Callback from do_refresh thread"""
         assert wx.Thread_IsMain(), "Must Update UI from Main Thread!!"
+        import rpdb2 # loaded by the server list request
 
         if not res:
             return
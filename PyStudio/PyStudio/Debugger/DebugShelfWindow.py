@@ -113,6 +113,7 @@ class DebugShelfWindow(BaseShelfWindow):
         RpdbDebugger().mainwindow = self._mw #TODO
         RpdbDebugger().debugbuttonsupdate = self.OnButtonsUpdate
         RpdbDebugger().disabledebugbuttons = self.DisableButtons
+        RpdbDebugger().prepare()
 
         # Event Handlers
         self.Bind(wx.EVT_BUTTON, self.OnGo, self.gobtn)
@@ -99,16 +99,22 @@ class ExpressionsList(eclib.EToggleEditListCtrl):
             self.SetStringItem(idx, ExpressionsList.COL_TYPE, u"")        
 
     def Evaluate(self, enabled, expression, idx):
-        if not enabled or not expression or not RpdbDebugger().broken:
+        if not enabled or not expression:
             return
-        worker = RunProcInThread("Expr", self.fillexpressionvalue, \
-                                 RpdbDebugger().evaluate, expression)
-        worker.pass_parameter(idx)
+        self.EvaluateList([(idx, expression)])
+
+    def EvaluateList(self, expressions):
+        """Evaluate the value and type of expressions in one request
+        @param expressions: [(idx, expression),]
+
+        """
+        if not expressions or not RpdbDebugger().broken:
+            return
+        worker = RunProcInThread("Expr", self.fillexpressionvalues, \
+                                 RpdbDebugger().evaluate_list,
+                                 [ expression for idx, expression in expressions ])
+        worker.pass_parameter([ idx for idx, expression in expressions ])
         worker.start()
-        worker2 = RunProcInThread("Expr", self.fillexpressiontype, \
-                                 RpdbDebugger().evaluate, "type(%s).__name__" % expression)
-        worker2.pass_parameter(idx)
-        worker2.start()
     
     def Clear(self):
         """Delete all the rows """
@@ -124,15 +130,18 @@ class ExpressionsList(eclib.EToggleEditListCtrl):
             return
         self._data = {}
         idx = 0
+        expressions = list()
         for expression in data:
             enabled = data[expression]
             self._data[idx] = [expression,]
-            self.Evaluate(enabled, expression, idx)
+            if enabled and expression:
+                expressions.append((idx, expression))
             
             self.Append(self._data[idx] + [u""])
             self.SetItemData(idx, idx)
             self.CheckItem(idx, enabled)
             idx += 1
+        self.EvaluateList(expressions)
 
         self.SetColumnWidth(ExpressionsList.COL_EXPR, wx.LIST_AUTOSIZE)
         self.SetColumnWidth(ExpressionsList.COL_VALUE, wx.LIST_AUTOSIZE)
@@ -141,22 +150,18 @@ class ExpressionsList(eclib.EToggleEditListCtrl):
         self.SetColumnWidth(ExpressionsList.COL_EXPR, exprcolwidth)
         self.SetColumnWidth(ExpressionsList.COL_VALUE, valuecolwidth)
 
-    def fillexpressionvalue(self, res, idx):
-        if not res:
+    def fillexpressionvalues(self, res, idxs):
+        if not res or len(res) != len(idxs):
             return
-        value, w, error = res
-        if error:
-            value = error
-        self.SetStringItem(idx, ExpressionsList.COL_VALUE, PyStudioUtils.get_unicodevalue(value))        
+        for idx, result in zip(idxs, res):
+            if idx >= self.GetItemCount() or len(result) != 4:
+                continue
+            value, w, error, vtype = result
+            if error:
+                value = vtype = error
+            self.SetStringItem(idx, ExpressionsList.COL_VALUE, PyStudioUtils.get_unicodevalue(value))        
+            self.SetStringItem(idx, ExpressionsList.COL_TYPE, PyStudioUtils.get_unicodevalue(vtype))        
         self.SetColumnWidth(ExpressionsList.COL_VALUE, wx.LIST_AUTOSIZE)
-
-    def fillexpressiontype(self, res, idx):
-        if not res:
-            return
-        value, w, error = res
-        if error:
-            value = error
-        self.SetStringItem(idx, ExpressionsList.COL_TYPE, PyStudioUtils.get_unicodevalue(value))        
         
     def clearexpressionvalues(self):
         if not self._data:
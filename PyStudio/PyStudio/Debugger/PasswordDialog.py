@@ -20,7 +20,6 @@ import wx
 import eclib
 
 # Local imports
-import rpdb2
 from PyStudio.Common.PyStudioUtils import PyStudioUtils
 
 # Globals
@@ -81,6 +80,7 @@ appear in the attach query list."""
         return pwd
 
     def do_validate(self):
+        import rpdb2
         if rpdb2.is_valid_pwd(self.get_password()):
             return True
 
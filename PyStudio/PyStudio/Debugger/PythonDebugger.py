@@ -47,6 +47,21 @@ def GetPwdFile(pword):
             util.Log("[PyDbg][err] %s" % msg) 
     return ppath
 
+def GetHandshakeFile():
+    """Get the file rpdb2 reports its port in, removing any left over
+    from a previous run.
+
+    """
+    cpath = util.ResolvConfigDir('cache', False)
+    hpath = os.path.join(cpath, "rpdbport.txt")
+    if os.path.exists(hpath):
+        try:
+            os.remove(hpath)
+        except OSError, msg:
+            util.Log("[PyDbg][err] %s" % msg)
+            return None
+    return hpath
+
 #-----------------------------------------------------------------------------#
 
 class PythonDebugger(AbstractDebugger):
@@ -65,6 +80,7 @@ class PythonDebugger(AbstractDebugger):
         self.pythonpath = variabledict.get("PYTHONPATH")
         self.debuggee = None
         self.processcreator = None
+        self.handshake = None
 
     def RunDebuggee(self):
         """Run rpdb2args"""
@@ -86,6 +102,12 @@ class PythonDebugger(AbstractDebugger):
         else:
             rpdb2_pw = GetPwdFile(RpdbDebugger.password)
             self.rpdb2args += ["--rid=%s" % rpdb2_pw]
+
+        # Have rpdb2 report its port so the debugger attaches without
+        # waiting and scanning for it
+        self.handshake = GetHandshakeFile()
+        if self.handshake:
+            self.rpdb2args += ["--handshake=%s" % self.handshake]
         
         childPath, parentPath = PyStudioUtils.get_packageroot(self.filename)
 
@@ -131,5 +153,6 @@ class PythonDebugger(AbstractDebugger):
     def RunDebugger(self):                    
         self.debuggeewindow.calldebugger = None
         self.processcreator.restorepath()
-        worker = RunProcInThread("Debug", None, RpdbDebugger().attach, self.processcreator)
+        worker = RunProcInThread("Debug", None, RpdbDebugger().attach,
+                                 self.processcreator, self.handshake)
         worker.start()
@@ -14,7 +14,8 @@ __revision__ = "$Revision$"
 #-----------------------------------------------------------------------------#
 # Imports
 import traceback
-from time import sleep
+import threading
+from time import sleep, time
 import wx
 
 # Editra Libraries
@@ -24,16 +25,13 @@ import ed_msg
 import ebmlib
 
 # Local Imports
-import rpdb2
-from PyStudio.Common.PyStudioUtils import PyStudioUtils
-from PyStudio.Debugger.RpdbStateManager import RpdbStateManager
+from PyStudio.Common.PyStudioUtils import PyStudioUtils, RunAsyncTask
 from PyStudio.Debugger.RpdbBreakpointsManager import RpdbBreakpointsManager
-from PyStudio.Debugger.RpdbStackFrameManager import RpdbStackFrameManager
-from PyStudio.Debugger.RpdbThreadsManager import RpdbThreadsManager
-from PyStudio.Debugger.RpdbVariablesManager import RpdbVariablesManager
 
 # Globals
 _ = wx.GetTranslation
+rpdb2 = None # imported by RpdbDebugger._createsession
+HANDSHAKE_TIMEOUT = 5 # seconds to wait for the debuggee to report its port
 
 #----------------------------------------------------------------------------#
 
@@ -51,13 +49,13 @@ class RpdbDebugger(object):
         super(RpdbDebugger, self).__init__()
 
         # Setup
-        self.sessionmanager = rpdb2.CSessionManager(RpdbDebugger.password, \
-            RpdbDebugger.fAllowUnencrypted, RpdbDebugger.fRemote, RpdbDebugger.host)
+        # The session manager is created on first use, see _createsession
+        self._sessionmanager = None
         self.breakpointmanager = RpdbBreakpointsManager(self)
-        self.statemanager = RpdbStateManager(self)
-        self.stackframemanager = RpdbStackFrameManager(self)
-        self.threadmanager = RpdbThreadsManager(self)
-        self.variablesmanager = RpdbVariablesManager(self)
+        self.statemanager = None
+        self.stackframemanager = None
+        self.threadmanager = None
+        self.variablesmanager = None
         
         # attributes that will be set later
         self.attached = False
@@ -73,6 +71,13 @@ class RpdbDebugger(object):
         self.debuggerdetachedtext = None
         self.remoteprocess = False
         self.abortattach = False
+        # namespace requests the debuggee answers when it breaks
+        self.namespacerequests = {}
+        self.namespaceserial = 0
+        self.namespacesnapshot = None
+        # ui updates posted by the debugger event thread
+        self._postlock = threading.Lock()
+        self._posted = list()
         
         # functions that will be set later
 
@@ -110,6 +115,49 @@ class RpdbDebugger(object):
         self.saveandrestoreexpressions = lambda:None
         self.clearexpressionvalues = lambda:None
 
+    @property
+    def sessionmanager(self):
+        """The rpdb2 session manager, created on first access"""
+        if self._sessionmanager is None:
+            self._createsession()
+        return self._sessionmanager
+
+    def _createsession(self):
+        """Import rpdb2 and create the session manager and the managers that
+        handle its events. Importing rpdb2 is slow, so this is left until
+        the debugger is first used.
+
+        """
+        global rpdb2
+        import rpdb2
+        from PyStudio.Debugger.RpdbStateManager import RpdbStateManager
+        from PyStudio.Debugger.RpdbStackFrameManager import RpdbStackFrameManager
+        from PyStudio.Debugger.RpdbThreadsManager import RpdbThreadsManager
+        from PyStudio.Debugger.RpdbVariablesManager import RpdbVariablesManager
+
+        self._sessionmanager = rpdb2.CSessionManager(RpdbDebugger.password, \
+            RpdbDebugger.fAllowUnencrypted, RpdbDebugger.fRemote, RpdbDebugger.host)
+        self.statemanager = RpdbStateManager(self)
+        self.stackframemanager = RpdbStackFrameManager(self)
+        self.threadmanager = RpdbThreadsManager(self)
+        self.variablesmanager = RpdbVariablesManager(self)
+
+    def prepare(self):
+        """Derive the session key for the default password in the
+        background. The key derivation takes around a second, so it is
+        started as soon as the debugger shelf opens instead of on attach.
+
+        """
+        if self._sessionmanager is None:
+            RunAsyncTask("PyDbg", None, self._precalckey)
+
+    @staticmethod
+    def _precalckey():
+        import rpdb2
+        # CCrypto caches the key of each password it is created with
+        rpdb2.CCrypto(rpdb2.as_unicode(RpdbDebugger.password),
+                      RpdbDebugger.fAllowUnencrypted, rpdb2.generate_rid())
+
     def clear_all(self):
         self.breakpoints_installed = False
         self.curstack = {}
@@ -121,6 +169,8 @@ class RpdbDebugger(object):
         self.processcreator = None
         self.debuggerattachedtext = None
         self.debuggerdetachedtext = None
+        self.namespacerequests = {}
+        self.namespacesnapshot = None
         self.clearstepmarker()
         self.clearframe()
         self.clearthread()
@@ -142,26 +192,38 @@ class RpdbDebugger(object):
             return True
         return False
     
-    def attach(self, processcreator):
+    def attach(self, processcreator, handshake=None):
+        """Attach to the debuggee started by processcreator
+        @param handshake: file the debuggee reports its port in, if any
+
+        """
         if not processcreator:
             return
         self.processcreator = processcreator
         pid = str(processcreator.GetPID())
+        port = None
+        if handshake:
+            port = self.wait_handshake(processcreator, handshake)
         tries = 0
         ex = None
         
         while tries != 5:
-            sleep(1)
+            # Without a port rpdb2 has to find the debuggee by scanning
+            # for it, so give it time to start up
+            if port is None:
+                sleep(1)
             util.Log("[PyDbg][info] Trying to Attach")
             ex = None
             try:
                 if self.abortattach:
                     self.do_abort()
                     break
-                self.sessionmanager.attach(pid, encoding = rpdb2.detect_locale())
+                self.sessionmanager.attach(pid, encoding = rpdb2.detect_locale(),
+                                           port = port)
                 self.attached = True
                 break
             except Exception, ex:
+                port = None
                 tries = tries + 1
         ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_SHOW, (self.mainwindow.GetId(), False))
         if ex:
@@ -175,15 +237,35 @@ class RpdbDebugger(object):
         util.Log("[PyDbg][info] Running")
         processcreator.AddText(self.debuggerattachedtext)
 
+    def wait_handshake(self, processcreator, handshake):
+        """Wait for the debuggee to report the port it listens on
+        @return: port or None if it was not reported in time
+
+        """
+        # Set up the session while the debuggee starts
+        self.sessionmanager
+        start = time()
+        while not self.abortattach and time() - start < HANDSHAKE_TIMEOUT:
+            info = rpdb2.read_handshake_file(handshake)
+            if info:
+                port, pid = info
+                if pid == processcreator.GetPID():
+                    util.Log("[PyDbg][info] Debuggee listening on port %d" % port)
+                    return port
+            sleep(0.01)
+        util.Log("[PyDbg][warn] Debuggee did not report its port")
+        return None
+
     def printerror(self, processcreator, err):
         processcreator.AddText(_("\n%s\n" % err))
     
-    def attached_callsessionmanagerfn(self, fn, *args, **kwargs):
+    def attached_callsessionmanagerfn(self, fname, *args, **kwargs):
+        """Call the session manager method fname if attached"""
         if not self.attached:
             return None
         ex = None
         try:
-            return fn(*args, **kwargs)
+            return getattr(self.sessionmanager, fname)(*args, **kwargs)
         except rpdb2.NotAttached, ex:
             self.attached = False
         except Exception, ex:
@@ -217,7 +299,7 @@ class RpdbDebugger(object):
         self.processcreator.Abort()
         
     def do_detach(self):
-        self.attached_callsessionmanagerfn(self.sessionmanager.detach)
+        self.attached_callsessionmanagerfn('detach')
 
     def get_host(self):
         return self.callsessionmanagerfn(self.sessionmanager.get_host)
@@ -240,41 +322,88 @@ class RpdbDebugger(object):
         
     def set_default_password(self):
         self.callsessionmanagerfn(self.sessionmanager.set_password, RpdbDebugger.password)
+
+    def _setoption(self, fname, *args):
+        """Set a debugger option on the session manager. Options are set
+        again each time debugging starts, so there is no need to create the
+        session manager just to set one.
+
+        """
+        if self._sessionmanager is not None:
+            self.callsessionmanagerfn(getattr(self._sessionmanager, fname), *args)
         
     def register_callback(self, func, event_type_dict, fSingleUse = False):
         self.sessionmanager.register_callback(func, event_type_dict, fSingleUse = fSingleUse)
 
+    def post(self, func, *args):
+        """Run a ui update on the main thread. The debuggee reports a break
+        as one batch of events, so the updates posted for it are run
+        together in a single call.
+        @param func: callable to run on the main thread
+
+        """
+        self._postlock.acquire()
+        try:
+            self._posted.append((func, args))
+            if len(self._posted) > 1:
+                return
+        finally:
+            self._postlock.release()
+        wx.CallAfter(self._runposted)
+
+    def _runposted(self):
+        self._postlock.acquire()
+        try:
+            posted = self._posted
+            self._posted = list()
+        finally:
+            self._postlock.release()
+        for func, args in posted:
+            try:
+                func(*args)
+            except Exception:
+                util.Log("[PyDbg][err] %s" % traceback.format_exc())
+
     def install_breakpoints(self):
         self.breakpointmanager.installbreakpoints()
             
     def set_frameindex(self, index):
-        self.attached_callsessionmanagerfn(self.sessionmanager.set_frame_index, index)
+        self.attached_callsessionmanagerfn('set_frame_index', index)
             
     def get_frameindex(self):
-        return self.attached_callsessionmanagerfn(self.sessionmanager.get_frame_index)
+        return self.attached_callsessionmanagerfn('get_frame_index')
     
     def update_stack(self):
-        stacklist = self.attached_callsessionmanagerfn(self.sessionmanager.get_stack, [], True)
+        stacklist = self.attached_callsessionmanagerfn('get_stack', [], True)
         if stacklist is not None:
             self.stackframemanager.do_update_stack(stacklist[0])
 
     def get_thread_list(self):
-        res = self.attached_callsessionmanagerfn(self.sessionmanager.get_thread_list)
+        res = self.attached_callsessionmanagerfn('get_thread_list')
         if res is not None:
             return res
         return (None, {})
     
     def set_thread(self, tid):
-        self.attached_callsessionmanagerfn(self.sessionmanager.set_thread, tid)
+        self.attached_callsessionmanagerfn('set_thread', tid)
             
     def execute(self, suite):
-        return self.attached_callsessionmanagerfn(self.sessionmanager.execute, suite)
+        return self.attached_callsessionmanagerfn('execute', suite)
 
     def evaluate(self, suite):
-        return self.attached_callsessionmanagerfn(self.sessionmanager.evaluate, suite)
+        return self.attached_callsessionmanagerfn('evaluate', suite)
+
+    def evaluate_list(self, expressions):
+        """Evaluate expressions in the current frame with one request
+        @param expressions: list of expressions
+        @return: [(value, warning, error, type),] or None
+
+        """
+        return self.attached_callsessionmanagerfn('evaluate_list', expressions)
 
     def update_namespace(self):
-        self.variablesmanager.update_namespace()
+        if self.variablesmanager:
+            self.variablesmanager.update_namespace()
 
     def catchexc_get_namespace(self, expressionlist, filterlevel):
         if not self.attached:
@@ -297,81 +426,126 @@ class RpdbDebugger(object):
         return None
     
     def get_namespace(self, expressionlist, filterlevel):
-        return self.attached_callsessionmanagerfn(self.sessionmanager.get_namespace, expressionlist, filterlevel)
+        return self.attached_callsessionmanagerfn('get_namespace', expressionlist, filterlevel)
+
+    def setnamespacerequest(self, name, expressionlist, filterlevel):
+        """Have the debuggee send the namespace of the top frame with the
+        events of the next break.
+        @param name: name of the request (variables list type)
+        @param expressionlist: get_namespace expression list
+        @param filterlevel: get_namespace filter level
+
+        """
+        request = (expressionlist, filterlevel)
+        if self.namespacerequests.get(name, None) == request:
+            return
+        requests = dict(self.namespacerequests)
+        requests[name] = request
+        # The serial is not reset with the session so answers to the
+        # requests of an earlier session are never taken for these.
+        serial = self.namespaceserial + 1
+        res = self.attached_callsessionmanagerfn('set_namespace_requests', serial,
+                    dict([ (key, (el, fl, 128))
+                           for (key, (el, fl)) in requests.items() ]))
+        if res is not None:
+            self.namespaceserial = serial
+            self.namespacerequests = requests
+
+    def getsnapshotnamespace(self, name, expressionlist, filterlevel):
+        """Get the namespace the debuggee sent with the events of the
+        last break.
+        @param name: name of the request (variables list type)
+        @param expressionlist: get_namespace expression list
+        @param filterlevel: get_namespace filter level
+        @return: get_namespace result or None if it has to be queried
+
+        """
+        if self.namespacesnapshot is None or self.analyzing:
+            return None
+        serial, answers = self.namespacesnapshot
+        if serial != self.namespaceserial or \
+           self.namespacerequests.get(name, None) != (expressionlist, filterlevel) or \
+           name not in answers:
+            return None
+        if self.get_frameindex() != 0:
+            return None
+        return answers[name]
 
     def set_synchronicity(self, synchronicity):
-        self.callsessionmanagerfn(self.sessionmanager.set_synchronicity, synchronicity)
+        self._setoption('set_synchronicity', synchronicity)
         
     def get_synchronicity(self):
         return self.callsessionmanagerfn(self.sessionmanager.get_synchronicity)
         
     def set_trap_unhandled_exceptions(self, trap):
-        self.callsessionmanagerfn(self.sessionmanager.set_trap_unhandled_exceptions, trap)
+        self._setoption('set_trap_unhandled_exceptions', trap)
         
     def get_trap_unhandled_exceptions(self):
         return self.callsessionmanagerfn(self.sessionmanager.get_trap_unhandled_exceptions)
         
     def set_fork_mode(self, forkmode, autofork):
-        self.callsessionmanagerfn(self.sessionmanager.set_fork_mode, forkmode, autofork)
+        self._setoption('set_fork_mode', forkmode, autofork)
         
     def get_fork_mode(self):
         return self.callsessionmanagerfn(self.sessionmanager.get_fork_mode)
         
     def set_encoding(self, encoding, escaping):
-        self.callsessionmanagerfn(self.sessionmanager.set_fork_mode, encoding, escaping)
+        self._setoption('set_encoding', encoding, escaping)
         
     def get_encoding(self):
         return self.callsessionmanagerfn(self.sessionmanager.get_encoding)
         
     def set_analyze(self, analyze):
-        self.attached_callsessionmanagerfn(self.sessionmanager.set_analyze, analyze)
+        self.attached_callsessionmanagerfn('set_analyze', analyze)
 
     def do_shutdown(self):
-        self.attached_callsessionmanagerfn(self.sessionmanager.shutdown)
+        self.attached_callsessionmanagerfn('shutdown')
         self.clearstepmarker()
     
     def do_stop(self):
-        self.attached_callsessionmanagerfn(self.sessionmanager.stop_debuggee)
+        self.attached_callsessionmanagerfn('stop_debuggee')
         self.clearstepmarker()
 
     def do_restart(self):
-        self.attached_callsessionmanagerfn(self.sessionmanager.restart)
+        self.attached_callsessionmanagerfn('restart')
         self.clearstepmarker()
 
     def do_jump(self, lineno):
-        self.attached_callsessionmanagerfn(self.sessionmanager.request_jump, lineno)
+        self.attached_callsessionmanagerfn('request_jump', lineno)
         self.clearstepmarker()
 
     def do_go(self):
-        self.attached_callsessionmanagerfn(self.sessionmanager.request_go)
+        self.attached_callsessionmanagerfn('request_go')
         self.clearstepmarker()
 
     def do_break(self):
-        self.attached_callsessionmanagerfn(self.sessionmanager.request_break)
+        self.attached_callsessionmanagerfn('request_break')
 
     def do_step(self): # Step In
-        self.attached_callsessionmanagerfn(self.sessionmanager.request_step)
+        self.attached_callsessionmanagerfn('request_step')
         self.clearstepmarker()
 
     def do_next(self): # Step Over
-        self.attached_callsessionmanagerfn(self.sessionmanager.request_next)
+        self.attached_callsessionmanagerfn('request_next')
         self.clearstepmarker()
 
     def do_return(self):
-        self.attached_callsessionmanagerfn(self.sessionmanager.request_return)
+        self.attached_callsessionmanagerfn('request_return')
         self.clearstepmarker()
 
     def run_toline(self, filename, lineno):
-        self.attached_callsessionmanagerfn(self.sessionmanager.request_go_breakpoint, filename, '', lineno)
+        self.attached_callsessionmanagerfn('request_go_breakpoint', filename, '', lineno)
         self.clearstepmarker()
 
     def disable_breakpoint(self, bpid):
-        self.attached_callsessionmanagerfn(self.sessionmanager.disable_breakpoint, [bpid], False)
+        self.attached_callsessionmanagerfn('disable_breakpoint', [bpid], False)
 
     def enable_breakpoint(self, bpid):
-        self.attached_callsessionmanagerfn(self.sessionmanager.enable_breakpoint, [bpid], False)
+        self.attached_callsessionmanagerfn('enable_breakpoint', [bpid], False)
 
     def load_breakpoints(self):
+        if not self.attached:
+            return
         try:
             self.sessionmanager.load_breakpoints()
         except rpdb2.NotAttached:
@@ -382,13 +556,13 @@ class RpdbDebugger(object):
             pass
     
     def clear_breakpoints(self):
-        self.attached_callsessionmanagerfn(self.sessionmanager.delete_breakpoint, [], True)
+        self.attached_callsessionmanagerfn('delete_breakpoint', [], True)
         
     def set_breakpoint(self, filepath, lineno, exprstr = "", enabled=True):
-        return self.attached_callsessionmanagerfn(self.sessionmanager.set_breakpoint, filepath, '', lineno, enabled, exprstr)
+        return self.attached_callsessionmanagerfn('set_breakpoint', filepath, '', lineno, enabled, exprstr)
 
     def get_breakpoints(self):
-        return self.attached_callsessionmanagerfn(self.sessionmanager.get_breakpoints)
+        return self.attached_callsessionmanagerfn('get_breakpoints')
 
     def delete_breakpoint(self, filepath, lineno):
         bps = self.get_breakpoints()
@@ -396,4 +570,4 @@ class RpdbDebugger(object):
             return
         for bp in bps.values():            
             if bp.m_lineno == lineno and bp.m_filename == filepath:
-                self.attached_callsessionmanagerfn(self.sessionmanager.delete_breakpoint, [bp.m_id], False)
+                self.attached_callsessionmanagerfn('delete_breakpoint', [bp.m_id], False)
@@ -15,7 +15,6 @@ __revision__ = "$Revision$"
 #-----------------------------------------------------------------------------#
 # Imports
 import os.path
-import wx
 
 # Local Imports
 import rpdb2
@@ -35,7 +34,7 @@ class RpdbStackFrameManager(object):
     #
     
     def update_frame(self, event):
-        wx.CallAfter(self.do_update_frame, event.m_frame_index)
+        self.rpdb2debugger.post(self.do_update_frame, event.m_frame_index)
 
     def do_update_frame(self, index):
         if index is None:
@@ -48,7 +47,7 @@ class RpdbStackFrameManager(object):
     #
     
     def update_stack(self, event):
-        wx.CallAfter(self.do_update_stack, event.m_stack)
+        self.rpdb2debugger.post(self.do_update_stack, event.m_stack)
 
     def do_update_stack(self, _stack):
         self.rpdb2debugger.curstack = _stack
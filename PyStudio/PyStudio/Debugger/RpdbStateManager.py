@@ -15,7 +15,6 @@ __revision__ = "$Revision$"
 #-----------------------------------------------------------------------------#
 # Imports
 from time import sleep
-import wx
 
 # Local Imports
 import rpdb2
@@ -38,10 +37,10 @@ class RpdbStateManager(object):
 
     def update_conflicting_modules(self, event):
         modulesstr = ', '.join(event.m_modules_list)
-        wx.CallAfter(self.conflictingmodules, modulesstr)
+        self.rpdb2debugger.post(self.rpdb2debugger.conflictingmodules, modulesstr)
         
     def update_state(self, event):
-        wx.CallAfter(self.callback_state, event.m_state)
+        self.rpdb2debugger.post(self.callback_state, event.m_state)
 
     def callback_state(self, state):
         old_state = self.m_state
@@ -13,9 +13,6 @@ __svnid__ = "$Id$"
 __revision__ = "$Revision$"
 
 #-----------------------------------------------------------------------------#
-# Imports
-import wx
-
 # Local Imports
 import rpdb2
 
@@ -36,10 +33,10 @@ class RpdbThreadsManager(object):
         self.rpdb2debugger.register_callback(self.update_thread_broken, event_type_dict)
 
     def update_threads(self, event):
-        wx.CallAfter(self.rpdb2debugger.updatethreadlist, event.m_current_thread, event.m_thread_list)
+        self.rpdb2debugger.post(self.rpdb2debugger.updatethreadlist, event.m_current_thread, event.m_thread_list)
 
     def update_no_threads(self, event):
-        wx.CallAfter(self.rpdb2debugger.clear_all)
+        self.rpdb2debugger.post(self.rpdb2debugger.clear_all)
 
     def update_thread_broken(self, event):
-        wx.CallAfter(self.rpdb2debugger.updatethread, event.m_tid, event.m_name, True)
+        self.rpdb2debugger.post(self.rpdb2debugger.updatethread, event.m_tid, event.m_name, True)
@@ -13,9 +13,6 @@ __svnid__ = "$Id$"
 __revision__ = "$Revision$"
 
 #-----------------------------------------------------------------------------#
-# Imports
-import wx
-
 # Local Imports
 import rpdb2
 
@@ -33,13 +30,31 @@ class RpdbVariablesManager(object):
         self.rpdb2debugger.register_callback(self.update_variables, event_type_dict)
 
         self.variableskey_map = {}
+        self.namespacepending = False
         
     def update_unhandled_exception(self, event):
         self.rpdb2debugger.unhandledexception = True
         self.rpdb2debugger.catchunhandledexception()
 
     def update_variables(self, event):
-        wx.CallAfter(self.update_namespace)
+        # The debuggee sends the namespace of the top frame with the events
+        # of a break, the event of a frame change doesn't have it.
+        self.rpdb2debugger.namespacesnapshot = event.m_namespace
+        # Every thread that breaks sends a namespace event, only refresh
+        # once for all of those that arrive in the same batch.
+        if self.namespacepending:
+            return
+        self.namespacepending = True
+        self.rpdb2debugger.post(self.do_update_namespace)
+
+    def do_update_namespace(self):
+        self.namespacepending = False
+        snapshot = self.rpdb2debugger.namespacesnapshot
+        self.update_namespace()
+        # Later queries have to go to the debuggee, unless the snapshot is
+        # of a newer break.
+        if self.rpdb2debugger.namespacesnapshot is snapshot:
+            self.rpdb2debugger.namespacesnapshot = None
 
     def update_namespace(self):    
         frame_index = self.rpdb2debugger.get_frameindex()
@@ -34,6 +34,8 @@ from PyStudio.Debugger.RpdbDebugger import RpdbDebugger
 # Globals
 _ = wx.GetTranslation
 
+NAMESPACE_PAGE = 100 # Children retrieved at a time when expanding a row
+
 #----------------------------------------------------------------------------#
 
 class VariablesList(wx.gizmos.TreeListCtrl):
@@ -66,6 +68,8 @@ class VariablesList(wx.gizmos.TreeListCtrl):
         self.filterexpr = filterexpr
         self.filterlevel = filterlevel
         self.key = None
+        self.treekey = None # key of the namespace shown in the tree
+        self.changed = set() # expressions of the highlighted rows
         self.ignoredwarnings = {'': True}
         self._imglst = wx.ImageList(16, 16)
         self._imgmap = dict() # type -> imgidx
@@ -115,6 +119,8 @@ class VariablesList(wx.gizmos.TreeListCtrl):
     def Clear(self):
         """Delete all the rows """
         self.DeleteAllItems()
+        self.treekey = None
+        self.changed.clear()
 
     def setcolumnwidths(self):
         root = self.GetRootItem()
@@ -142,19 +148,146 @@ class VariablesList(wx.gizmos.TreeListCtrl):
         variablelist = [root]
 
         while len(variablelist) > 0:
-            item = variablelist.pop(0)
+            item = variablelist.pop()
             self.expand_item(item, data, item is root)
 
             items = self.GetChildNodes(item)
-            variablelist = items + variablelist
+            items.reverse()
+            variablelist.extend(items)
 
         self.setcolumnwidths()
 
-    def UpdateVariablesList(self, variables):
+    def UpdateRows(self, data):
+        """Update the rows of the tree with a new snapshot of the same
+        namespace. Only the rows that changed are updated and highlighted,
+        the expanded rows stay expanded.
+        @param data: list of variables info
+
+        """
+        nsmap = dict()
+        for expression in data:
+            if hasattr(expression, "get"):
+                nsmap.setdefault(expression.get("expr", None), expression)
+
+        updated = False
+        variablelist = [self.GetRootItem()]
+        while len(variablelist) > 0:
+            item = variablelist.pop()
+            (expr, is_valid) = self.GetPyData(item)
+            entry = nsmap.get(expr, None)
+            if entry is None or "error" in entry:
+                if not self.IsExpanded(item) and \
+                   self.get_numberofchildren(item) > 0:
+                    # Not shown so not retrieved, reload when expanded again
+                    self.DeleteChildren(item)
+                continue
+
+            if self.update_children(item, entry):
+                updated = True
+            items = self.GetChildNodes(item)
+            items.reverse()
+            variablelist.extend(items)
+
+        if updated:
+            self.setcolumnwidths()
+
+    def update_children(self, item, entry):
+        """Update the child rows of an item to a new namespace entry
+        @param item: tree item
+        @param entry: namespace info of the item's expression
+        @return: bool rows were added or changed
+
+        """
+        if entry["n_subnodes"] == 0:
+            if self.GetChildrenCount(item, False):
+                self.DeleteChildren(item)
+            self.SetItemHasChildren(item, False)
+            return False
+
+        subnodes = [ subnode for subnode in entry["subnodes"]
+                     if re.match(self.FilterExpr, unicode(subnode["name"])) ]
+        exprs = [ subnode["expr"] for subnode in subnodes ]
+        current = dict()
+        order = list()
+        for child in self.GetChildNodes(item):
+            cexpr = self.GetPyData(child)[0]
+            current[cexpr] = child
+            order.append(cexpr)
+
+        common = set(exprs).intersection(order)
+        if [ cexpr for cexpr in order if cexpr in common ] != \
+           [ cexpr for cexpr in exprs if cexpr in common ]:
+            # Rows were reordered, recreate them
+            self.DeleteChildren(item)
+            for subnode in subnodes:
+                child = self.AppendItem(item, unicode(subnode["name"]))
+                self.setup_row(child, subnode)
+            self.set_morenode(item, entry)
+            return True
+
+        # Removed rows, the other rows keep their order
+        exprs = set(exprs)
+        for cexpr, child in current.items():
+            if cexpr not in exprs:
+                self.DeleteChildren(child)
+                self.Delete(child)
+                del current[cexpr]
+                self.changed.discard(cexpr)
+
+        updated = False
+        previous = None
+        for subnode in subnodes:
+            child = current.get(subnode["expr"], None)
+            if child is None:
+                if previous is None:
+                    child = self.PrependItem(item, unicode(subnode["name"]))
+                else:
+                    child = self.InsertItem(item, previous,
+                                            unicode(subnode["name"]))
+                self.setup_row(child, subnode)
+                updated = True
+            else:
+                value = u' ' + PyStudioUtils.get_unicodevalue(subnode["repr"])
+                _type = u' ' + unicode(subnode["type"])
+                if value != self.GetItemText(child, VariablesList.COL_VALUE) \
+                   or _type != self.GetItemText(child, VariablesList.COL_TYPE):
+                    self.setup_row(child, subnode)
+                    self.SetItemTextColour(child, wx.RED)
+                    self.changed.add(subnode["expr"])
+                    updated = True
+                elif subnode["expr"] in self.changed:
+                    self.SetItemTextColour(child, self.GetForegroundColour())
+                    self.changed.discard(subnode["expr"])
+
+                if subnode["n_subnodes"] == 0:
+                    if self.GetChildrenCount(child, False):
+                        self.DeleteChildren(child)
+                    self.SetItemHasChildren(child, False)
+                else:
+                    self.SetItemHasChildren(child, True)
+            previous = child
+        self.set_morenode(item, entry)
+        return updated
+
+    def UpdateVariablesList(self, variables, key=None):
+        """Show a namespace snapshot, the rows are updated in place when the
+        tree already shows the namespace.
+        @param variables: list of variables info
+        @keyword key: namespace key
+
+        """
         if not variables:
             return
-        self.Clear()
-        self.PopulateRows(variables)
+        self.Freeze()
+        try:
+            if key is None or key != self.treekey or not self.GetRootItem():
+                self.Clear()
+                self.PopulateRows(variables)
+                self.treekey = key
+            else:
+                self.UpdateRows(variables)
+        finally:
+            self.Thaw()
         self.Refresh()
 
     def update_namespace(self, key, expressionlist):
@@ -169,17 +302,35 @@ class VariablesList(wx.gizmos.TreeListCtrl):
         if expressionlist is None:
             expressionlist = [(self.listtype, True)]
 
-        worker = RunProcInThread(self.listtype, self.UpdateVariablesList,
-                                 RpdbDebugger().catchexc_get_namespace,
-                                 expressionlist, self.FilterLevel)
-        worker.start()
+        # Get the rows that are shown now, at least a page of each
+        request = list()
+        for expression in expressionlist:
+            count = NAMESPACE_PAGE
+            if len(expression) > 3:
+                count = max(count, expression[3])
+            request.append(self.page_request(expression[0], 0, count))
+
+        debugger = RpdbDebugger()
+        variables = debugger.getsnapshotnamespace(self.listtype, request,
+                                                  self.FilterLevel)
+        if variables is not None:
+            # Sent by the debuggee with the break
+            self.UpdateVariablesList(variables, key)
+        else:
+            worker = RunProcInThread(self.listtype, self.UpdateVariablesList,
+                                     debugger.catchexc_get_namespace,
+                                     request, self.FilterLevel)
+            worker.pass_parameter(key)
+            worker.start()
+        # Have the debuggee send these rows with the next break
+        debugger.setnamespacerequest(self.listtype, request, self.FilterLevel)
         return (old_key, old_expressionlist)
 
     def OnItemRightClick(self, event):
         item = event.GetItem()
         (expr, is_valid) = self.GetPyData(item)
         if expr in [_("Loading..."), _("Data Retrieval Timeout"),
-                    _("Namespace Warning")]:
+                    _("Namespace Warning"), _("Load more...")]:
             return
         wx.CallAfter(self._onitemrightclick, item)
 
@@ -201,6 +352,9 @@ class VariablesList(wx.gizmos.TreeListCtrl):
     def OnItemActivated(self, event):
         item = event.GetItem()
         (expr, is_valid) = self.GetPyData(item)
+        if expr == _("Load more..."):
+            wx.CallAfter(self._onloadmore, item)
+            return
         if expr in [_("Loading..."), _("Data Retrieval Timeout"),
                     _("Namespace Warning")]:
             return
@@ -286,8 +440,8 @@ class VariablesList(wx.gizmos.TreeListCtrl):
             return
 
         worker = RunProcInThread(self.listtype, self._itemexpandingcallback,
-                                 RpdbDebugger().get_namespace, [(expr, True)],
-                                 self.FilterLevel)
+                                 RpdbDebugger().get_namespace,
+                                 [self.page_request(expr)], self.FilterLevel)
         worker.pass_parameter(item)
         worker.start()
 
@@ -319,7 +473,108 @@ class VariablesList(wx.gizmos.TreeListCtrl):
         self.setcolumnwidths()
         self.Refresh()
 
+    def _onloadmore(self, item):
+        """Get the next page of rows when a "Load more" row is activated"""
+        parent = self.GetItemParent(item)
+        (expr, is_valid) = self.GetPyData(parent)
+        offset = self.get_loadedcount(parent)
+        self.SetItemText(item, u' ' + _("Loading..."), VariablesList.COL_VALUE)
+
+        worker = RunProcInThread(self.listtype, self._loadmorecallback,
+                                 RpdbDebugger().get_namespace,
+                                 [self.page_request(expr, offset)],
+                                 self.FilterLevel)
+        worker.pass_parameter((expr, offset))
+        worker.start()
+
+    def _loadmorecallback(self, variables, param):
+        """Callback for when the next page of rows was retrieved"""
+        (expr, offset) = param
+        item = self.find_item(expr)
+        if item is None:
+            return
+
+        more = self.find_morenode(item)
+        entry = None
+        for expression in variables or list():
+            if hasattr(expression, "get") and expression.get("expr", None) == expr:
+                entry = expression
+                break
+
+        if entry is None or "error" in entry or "subnodes" not in entry:
+            if more is not None:
+                self.SetItemText(more, u' ' + _("Data Retrieval Timeout"),
+                                 VariablesList.COL_VALUE)
+            return
+
+        if self.get_loadedcount(item) != offset:
+            return # Rows were updated meanwhile
+
+        if more is not None:
+            self.Delete(more)
+        for subnode in entry["subnodes"]:
+            _name = unicode(subnode["name"])
+            if not re.match(self.FilterExpr, _name):
+                continue
+            child = self.AppendItem(item, _name)
+            self.setup_row(child, subnode)
+        self.set_morenode(item, entry)
+
+        self.setcolumnwidths()
+        self.Refresh()
+
     # Helper functions
+    def page_request(self, expr, offset=0, count=NAMESPACE_PAGE):
+        """Get the namespace request for a page of the children of an
+        expression.
+        @param expr: expression
+        @keyword offset: first child
+        @keyword count: number of children
+        @return: tuple
+
+        """
+        return (expr, True, offset, count, self.FilterExpr or None)
+
+    def find_morenode(self, item):
+        """Get the "Load more" row of an item
+        @return: tree item or None
+
+        """
+        children = self.GetChildNodes(item)
+        if children and self.GetPyData(children[-1])[0] == _("Load more..."):
+            return children[-1]
+        return None
+
+    def get_loadedcount(self, item):
+        """Get the number of child rows retrieved for an item"""
+        count = 0
+        for child in self.GetChildNodes(item):
+            if self.GetPyData(child)[0] not in [_("Loading..."),
+                                                _("Data Retrieval Timeout"),
+                                                _("Load more...")]:
+                count += 1
+        return count
+
+    def set_morenode(self, item, entry):
+        """Add a "Load more" row to an item when not all of its children
+        were retrieved.
+        @param item: tree item
+        @param entry: namespace info of the item's expression
+
+        """
+        more = self.find_morenode(item)
+        if more is not None:
+            self.Delete(more)
+
+        if "offset" not in entry:
+            return
+        remaining = entry["n_subnodes"] - entry["offset"] - len(entry["subnodes"])
+        if remaining > 0:
+            child = self.AppendItem(item, _("Load more..."))
+            self.SetItemText(child, u' ' + _("%d more") % remaining,
+                             VariablesList.COL_VALUE)
+            self.SetItemPyData(child, (_("Load more..."), False))
+
     def get_numberofchildren(self, item):
         nochildren = self.GetChildrenCount(item)
         if nochildren != 1:
@@ -372,25 +627,33 @@ class VariablesList(wx.gizmos.TreeListCtrl):
             _name = unicode(subnode["name"])
             if not re.match(self.FilterExpr, _name):
                 continue
-            _type = unicode(subnode["type"])
-            _value = PyStudioUtils.get_unicodevalue(subnode["repr"])
-
             child = self.AppendItem(item, _name)
-            self.SetItemText(child, u' ' + _value, VariablesList.COL_VALUE)
-            self.SetItemText(child, u' ' + _type, VariablesList.COL_TYPE)
-            self.SetItemPyData(child, (subnode["expr"], subnode["fvalid"]))
-            self.SetItemHasChildren(child, (subnode["n_subnodes"] > 0))
-            # Add some bitmaps depending on the object type
-            if subnode["type"] in ('type', 'module'):
-                self.SetItemImage(child, self._imgmap[VariablesList.IMG_CLASS])
-            elif subnode["type"] in ('function', 'builtin_function_or_method',
-                                     'instancemethod'):
-                self.SetItemImage(child, self._imgmap[VariablesList.IMG_FUNCT])
-            else:
-                self.SetItemImage(child, self._imgmap[VariablesList.IMG_VAR])
+            self.setup_row(child, subnode)
+        self.set_morenode(item, first_variable_with_expr)
 
         self.Expand(item)
 
+    def setup_row(self, child, subnode):
+        """Set the value, type, data and image of a row
+        @param child: tree item
+        @param subnode: namespace info of the row
+
+        """
+        _type = unicode(subnode["type"])
+        _value = PyStudioUtils.get_unicodevalue(subnode["repr"])
+        self.SetItemText(child, u' ' + _value, VariablesList.COL_VALUE)
+        self.SetItemText(child, u' ' + _type, VariablesList.COL_TYPE)
+        self.SetItemPyData(child, (subnode["expr"], subnode["fvalid"]))
+        self.SetItemHasChildren(child, (subnode["n_subnodes"] > 0))
+        # Add some bitmaps depending on the object type
+        if subnode["type"] in ('type', 'module'):
+            self.SetItemImage(child, self._imgmap[VariablesList.IMG_CLASS])
+        elif subnode["type"] in ('function', 'builtin_function_or_method',
+                                 'instancemethod'):
+            self.SetItemImage(child, self._imgmap[VariablesList.IMG_FUNCT])
+        else:
+            self.SetItemImage(child, self._imgmap[VariablesList.IMG_VAR])
+
     def find_item(self, expr):
         item = self.GetRootItem()
         while item:
@@ -422,14 +685,15 @@ class VariablesList(wx.gizmos.TreeListCtrl):
         expressionlist = []
 
         while len(variablelist) > 0:
-            item = variablelist.pop(0)
+            item = variablelist.pop()
             (expr, is_valid) = self.GetPyData(item)
             fExpand = self.IsExpanded(item) and self.get_numberofchildren(item) > 0
             if not fExpand:
                 continue
 
-            expressionlist.append((expr, True))
+            expressionlist.append((expr, True, 0, self.get_loadedcount(item)))
             items = self.GetChildNodes(item)
-            variablelist = items + variablelist
+            items.reverse()
+            variablelist.extend(items)
 
         return expressionlist
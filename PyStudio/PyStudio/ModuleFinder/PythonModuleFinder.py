@@ -18,12 +18,12 @@ import os
 import pkg_resources
 
 # Local Imports
-from PyStudio.Common import ToolConfig
 from PyStudio.Common.PyStudioUtils import PyStudioUtils
-from PyStudio.Common.ProcessCreator import ProcessCreator
+from PyStudio.Common import ToolHost
 from PyStudio.ModuleFinder.AbstractModuleFinder import AbstractModuleFinder
 
 # Editra Libraries
+import ed_glob
 import util
 import ebmlib
 
@@ -51,55 +51,56 @@ class PythonModuleFinder(AbstractModuleFinder):
         self.quickfind = quickfind
         self.localpath = localpath
 
+    def _RunFinder(self, text):
+        """Run findmodule in a tool process of the configured Python. The
+        tool process keeps the module index, stored in Editra's cache
+        directory, loaded between searches. The index is built by the first
+        search and brought up to date by each one after it.
+        @param text: module name
+        @return: (bool, list of paths or error)
+
+        """
+        # No findmodule found in plugin
+        if not pkg_resources.resource_exists("PyStudio.ModuleFinder", "findmodule.py"):
+            return (False, ERROR_NO_FINDMODULE)
+
+        flag, host = ToolHost.GetToolHost("PyFind", self.pythonpath)
+
+        if not flag:
+            # No configured Python
+            return (False, host)
+
+        findmodule_script = pkg_resources.resource_filename("PyStudio.ModuleFinder", "findmodule.py")
+        try:
+            rval = host.Call("findmodule", script=findmodule_script,
+                             text=text, localpath=self.localpath,
+                             firstmatch=self.quickfind,
+                             indexdir=ed_glob.CONFIG['CACHE_DIR'])
+        except ToolHost.ToolHostError, msg:
+            util.Log("[PyFind][err] %s" % msg)
+            return (False, unicode(msg))
+        finally:
+            host.Release()
+        return (True, rval)
+
     def RunModuleFind(self):
         """Run Module Finder
         @note: runs on background thread
         """
         results = FindResults()
-        flag, localpythonpath = ToolConfig.GetPythonExecutablePath("PyFind")
-
+        flag, rows = self._RunFinder(self.moduletofind)
         if not flag:
-            # No configured Python
-            results.Errors.add(localpythonpath)
-            return results
-
-        # No findmodule found in plugin
-        if not pkg_resources.resource_exists("PyStudio.ModuleFinder", "findmodule.py"):
-            results.Errors.add(ERROR_NO_FINDMODULE)
+            results.Errors.add(rows)
             return results
 
-        findmodule_script = pkg_resources.resource_filename("PyStudio.ModuleFinder", "findmodule.py")
-
-        # Start find module
-        finder_cmd = [localpythonpath, findmodule_script]
-        if self.localpath:
-            finder_cmd.append(self.localpath)
-        finder_cmd.append(self.moduletofind)
-        if self.quickfind:
-            finder_cmd.append('firstmatch')
-        processcreator = ProcessCreator("PyFind", ".", finder_cmd, self.pythonpath)
-        process = processcreator.createprocess()
-        stdoutdata, stderrdata = process.communicate()
-        processcreator.restorepath()
-
-        util.Log("[PyFind][info] stdout %s" % stdoutdata)
-        util.Log("[PyFind][info] stderr %s" % stderrdata)
         util.Log("[PyFind][info] PyFind command finished running")
-        try:
-            stdoutrows = eval(stdoutdata.rstrip('\r\n'))
-            if self.pythonpath:
-                results.Info.append((INFO_USED_PATH, u", ".join(self.pythonpath)))
-            results.Info.append((INFO_COMMAND_LINE, " ".join(finder_cmd)))
-            if self.dirvarfile:
-                results.Info.append((INFO_DIRVARS, self.dirvarfile))
-            results.SetResults(stdoutrows)
-            return results
-        except Exception, ex:
-            msg = repr(ex)
-            util.Log("[PyFind][info] Error: %s" % msg)
-            results.Errors.add(msg)
-            return results
-        results.Errors.add(ERROR_UNKNOWN)
+        if self.pythonpath:
+            results.Info.append((INFO_USED_PATH, u", ".join(self.pythonpath)))
+        finder_cmd = [u"findmodule", self.localpath or u"", self.moduletofind]
+        results.Info.append((INFO_COMMAND_LINE, u" ".join(finder_cmd)))
+        if self.dirvarfile:
+            results.Info.append((INFO_DIRVARS, self.dirvarfile))
+        results.SetResults(rows)
         return results
 
 #-----------------------------------------------------------------------------#
@@ -16,10 +16,41 @@ __revision__ = "$Revision$"
 import os
 import sys
 import re
+import bisect
+import marshal
+import time
+import zlib
 
 #--------------------------------------------------------------------------#
 # Globals
 
+_SRC_EXT = '.py', '.pyw'
+
+try:
+    _INTERN = intern
+except NameError:
+    _INTERN = sys.intern
+
+def _intern(value):
+    """Intern a path so that marshal stores repeated paths once"""
+    if isinstance(value, str):
+        return _INTERN(value)
+    return value
+
+# a path we can safely skip for better performance
+_WXLOCALE = os.path.join('wx', 'locale')
+
+#--------------------------------------------------------------------------#
+
+def GetSearchPath():
+    """Get the module search path of the running interpreter
+    @return: list of directories
+
+    """
+    return [ path for path in sys.path if path and os.path.isdir(path) ]
+
+#--------------------------------------------------------------------------#
+
 class ModuleFinder(object):
     """
     This component finds the source file of all the modules matching
@@ -31,21 +62,24 @@ class ModuleFinder(object):
     2) traversing the filesystem starting at a given search path
     (0 or N results) and matching files and packages using various
     criteria described below. This is the default strategy.
-
-    For maximum execution and correctness performance, in the future, we could
-    use a persistent index to lookup the modules.
+    3) looking up the modules in a L{ModuleIndex} of the search path that
+    is kept on disk between runs. Same results as 2) but only the
+    directories that were modified since the last run are read again.
 
     """
 
-    _SRC_EXT = '.py', '.pyw'
+    _SRC_EXT = _SRC_EXT
     _BYTECODE_EXT = '.pyc', '.pyo'
 
     # a path we can safely skip for better performance
-    _WXLOCALE = os.path.join('wx', 'locale')
+    _WXLOCALE = _WXLOCALE
 
-    def __init__(self, searchpath=None, firstmatch=False):
+    def __init__(self, searchpath=None, firstmatch=False, indexdir=None):
         """
         @param searchpath: list of modules search path
+        @keyword firstmatch: stop at the first module found
+        @keyword indexdir: directory to keep the module index in. If None
+                           the search path is traversed on every search.
         """
         super(ModuleFinder, self).__init__()
 
@@ -55,6 +89,9 @@ class ModuleFinder(object):
         self._searchpath = searchpath
         self._sources = []
         self._exit_on_first = firstmatch
+        self._index = None
+        if indexdir is not None:
+            self._index = ModuleIndex(indexdir)
 
     def Find(self, text):
         """ Find the source files of modules matching text.
@@ -63,10 +100,29 @@ class ModuleFinder(object):
         otherwise
         """
         rval = list()
-        if text:
+        if text and self._index is not None:
+            self._index.Update(self._searchpath)
+            rval = self._index.Find(text, self._searchpath,
+                                    self._exit_on_first)
+            self._index.Save()
+        elif text:
             rval = self._Find(text);
         return rval
 
+    def SetIndex(self, index):
+        """Use an already loaded module index
+        @param index: L{ModuleIndex}
+        """
+        self._index = index
+
+    def UpdateIndex(self):
+        """Bring the module index of the search path up to date without
+        searching for anything.
+        """
+        if self._index is not None:
+            self._index.Update(self._searchpath)
+            self._index.Save()
+
     def _Find(self, text):
         """Find pure python modules matching text by walking the search path
         and doing a prefix match (case insensitive).
@@ -182,22 +238,371 @@ class ModuleFinder(object):
     def _Skip(self, path):
         return path in self._searchpath or path.endswith(ModuleFinder._WXLOCALE)
 
+#--------------------------------------------------------------------------#
+
+class ModuleIndex(object):
+    """Index of the python source files found under the directories of a
+    module search path. The index is stored in a file for each interpreter
+    in indexdir and is brought up to date by reading only the directories
+    whose modification time changed, as adding, removing or renaming a file
+    changes the modification time of its directory.
+
+    For each search path directory (root) a sorted list of
+    (lowercase name, name, file name, ispkg, directory) entries is kept for
+    the modules and packages found below it, so prefix searches are binary
+    searches. Directories get a serial number when they are read so that
+    only the entries of the directories read since a root was last updated
+    need to be replaced.
+
+    """
+    VERSION = 3
+    MAX_ROOTS = 64  # Number of search path directories to keep indexes for
+
+    def __init__(self, indexdir):
+        """Load the index of the running interpreter
+        @param indexdir: directory to store the index file in
+
+        """
+        super(ModuleIndex, self).__init__()
+
+        # Attributes
+        self._path = os.path.join(indexdir, self.GetIndexName())
+        self._dirs = dict()     # path -> (mtime, files, subdirs, serial)
+        self._roots = dict()    # root -> (serial, entries, skipped roots)
+        self._used = dict()     # root -> last time used
+        self._serial = 0        # Incremented for each directory read
+        self._changed = False
+
+        # Setup
+        self.Load()
+
+    @staticmethod
+    def GetIndexName():
+        """Get the index file name for the running interpreter
+        @return: string
+
+        """
+        key = "%s|%s" % (sys.executable, sys.version)
+        return "pyfind_%08x.idx" % (zlib.crc32(key.encode('utf-8')) & 0xffffffff)
+
+    def Load(self):
+        """Load the index from disk, a missing or unreadable index is
+        rebuilt on the next update.
+
+        """
+        try:
+            handle = open(self._path, 'rb')
+            try:
+                data = marshal.load(handle)
+            finally:
+                handle.close()
+            if data.get('version') == ModuleIndex.VERSION:
+                self._dirs = data['dirs']
+                self._roots = data['roots']
+                self._used = data['used']
+                self._serial = data['serial']
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            pass
+
+    def Save(self):
+        """Write the index to disk if it was modified"""
+        if not self._changed:
+            return
+
+        # Forget the roots that were not used for the longest time
+        if len(self._roots) > ModuleIndex.MAX_ROOTS:
+            roots = sorted(self._used.keys(), key=lambda root: self._used[root])
+            for root in roots[:len(roots) - ModuleIndex.MAX_ROOTS]:
+                self._roots.pop(root, None)
+                del self._used[root]
+            self._Collect()
+
+        data = dict(version=ModuleIndex.VERSION, dirs=self._dirs,
+                    roots=self._roots, used=self._used, serial=self._serial)
+        tmp = "%s.%d" % (self._path, os.getpid())
+        try:
+            handle = open(tmp, 'wb')
+            try:
+                marshal.dump(data, handle)
+            finally:
+                handle.close()
+            if sys.platform == 'win32' and os.path.exists(self._path):
+                os.remove(self._path)
+            os.rename(tmp, self._path)
+        except (IOError, OSError):
+            pass
+        else:
+            self._changed = False
+
+    def Update(self, searchpath):
+        """Bring the index of the directories in the search path up to date
+        @param searchpath: list of directories
+
+        """
+        now = time.time()
+        changed = False
+        for root in searchpath:
+            if os.path.isdir(root):
+                self._used[root] = now
+                changed = self._UpdateRoot(root, searchpath) or changed
+
+        if changed:
+            self._changed = True
+            self._Collect()
+
+    def _UpdateRoot(self, root, searchpath):
+        """Read the directories below root that changed since the root was
+        last updated and update the module entries of those directories.
+        Search path directories below root are indexed as their own roots.
+        @return: bool (True if anything changed)
+
+        """
+        prefix = os.path.join(root, '')
+        skip = [ path for path in searchpath if path.startswith(prefix) ]
+        skip.sort()
+        serial, entries, oldskip = self._roots.get(root, (-1, list(), skip))
+        if skip != oldskip:
+            serial, entries = -1, list()
+
+        join = os.path.join # optimization
+        reached = set()
+        newer = list()
+        stack = [root]
+        while stack:
+            path = _intern(stack.pop())
+            if path in reached:
+                continue
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+
+            entry = self._dirs.get(path, None)
+            if entry is None or entry[0] != mtime:
+                self._serial += 1
+                entry = self._ReadDir(path, mtime, self._serial)
+                self._dirs[path] = entry
+            if entry[3] > serial:
+                newer.append(path)
+            reached.add(path)
+            stack.extend([ join(path, dname) for dname in entry[2] ])
+            if skip:
+                stack = [ dpath for dpath in stack if dpath not in skip ]
+
+        if not newer and serial >= 0:
+            return False
+
+        # Replace the entries of the directories that were read again and
+        # drop the ones of the directories that are gone.
+        entries = [ item for item in entries if item[4] in reached and
+                    self._dirs[item[4]][3] <= serial ]
+        for path in newer:
+            entries.extend(self._DirEntries(root, path))
+        entries.sort()
+        self._roots[root] = (self._serial, entries, skip)
+        return True
+
+    def _ReadDir(self, path, mtime, serial):
+        """Read the source files and sub directories of a directory
+        @return: (mtime, [source files], [sub directories], serial)
+
+        """
+        files = list()
+        dirs = list()
+        try:
+            names = os.listdir(path)
+        except OSError:
+            names = list()
+
+        for name in names:
+            fqdn = os.path.join(path, name)
+            if os.path.isdir(fqdn):
+                if not fqdn.endswith(_WXLOCALE):
+                    dirs.append(name)
+            elif os.path.splitext(name)[1] in _SRC_EXT:
+                files.append(name)
+        return (mtime, files, dirs, serial)
+
+    def _DirEntries(self, root, path):
+        """Get the module entries of the files in a directory and of the
+        directory itself if it is a package.
+        @return: list of (lowercase name, name, file name, ispkg, directory)
+
+        """
+        entries = list()
+        files = self._dirs[path][1]
+        for fname in files:
+            name = os.path.splitext(fname)[0]
+            entries.append((name.lower(), name, fname, False, path))
+        if path != root and '__init__.py' in files:
+            name = os.path.basename(path)
+            entries.append((name.lower(), name, '__init__.py', True, path))
+        return entries
+
+    def _Collect(self):
+        """Remove the directories that can no longer be reached from an
+        indexed root.
+
+        """
+        reachable = set()
+        for root in self._roots.keys():
+            stack = [root]
+            while stack:
+                path = stack.pop()
+                if path in reachable or path not in self._dirs:
+                    continue
+                reachable.add(path)
+                stack.extend([ os.path.join(path, dname)
+                               for dname in self._dirs[path][2] ])
+
+        for path in list(self._dirs.keys()):
+            if path not in reachable:
+                del self._dirs[path]
+
+    def _IsPackage(self, path):
+        """Is the directory a package
+        @param path: directory path
+
+        """
+        entry = self._dirs.get(path, None)
+        return entry is not None and '__init__.py' in entry[1]
+
+    def _IsHidden(self, dname, root, text):
+        """Check if a module below root would not be found by the traversal
+        strategy because it is inside of a package named text.
+        @param dname: directory containing the module
+        @param root: search path directory the module was found in
+
+        """
+        while len(dname) > len(root):
+            if os.path.basename(dname) == text and self._IsPackage(dname):
+                return True
+            dname = os.path.dirname(dname)
+        return False
+
+    def Find(self, text, searchpath, firstmatch=False):
+        """Find the source files of the modules matching text. Matches the
+        same modules as L{ModuleFinder} does by traversing the search path.
+        @param text: module name (case insensitive prefix or dotted name)
+        @param searchpath: list of directories
+        @keyword firstmatch: only return the best match, an exact name
+                             match before a prefix match and then the one
+                             closest to the search path directory.
+        @return: list of paths
+
+        """
+        parts = text.split('.')
+        text = parts[-1]
+        sources = list()
+        for root in searchpath:
+            if root not in self._roots:
+                continue
+
+            found = list()
+            if parts[:-1]:
+                self._PackageFind(root, text, parts[:-1], searchpath, found)
+            else:
+                self._FreeFind(root, text, found)
+
+            if firstmatch and found:
+                lower = text.lower()
+                def Rank(path):
+                    """Sort key for the best match"""
+                    name = os.path.splitext(os.path.basename(path))[0]
+                    if name == '__init__':
+                        name = os.path.basename(os.path.dirname(path))
+                    return (name.lower() != lower, path.count(os.sep))
+                return [ min(found, key=Rank) ]
+            sources.extend(found)
+        return sources
+
+    def _FreeFind(self, root, text, sources):
+        """Find the modules below root whose name starts with text and the
+        packages named text.
+
+        """
+        entries = self._roots[root][1]
+        lower = text.lower()
+        hidden = dict() # directory -> bool
+        idx = bisect.bisect_left(entries, (lower,))
+        while idx < len(entries) and entries[idx][0].startswith(lower):
+            lname, name, fname, ispkg, dname = entries[idx]
+            idx += 1
+            if ispkg:
+                if name != text:
+                    continue
+                parent = os.path.dirname(dname)
+            else:
+                parent = dname
+
+            if parent not in hidden:
+                hidden[parent] = self._IsHidden(parent, root, text)
+            if not hidden[parent]:
+                sources.append(os.path.join(dname, fname))
+
+    def _PackageFind(self, root, text, ns, searchpath, sources):
+        """Find the modules matching text in the package ns below root.
+        The possible matches are the same as for
+        L{ModuleFinder._PackageSearch} but a package named text is only
+        matched inside of ns.
+
+        """
+        lower = text.lower()
+        path = root
+        ns = list(ns)
+        while path in self._dirs:
+            pkg = None
+            if ns:
+                pkg = ns.pop(0)
+
+            files, dirs = self._dirs[path][1:3]
+            for fname in files:
+                name, ext = os.path.splitext(fname)
+                if (not pkg and name.lower().startswith(lower)) or \
+                   name == pkg:
+                    sources.append(os.path.join(path, fname))
+
+            subdir = None
+            for dname in dirs:
+                dpath = os.path.join(path, dname)
+                if dpath in searchpath:
+                    continue
+                if not pkg and dname == text and self._IsPackage(dpath):
+                    sources.append(os.path.join(dpath, '__init__.py'))
+                    return
+                elif dname == pkg:
+                    subdir = dpath
+
+            if subdir is None:
+                break
+            path = subdir
+
 #--------------------------------------------------------------------------#
 # Main
 if __name__ == '__main__':
     # TODO: more proper command line argument handling...
     # modulefinder localdir modulename
     # modulefinder modulename
+    # modulefinder --index=indexdir [localdir] [modulename]
     path = list(sys.path)
     firstmatch = False
     if 'firstmatch' in sys.argv:
         firstmatch = True
         sys.argv.remove('firstmatch')
+    indexdir = None
+    for arg in list(sys.argv):
+        if arg.startswith('--index='):
+            indexdir = arg[len('--index='):]
+            sys.argv.remove(arg)
     if len(sys.argv) == 3:
         dpath = sys.argv[1]
         assert os.path.isdir(dpath)
         path.insert(0, dpath)
         sys.argv.pop(1)
-    mf = ModuleFinder(path, firstmatch)
-    result = mf.Find(sys.argv[1])
-    print result
+    mf = ModuleFinder(path, firstmatch, indexdir)
+    if len(sys.argv) == 1 and indexdir:
+        # Only bring the index up to date
+        mf.UpdateIndex()
+    else:
+        result = mf.Find(sys.argv[1])
+        print(result)
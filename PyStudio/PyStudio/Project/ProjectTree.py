@@ -20,6 +20,7 @@ __revision__ = "$Revision$"
 #-----------------------------------------------------------------------------#
 # Dependencies
 import os
+import bisect
 import fnmatch
 import wx
 
@@ -34,7 +35,7 @@ import ed_basewin
 # Local Imports
 from PyStudio.Common import ToolConfig
 from PyStudio.Common.Messages import PyStudioMessages
-from PyStudio.Common.PyStudioUtils import PyStudioUtils
+from PyStudio.Common.PyStudioUtils import PyStudioUtils, RunAsyncTask
 from PyStudio.Controller.FileController import FileController
 import PyStudio.Project.ProjectUtil as ProjectUtil
 
@@ -42,6 +43,9 @@ import PyStudio.Project.ProjectUtil as ProjectUtil
 
 _ = wx.GetTranslation
 
+EXPAND_CHUNK = 200  # Nodes added to an expanding folder per event loop pass
+EXPAND_PAGE = 1000  # Nodes shown before a folder needs "Show more"
+
 #-----------------------------------------------------------------------------#
 
 class ProjectTree(ed_basewin.EDBaseFileTree):
@@ -62,6 +66,8 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
 
         # Attributes
         self._proj = None
+        self._index = dict() # path -> TreeItem of the displayed nodes
+        self._jobs = dict()  # path -> _ExpandJob of the folders being filled
         self._menu = ebmlib.ContextMenuManager()
         self._monitor = ebmlib.DirectoryMonitor(checkFreq=2000.0)
         self._monitor.SubscribeCallback(self.OnFilesChanged)
@@ -91,10 +97,21 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
 
     #---- Overrides ----#
 
+    def AppendFileNode(self, item, path):
+        """Append a node for the path and add it to the path index
+        @param item: parent TreeItem
+        @param path: file path
+        @return: new TreeItem
+
+        """
+        child = super(ProjectTree, self).AppendFileNode(item, path)
+        self._index[path] = child
+        return child
+
     def DoBeginEdit(self, item):
         """Handle when an item is requested to be edited"""
         # TODO: pass handling to see if the path can be edited to FileController?
-        if self.IsProjectRoot(item):
+        if self.IsProjectRoot(item) or self.GetPyData(item) is None:
             return False
         return True
 
@@ -111,7 +128,9 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
 
         """
         path = self.GetPyData(item)
-        if path and os.path.exists(path):
+        if path is None:
+            self._ShowNextPage(item)
+        elif os.path.exists(path):
             if not os.path.isdir(path):
                 PyStudioUtils.GetEditorOrOpenFile(self.Parent.MainWindow, path)
         # TODO notify failure to open
@@ -120,14 +139,17 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
         """Handle when an item is collapsed"""
         d = self.GetPyData(item)
         self._monitor.RemoveDirectory(d)
+        self._jobs.pop(d, None)
+        self._RemoveChildrenFromIndex(item)
         super(ProjectTree, self).DoItemCollapsed(item)
 
     def DoItemExpanding(self, item):
-        """Handle when an item is expanding to display the folder contents
+        """Handle when an item is expanding to display the folder contents.
+        The folder is read in the background and its nodes are added in
+        chunks so that large folders do not block the ui.
         @param item: TreeItem
 
         """
-        busy = wx.BusyCursor()
         d = None
         try:
             d = self.GetPyData(item)
@@ -136,11 +158,10 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
             return
 
         if d and os.path.exists(d) and os.access(d, os.R_OK):
-            contents = ProjectTree.GetDirContents(d)
-            contents = self.FilterFileList(contents)
-            with eclib.Freezer(self):
-                self.AppendFileNodes(item, contents)
-                self.SortChildren(item)
+            job = _ExpandJob(item, d)
+            job.placeholder = self.AppendItem(item, _("Loading..."))
+            self._jobs[d] = job
+            RunAsyncTask("PyProject", self._OnDirRead, self._ReadDir, job)
 
             if not self._monitor.AddDirectory(d):
                 self.SetItemImage(item, ProjectUtil.FileIcons.IMG_NO_ACCESS)
@@ -178,6 +199,8 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
             path = self.GetPyData(item)
         except wx.PyAssertionError:
             return # non tree area was clicked (or empty)
+        if path is None:
+            return # loading or show more node
         self._menu.Clear()
         menu = wx.Menu()
 
@@ -286,36 +309,40 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
         with the filesystem.
 
         """
-        nodes = self.GetExpandedNodes()
-        visible = list()
-        for node in nodes:
-            visible.extend(self.GetChildNodes(node))
-
-        # Remove any deleted file objects
-        for fobj in deleted:
-            for item in visible:
-                path = self.GetPyData(item)
-                if fobj.Path == path:
-                    self.Delete(item)
-                    visible.remove(item)
-                    break
-
-        # Add any new file objects to the view
-        needsort = list()
-        added = self.FilterFileList([fobj.Path for fobj in added])
-        for fobj in added:
-            dpath = os.path.dirname(fobj)
-            for item in nodes:
-                path = self.GetPyData(item)
-                if path == dpath:
-                    self.AppendFileNode(item, fobj)
-                    if item not in needsort:
-                        needsort.append(item)
-                    break
-
-        # Resort display
+        if not deleted and not added:
+            return
+
         with eclib.Freezer(self):
-            for item in needsort:
+            # Remove any deleted file objects
+            for fobj in deleted:
+                item = self._index.get(fobj.Path, None)
+                if item is not None:
+                    self._RemoveChildrenFromIndex(item)
+                    del self._index[fobj.Path]
+                    self._jobs.pop(fobj.Path, None)
+                    self.Delete(item)
+                else:
+                    # Not shown yet, keep it from being added later
+                    job = self._jobs.get(os.path.dirname(fobj.Path), None)
+                    if job is not None:
+                        job.removed.add(fobj.Path)
+
+            # Add any new file objects to the expanded folders
+            needsort = dict()
+            for path in self.FilterFileList([fobj.Path for fobj in added]):
+                if path in self._index:
+                    continue
+                dpath = os.path.dirname(path)
+                item = self._index.get(dpath, None)
+                if item is not None and self.IsExpanded(item):
+                    job = self._jobs.get(dpath, None)
+                    if job is not None and job.Insert(path, self.DoGetFileImage(path)):
+                        continue # Added with the rest of the folder
+                    self.AppendFileNode(item, path)
+                    needsort[dpath] = item
+
+            # Resort display
+            for item in needsort.itervalues():
                 self.SortChildren(item)
 
         # TODO: pass modification notifications onto FileController interface
@@ -325,19 +352,18 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
 
     def OnCompareItems(self, item1, item2):
         """Handle SortItems"""
+        # Loading and "Show more" nodes have no path and stay at the end
         data = self.GetPyData(item1)
         if data is not None:
-            path1 = int(not os.path.isdir(data))
+            tup1 = (int(not os.path.isdir(data)), data.lower())
         else:
-            path1 = 0
-        tup1 = (path1, data.lower())
+            tup1 = (2, u"")
 
         data2 = self.GetPyData(item2)
         if data2 is not None:
-            path2 = int(not os.path.isdir(data2))
+            tup2 = (int(not os.path.isdir(data2)), data2.lower())
         else:
-            path2 = 0
-        tup2 = (path2, data2.lower())
+            tup2 = (2, u"")
 
         if tup1 < tup2:
             return -1
@@ -377,6 +403,8 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
 
         """
         self.DeleteChildren(self.RootItem)
+        self._index.clear()
+        self._jobs.clear()
         if self.Project and self.Project.ProjectRoot:
             self.RemoveWatchDirectory(self._proj.ProjectRoot)
         self._proj = proj
@@ -386,6 +414,7 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
         # Repopulate root of tree
         item = self.AddWatchDirectory(self.Project.ProjectRoot)
         if item:
+            self._index[self.Project.ProjectRoot] = item
             iconmgr = ProjectUtil.FileIcons
             self.SetItemImage(item, iconmgr.IMG_PROJECT)
             self.Expand(item)
@@ -462,6 +491,127 @@ class ProjectTree(ed_basewin.EDBaseFileTree):
             rAdd(path)
         return rval
 
+    def _RemoveChildrenFromIndex(self, item):
+        """Remove the descendants of an item from the path index
+        @param item: TreeItem
+
+        """
+        for child in self.GetChildNodes(item):
+            if self.ItemHasChildren(child):
+                self._RemoveChildrenFromIndex(child)
+            path = self.GetPyData(child)
+            if self._index.get(path, None) == child:
+                del self._index[path]
+                self._jobs.pop(path, None)
+
+    def _ReadDir(self, job):
+        """Read the contents of a folder, run in the background.
+        @param job: _ExpandJob
+        @return: _ExpandJob
+
+        """
+        contents = self.FilterFileList(ProjectTree.GetDirContents(job.path))
+        entries = list()
+        for path in contents:
+            isdir = os.path.isdir(path)
+            entries.append((int(not isdir), path.lower(), path, isdir,
+                            self.DoGetFileImage(path)))
+        entries.sort()
+        job.entries = entries
+        return job
+
+    def _OnDirRead(self, job):
+        """Start adding the nodes of a folder that was read
+        @param job: _ExpandJob
+
+        """
+        if not self or not isinstance(job, _ExpandJob):
+            return # Window was destroyed or the read failed
+        job.limit = min(len(job.entries), EXPAND_PAGE)
+        self._AddNodes(job)
+
+    def _AddNodes(self, job):
+        """Add the next chunk of folder nodes of the current page
+        @param job: _ExpandJob
+
+        """
+        if not self or self._jobs.get(job.path, None) is not job:
+            return # Window destroyed or the folder was collapsed
+
+        end = min(job.pos + EXPAND_CHUNK, job.limit)
+        with eclib.Freezer(self):
+            for entry in job.entries[job.pos:end]:
+                path, isdir, img = entry[2:]
+                if path in self._index or path in job.removed:
+                    continue
+                child = self.AppendItem(job.item, os.path.basename(path), img)
+                self.SetPyData(child, path)
+                if isdir:
+                    self.SetItemHasChildren(child, True)
+                self._index[path] = child
+        job.pos = end
+        if job.pos < job.limit:
+            wx.CallAfter(self._AddNodes, job)
+            return
+
+        # Page is complete, replace the loading node
+        self.Delete(job.placeholder)
+        job.placeholder = None
+        remaining = len(job.entries) - job.pos
+        if remaining:
+            job.more = self.AppendItem(job.item,
+                                       _("Show %d more...") % remaining)
+        else:
+            del self._jobs[job.path]
+
+    def _ShowNextPage(self, item):
+        """Add the next page of nodes when a "Show more" node is activated
+        @param item: TreeItem
+
+        """
+        job = self._jobs.get(self.GetPyData(self.GetItemParent(item)), None)
+        if job is not None and job.more == item:
+            self.SetItemText(item, _("Loading..."))
+            job.placeholder = item
+            job.more = None
+            job.limit = min(len(job.entries), job.pos + EXPAND_PAGE)
+            self._AddNodes(job)
+
     def SuspendChecks(self, suspend=True):
         """Suspend/Continue background monitoring"""
         self._monitor.Suspend(suspend)
+
+#-----------------------------------------------------------------------------#
+
+class _ExpandJob(object):
+    """State of a folder whose nodes are being added to the tree"""
+    def __init__(self, item, path):
+        super(_ExpandJob, self).__init__()
+
+        # Attributes
+        self.item = item          # TreeItem of the folder
+        self.path = path
+        self.entries = list()     # [(sort key..., path, isdir, image),]
+        self.pos = 0              # Entries added so far
+        self.limit = 0            # End of the current page
+        self.removed = set()      # Deleted paths not shown yet
+        self.placeholder = None   # Loading node
+        self.more = None          # Show more node
+
+    def Insert(self, path, img):
+        """Add a new file to the entries that are not shown yet
+        @param path: file path
+        @param img: image index
+        @return: bool (False if it sorts before the shown nodes)
+
+        """
+        isdir = os.path.isdir(path)
+        entry = (int(not isdir), path.lower(), path, isdir, img)
+        idx = bisect.bisect(self.entries, entry)
+        if idx < self.pos:
+            return False
+        self.removed.discard(path)
+        self.entries.insert(idx, entry)
+        if idx < self.limit:
+            self.limit += 1
+        return True
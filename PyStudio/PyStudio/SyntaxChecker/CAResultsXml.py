@@ -32,6 +32,16 @@ class Result(ed_xml.EdXml):
     errType = ed_xml.String(required=True)
     errMsg = ed_xml.String(required=True)
 
+class Dependency(ed_xml.EdXml):
+    """Module imported by the analysed file
+    <dependency path="/path/to/module.py" stamp="1326000000.0:1024"/>
+
+    """
+    class meta:
+        tagname = "dependency"
+    path = ed_xml.String(required=True)
+    stamp = ed_xml.String(required=True) # modification time and size
+
 class AnalysisResults(ed_xml.EdXml):
     """Top level XML object
     <pylint path="/path/to/file"></pylint>
@@ -41,6 +51,10 @@ class AnalysisResults(ed_xml.EdXml):
         tagname = "pylint"
     path = ed_xml.String(required=True)
     results = ed_xml.List(ed_xml.Model(Result))
+    # Used by the lint results cache
+    key = ed_xml.String(required=False)
+    report = ed_xml.String(tagname="report", required=False)
+    dependencies = ed_xml.List(ed_xml.Model(Dependency), required=False)
 
     def AddResult(self, line, errType, errMsg):
         """Add a result to the result list
@@ -55,6 +69,17 @@ class AnalysisResults(ed_xml.EdXml):
         result.errMsg = errMsg
         self.results.append(result)
 
+    def AddDependency(self, path, stamp):
+        """Add a module the results depend on
+        @param path: module file path
+        @param stamp: modification stamp of the file
+
+        """
+        dependency = Dependency()
+        dependency.path = path
+        dependency.stamp = stamp
+        self.dependencies.append(dependency)
+
 class ProjectAnalysis(ed_xml.EdXml):
     """Collection of L{AnalysisResults} for an entire project"""
     class meta:
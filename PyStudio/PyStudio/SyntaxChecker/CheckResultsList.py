@@ -44,6 +44,7 @@ class CheckResultsList(eclib.EBaseListCtrl,
         # Attributes
         self.editor = None
         self._mw = None
+        self._unopened = None # (fname, data) shown without an editor
         self._il = wx.ImageList(16, 16)
 
         # Setup
@@ -84,6 +85,7 @@ class CheckResultsList(eclib.EBaseListCtrl,
     def set_editor(self, editor):
         """Set the current editor"""
         self.editor = editor
+        self._unopened = None
 
     def OnDwellStart(self, msg):
         """Show calltips for the error if dwelling over a line"""
@@ -100,9 +102,14 @@ class CheckResultsList(eclib.EBaseListCtrl,
 
     def OnItemActivate(self, evt):
         """Go to the error in the file"""
+        idx = evt.GetIndex()
+        itm = self.GetItem(idx, 1).GetText()
+        if not self.editor and self._unopened:
+            # Open the file the results are shown for
+            fname, data = self._unopened
+            self.LoadData(data, fname=fname)
+            self._unopened = None
         if self.editor:
-            idx = evt.GetIndex()
-            itm = self.GetItem(idx, 1).GetText()
             try:
                 lineNo = int(itm)
                 self.editor.GotoLine(max(0, lineNo - 1))
@@ -205,8 +212,28 @@ class CheckResultsList(eclib.EBaseListCtrl,
         else:
             self.editor = PyStudioUtils.GetEditorOrOpenFile(self._mw, fname)
         CheckResultsList._cache[fname] = LintData(data)
+        self.DeleteAllItems()
         self._PopulateRows(CheckResultsList._cache[fname])
 
+    def ShowData(self, data, fname):
+        """Display the data for a file without opening it. The file is
+        opened when a result is activated.
+        @param data: Lint data [(errorType, errorText, errorLine),]
+        @param fname: filename
+
+        """
+        # Only the rows are cleared, the markers and cached results of the
+        # current editor stay as they are.
+        self.DeleteAllItems()
+        self.editor = PyStudioUtils.GetEditorForFile(self._mw, fname)
+        if self.editor:
+            self.DeleteEditorMarkers(self.editor)
+            self.LoadData(data)
+            self._unopened = None
+        else:
+            self._unopened = (fname, data)
+            self._PopulateRows(LintData(data))
+
     def _PopulateRows(self, data):
         """Populate the list with the data
         @param data: LintData object
@@ -16,6 +16,12 @@ __revision__ = "$Revision$"
 # Imports
 import wx
 import re
+import os
+import sys
+import ast
+import bisect
+import tokenize
+import __future__
 
 # Editra imports
 import ed_msg
@@ -27,7 +33,16 @@ import util
 # PyStudio imports
 from PyStudio.Common import ToolConfig
 from PyStudio.Common.PyStudioUtils import RunAsyncTask, PyStudioUtils
-from PyStudio.Common.ProcessCreator import ProcessCreator
+from PyStudio.Common import ToolHost
+
+#-----------------------------------------------------------------------------#
+# Globals
+
+TYPING_DELAY = 60 # ms to wait after a key is released before checking
+
+_LINE_RE = re.compile(u"[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+$")
+_CODING_RE = re.compile(u"^[ \t\f]*#.*coding[:=][ \t]*[-\w.]+")
+_CLAUSES = (u"elif", u"else", u"except", u"finally")
 
 #-----------------------------------------------------------------------------#
 
@@ -39,14 +54,21 @@ class CompileEntryPoint(object):
 
         # Attributes
         self._errdata = dict() # file -> (linenum, errmsg)
+        self._parses = dict()  # buffer id -> last good parse of the buffer
+        self._pending = dict() # buffer id -> id of the latest check
+        self._checkid = 0
+        self._timer = None
+        self._versions = dict() # python -> same version as Editra's Python
 
         # Message Handlers
         ed_msg.Subscribe(self.OnFileSaved, ed_msg.EDMSG_FILE_SAVED)
         ed_msg.Subscribe(self.OnDwellStart, ed_msg.EDMSG_UI_STC_DWELL_START)
+        ed_msg.Subscribe(self.OnKeyUp, ed_msg.EDMSG_UI_STC_KEYUP)
 
     def __del__(self):
         ed_msg.Unsubscribe(self.OnFileSaved)
         ed_msg.Unsubscribe(self.OnDwellStart)
+        ed_msg.Unsubscribe(self.OnKeyUp)
 
     def OnFileSaved(self, msg):
         """Performs file saved checks"""
@@ -63,13 +85,30 @@ class CompileEntryPoint(object):
         if not buff:
             return
 
-        buff.RemoveAllMarkers(ed_marker.ErrorMarker())
-        if data[0] in self._errdata:
-            del self._errdata[data[0]]
-
         if ToolConfig.GetConfigValue(ToolConfig.TLC_COMPILE_ON_SAVE, True):
             # Run the compilation check
-            RunAsyncTask("CompileCheck", self.OnCheckComplete, self.DoCompileCheck, data[0])
+            self.CheckBuffer(buff, True)
+
+    def OnKeyUp(self, msg):
+        """Check the current buffer when typing pauses"""
+        if not ToolConfig.GetConfigValue(ToolConfig.TLC_COMPILE_AS_YOU_TYPE, True):
+            return
+
+        # Don't check on meta key events
+        if msg.GetData()[1] in (wx.WXK_SHIFT, wx.WXK_COMMAND,
+                                wx.WXK_CONTROL, wx.WXK_ALT, wx.WXK_TAB):
+            return
+
+        if self._timer is None:
+            self._timer = wx.CallLater(TYPING_DELAY, self.OnTypingPause)
+        else:
+            self._timer.Restart(TYPING_DELAY)
+
+    def OnTypingPause(self):
+        """Run the compilation check on the current buffer"""
+        buff = wx.GetApp().GetCurrentBuffer()
+        if buff and getattr(buff, 'GetLangId', lambda: -1)() == synglob.ID_LANG_PYTHON:
+            self.CheckBuffer(buff)
 
     def OnDwellStart(self, msg):
         """Show calltips for the error if dwelling over a line"""
@@ -82,58 +121,229 @@ class CompileEntryPoint(object):
             if errdata[1] and lineno == errdata[0]+1:
                 data['rdata'] = u" ".join(errdata[1].split())
 
+    def CheckBuffer(self, buff, saved=False):
+        """Start a compilation check of the text in the buffer
+        @param buff: EditraStc
+        @keyword saved: buffer was saved, do a full compile and go to the
+                        error line
+
+        """
+        self._checkid += 1
+        key = buff.GetId()
+        self._pending[key] = self._checkid
+        lastgood = None
+        if not saved:
+            lastgood = self._parses.get(key, None)
+        fname = buff.GetFileName() or u"<string>"
+        RunAsyncTask("CompileCheck", self.OnCheckComplete, self.DoCompileCheck,
+                     key, self._checkid, fname, buff.GetText(), lastgood, saved)
+
     #--- Async Task Functions ----#
 
-    def DoCompileCheck(self, path):
-        """Run a compilation check on the given path
-        @return: tuple(path, output)
+    def DoCompileCheck(self, key, checkid, fname, text, lastgood, saved):
+        """Run a compilation check on the text of a buffer. The text is
+        compiled in this process unless the configured Python has a different
+        version, then it is compiled in a tool process of the configured
+        Python.
+        @return: tuple(key, checkid, saved, fname, line, error, lastgood)
 
         """
-        flag, pypath = ToolConfig.GetPythonExecutablePath("CompileCheck")
+        if self._IsSameVersion():
+            line, err, good = CheckSource(text, fname, lastgood, not saved)
+        else:
+            good = None
+            try:
+                err = ToolHost.RunTool("CompileCheck", "compile",
+                                       path=fname, source=text)
+            except ToolHost.ToolHostError, msg:
+                util.Log("[CompileCheck][err] %s" % msg)
+                err = u""
+            line = ParseErrorLine(err)
+        return (key, checkid, saved, fname, line, err, good)
+
+    def _IsSameVersion(self):
+        """Check if the configured Python has the same version as the one
+        running Editra.
+        @return: bool
+
+        """
+        flag, python = ToolConfig.GetPythonExecutablePath("CompileCheck")
         if not flag:
-            # No configured Python
-            return (None, u"No Python") # TODO translations (send error code)
-        # run 'python -m py_compile fname'
-        parentPath = ebmlib.GetPathName(path)
-        fname = ebmlib.GetFileName(path)
-        cmd = [pypath, '-m', 'py_compile', fname]
-        # TODO: pythonpath?
-        processcreator = ProcessCreator("CompileCheck", parentPath, cmd)
-        process = processcreator.createprocess()
-        stdoutdata, stderrdata = process.communicate()
-        processcreator.restorepath()
-        return (path, stderrdata)
+            # No configured Python, check with Editra's Python
+            return True
+
+        if python not in self._versions:
+            same = os.path.realpath(python) == os.path.realpath(sys.executable)
+            if not same:
+                try:
+                    version = ToolHost.RunTool("CompileCheck", "version")
+                    same = tuple(version) == sys.version_info[:2]
+                except ToolHost.ToolHostError, msg:
+                    util.Log("[CompileCheck][err] %s" % msg)
+                    return True
+            self._versions[python] = same
+        return self._versions[python]
 
     def OnCheckComplete(self, data):
         """Callback for when compile check"""
-        if len(data) != 2:
+        if len(data) != 7:
             util.Log("[PyTools][err] OnCheckComplete Invalid Data %s" % repr(data))
             return
 
-        path = data[0]
-        err = data[1]
-        if err:
-            line = -1
-
-            # Python 3 outputs correct exception to stderr
-            pat = re.compile('File "(.+)", line ([0-9]+)')
-            matches = pat.findall(err)
-            if len(matches) and len(matches[0]) == 2:
-                match = matches[0]
-                if match[1].isdigit():
-                    line = int(matches[0][1])
-
-            # Python 2 py_compile outputs a tuple of args
-            if line < 0:
-                pat = re.compile("\('.*', ([0-9]+),")
-                matchs = pat.findall(err)
-                if len(matchs) and matchs[0].isdigit():
-                    line = max(0, int(matchs[0])-1)
-
-            if line >= 0:
-                mw = wx.GetApp().GetActiveWindow()
-                buff = PyStudioUtils.GetEditorForFile(mw, path)
-                if buff:
-                    self._errdata[path] = (line, err)
-                    buff.AddMarker(ed_marker.ErrorMarker(), line)
-                    buff.GotoLine(line)
+        key, checkid, saved, path, line, err, good = data
+        if self._pending.get(key, None) != checkid:
+            return # A newer check of the buffer is running
+        del self._pending[key]
+
+        buff = wx.FindWindowById(key)
+        if not buff or not hasattr(buff, 'RemoveAllMarkers'):
+            return
+
+        if good is not None:
+            # Forget closed buffers
+            for bid in self._parses.keys():
+                if not wx.FindWindowById(bid):
+                    del self._parses[bid]
+            self._parses[key] = good
+
+        buff.RemoveAllMarkers(ed_marker.ErrorMarker())
+        if path in self._errdata:
+            del self._errdata[path]
+        if err and line >= 0:
+            # Errors at the end of input are reported after the last line
+            line = min(line, buff.GetLineCount() - 1)
+            self._errdata[path] = (line, err)
+            buff.AddMarker(ed_marker.ErrorMarker(), line)
+            if saved:
+                buff.GotoLine(line)
+
+#-----------------------------------------------------------------------------#
+
+def ParseErrorLine(err):
+    """Get the line of the error from the output of a compilation
+    @param err: error text
+    @return: line number (0 based) or -1
+
+    """
+    pat = re.compile('File "(.+)", line ([0-9]+)')
+    matches = pat.findall(err)
+    if len(matches) and len(matches[0]) == 2:
+        match = matches[0]
+        if match[1].isdigit():
+            return max(0, int(match[1])-1)
+    return -1
+
+def _GetStatementStarts(lines, offset=0):
+    """Get the first lines of the top level statements from the tokens of
+    the source lines. A decorated statement starts at its first decorator and
+    the clauses of a compound statement (i.e else) don't start a statement.
+    The ast is not used as it gives the last line of a multi line string.
+    @param lines: source lines
+    @keyword offset: number of lines before the source lines
+    @return: list of line numbers (1 based) or None if the lines don't tokenize
+
+    """
+    starts = list()
+    depth = 0
+    newstmt = True
+    decorated = False
+    try:
+        for tok in tokenize.generate_tokens(iter(lines).next):
+            ttype = tok[0]
+            if ttype == tokenize.INDENT:
+                depth += 1
+            elif ttype == tokenize.DEDENT:
+                depth -= 1
+            elif ttype == tokenize.NEWLINE:
+                newstmt = True
+            elif ttype in (tokenize.NL, tokenize.COMMENT, tokenize.ENDMARKER):
+                continue
+            elif newstmt:
+                newstmt = False
+                if depth == 0:
+                    if not decorated and tok[1] not in _CLAUSES:
+                        starts.append(tok[2][0] + offset)
+                    decorated = (tok[1] == u'@')
+    except (tokenize.TokenError, SyntaxError):
+        return None
+    return starts
+
+def _GetFutureFlags(tree):
+    """Get the compiler flags of the __future__ imports in a module
+    @return: (bool has future imports, flags)
+
+    """
+    flags = 0
+    found = False
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module == '__future__':
+            found = True
+            for alias in node.names:
+                feature = getattr(__future__, alias.name, None)
+                flags |= getattr(feature, 'compiler_flag', 0)
+    return (found, flags)
+
+def CheckSource(text, fname, lastgood=None, astonly=True):
+    """Compile the source text. When the previous text compiled the top
+    level statements before the first changed line are not compiled again.
+    @param text: source text
+    @param fname: file name to report the errors for
+    @keyword lastgood: parse of the last text that compiled
+    @keyword astonly: only parse the text, do not generate code
+    @return: (line (0 based) or -1, error message, parse or None on error)
+
+    """
+    lines = _LINE_RE.findall(text)
+    for idx in range(min(2, len(lines))):
+        # Encoding declarations are not allowed in unicode source
+        if _CODING_RE.match(lines[idx]):
+            lines[idx] = u"\n"
+
+    start = 0       # First line to compile (0 based)
+    starts = list() # First lines of the top level statements before start
+    flags = 0
+    if lastgood is not None:
+        glines, gstarts, gflags = lastgood
+        changed = 0
+        limit = min(len(lines), len(glines))
+        while changed < limit and lines[changed] == glines[changed]:
+            changed += 1
+        if changed == len(lines) == len(glines):
+            return (-1, u"", lastgood)
+
+        # Recompile from the statement before the changed one as a changed
+        # line may continue it (i.e else clause or indented block).
+        idx = bisect.bisect_right(gstarts, changed + 1) - 2
+        if idx >= 0:
+            start = gstarts[idx] - 1
+            starts = gstarts[:idx]
+            flags = gflags
+
+    cflags = flags
+    if astonly:
+        cflags |= ast.PyCF_ONLY_AST
+    try:
+        tree = compile(u"".join(lines[start:]), fname, 'exec', cflags, True)
+    except SyntaxError, err:
+        line = max(0, (err.lineno or 1) + start - 1)
+        return (line, u"%s: %s" % (err.__class__.__name__, err.msg), None)
+    except (TypeError, ValueError):
+        # Null bytes in the source
+        return (-1, u"", None)
+
+    if not astonly:
+        return (-1, u"", None)
+
+    found, tflags = _GetFutureFlags(tree)
+    if found:
+        if starts:
+            # Future imports have to be at the start of the file
+            return CheckSource(text, fname)
+        flags |= tflags
+    tstarts = _GetStatementStarts(lines[start:], start)
+    if tstarts is None:
+        # Check all of the text again next time
+        starts = list()
+    else:
+        starts = starts + tstarts
+    return (-1, u"", (lines, starts, flags))
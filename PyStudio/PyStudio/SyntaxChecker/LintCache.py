@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+# Name: LintCache.py
+# Purpose: Persistent cache of PyLint results
+# Author: Cody Precord <cprecord@editra.org>
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>
+# License: wxWindows License
+##############################################################################
+"""
+Persistent cache of PyLint results. Results are stored in the
+L{AnalysisResults} xml format in Editra's cache directory, keyed by a hash of
+the file contents, the pylint arguments and the configuration file pylint
+uses, the PYTHONPATH and the interpreter. The local modules imported by the
+file, directly or through other local modules, are recorded with the results
+so that the entry is discarded when one of them changes.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import re
+import hashlib
+import threading
+
+# Editra Libraries
+import ed_glob
+import util
+
+# Local Imports
+from PyStudio.SyntaxChecker.CAResultsXml import AnalysisResults
+
+#-----------------------------------------------------------------------------#
+# Globals
+
+MAX_ENTRIES = 512   # Entries kept in the cache directory
+MAX_DEPENDENCIES = 256 # Local modules recorded for an entry
+
+_IMPORT_RE = re.compile(r"^[ \t]*(?:from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+"
+                        r"\(?([\w., \t*]+)|import[ \t]+([\w., \t]+))", re.M)
+_LOCK = threading.Lock()
+
+#-----------------------------------------------------------------------------#
+
+def GetCacheDir():
+    """Get the directory the results are cached in
+    @return: string
+
+    """
+    return os.path.join(ed_glob.CONFIG['CACHE_DIR'], u"PyLint")
+
+def MakeKey(filename, python, args, pythonpath=None, cwd=None):
+    """Make the cache key for checking a file
+    @param filename: file to check
+    @param python: interpreter pylint is run with
+    @param args: pylint arguments
+    @keyword pythonpath: list of PYTHONPATH directories
+    @keyword cwd: directory pylint is run in
+    @return: key string or None if the file can not be read
+
+    """
+    cwd = cwd or os.getcwd()
+    rcfile = None
+    for arg in args:
+        if arg.startswith(u"--rcfile="):
+            rcfile = os.path.join(cwd, arg[9:])
+    if rcfile is None:
+        rcfile = _FindRcFile(cwd)
+
+    key = hashlib.sha1()
+    try:
+        key.update(_ReadFile(filename))
+        if rcfile is not None:
+            key.update(_ReadFile(rcfile))
+    except (IOError, OSError):
+        return None
+
+    for value in [filename, python, u"\0".join(args),
+                  u"\0".join(pythonpath or ()), rcfile or u""]:
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        key.update(b"\0" + value)
+    return key.hexdigest()
+
+def GetResults(key):
+    """Get the cached results for a key
+    @param key: key from L{MakeKey}
+    @return: (rows, report) or None
+
+    """
+    path = _GetEntryPath(key)
+    if not os.path.exists(path):
+        return None
+
+    results = AnalysisResults.Load(path)
+    if not results or results.key != key:
+        return None
+
+    # An imported module changed
+    for dependency in results.dependencies:
+        if _GetStamp(dependency.path) != dependency.stamp:
+            _RemoveEntry(path)
+            return None
+
+    rows = list()
+    for result in results.results:
+        line = result.line
+        if line.isdigit():
+            line = int(line)
+        rows.append((result.errType, result.errMsg, line))
+
+    try:
+        # Keep recently used entries when pruning
+        os.utime(path, None)
+    except OSError:
+        pass
+    return (rows, results.report or u"")
+
+def StoreResults(key, filename, rows, report, pythonpath=None):
+    """Store the results of checking a file. Nothing is stored when the file
+    depends on too many local modules to check them on every lookup.
+    @param key: key from L{MakeKey}
+    @param filename: file that was checked
+    @param rows: [(type, message, line),]
+    @param report: pylint report text
+    @keyword pythonpath: list of PYTHONPATH directories
+
+    """
+    dependencies = _FindDependencies(filename, pythonpath or ())
+    if dependencies is None:
+        return
+
+    results = AnalysisResults()
+    results.path = filename
+    results.key = key
+    results.report = report
+    for errType, errMsg, line in rows:
+        results.AddResult(unicode(line), errType, errMsg)
+    for path in dependencies:
+        stamp = _GetStamp(path)
+        if stamp:
+            results.AddDependency(path, stamp)
+
+    cachedir = GetCacheDir()
+    _LOCK.acquire()
+    try:
+        try:
+            if not os.path.exists(cachedir):
+                os.makedirs(cachedir)
+            path = _GetEntryPath(key)
+            tmppath = path + u".tmp"
+            if results.Write(tmppath):
+                if os.path.exists(path):
+                    os.remove(path)
+                os.rename(tmppath, path)
+            _Prune(cachedir)
+        except (IOError, OSError), msg:
+            util.Log("[PyLint][err] Failed to cache results: %s" % msg)
+    finally:
+        _LOCK.release()
+
+#-----------------------------------------------------------------------------#
+
+def _GetEntryPath(key):
+    """Get the file path of a cache entry"""
+    return os.path.join(GetCacheDir(), key + u".xml")
+
+def _RemoveEntry(path):
+    """Remove a cache entry file"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _Prune(cachedir):
+    """Remove the least recently used entries when there are too many
+    @note: _LOCK must be held by caller
+
+    """
+    entries = [ fname for fname in os.listdir(cachedir)
+                if fname.endswith(u".xml") ]
+    if len(entries) <= MAX_ENTRIES:
+        return
+
+    stamps = list()
+    for fname in entries:
+        path = os.path.join(cachedir, fname)
+        try:
+            stamps.append((os.path.getmtime(path), path))
+        except OSError:
+            pass
+    stamps.sort()
+    for mtime, path in stamps[:len(stamps) - (MAX_ENTRIES * 3) // 4]:
+        _RemoveEntry(path)
+
+def _ReadFile(path):
+    """Read the contents of a file"""
+    handle = open(path, 'rb')
+    try:
+        return handle.read()
+    finally:
+        handle.close()
+
+def _GetStamp(path):
+    """Get the modification stamp of a file
+    @return: string or None if the file does not exist
+
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return u"%r:%d" % (stat.st_mtime, stat.st_size)
+
+def _FindModule(name, dirs):
+    """Find the source file of a module in a list of directories
+    @param name: dotted module name
+    @param dirs: directories to search
+    @return: path or None
+
+    """
+    parts = name.split(u".")
+    for dname in dirs:
+        base = os.path.join(dname, *parts)
+        for path in (base + u".py", os.path.join(base, u"__init__.py")):
+            if os.path.isfile(path):
+                return path
+    return None
+
+def _FindImports(filename, pythonpath):
+    """Find the local modules imported by a file. Modules outside of the
+    file's package root, directory and the PYTHONPATH are not considered.
+    @param filename: python source file
+    @param pythonpath: list of PYTHONPATH directories
+    @return: list of paths
+
+    """
+    try:
+        source = _ReadFile(filename).decode('utf-8', 'replace')
+    except (IOError, OSError):
+        return list()
+
+    fdir = os.path.dirname(filename)
+    root = fdir
+    while os.path.exists(os.path.join(root, u"__init__.py")):
+        parent = os.path.dirname(root)
+        if parent == root:
+            break
+        root = parent
+
+    dirs = list()
+    for dname in [fdir, root] + list(pythonpath):
+        if dname not in dirs:
+            dirs.append(dname)
+
+    paths = set()
+    for match in _IMPORT_RE.finditer(source):
+        module, names, imports = match.groups()
+        if imports:
+            # import a.b, c as d
+            candidates = [ name.split()[0] for name in imports.split(u",")
+                           if name.strip() ]
+            search = dirs
+        else:
+            # from a import b, c (b and c may be modules as well)
+            level = len(module) - len(module.lstrip(u"."))
+            module = module[level:]
+            names = [ name.split()[0] for name in names.split(u",")
+                      if name.strip() and name.strip() != u"*" ]
+            if module:
+                candidates = [module] + [ u"%s.%s" % (module, name)
+                                          for name in names ]
+            else:
+                candidates = names
+            search = dirs
+            if level:
+                base = fdir
+                for idx in range(level - 1):
+                    base = os.path.dirname(base)
+                search = [base]
+
+        for name in candidates:
+            path = _FindModule(name, search)
+            if path and path != filename:
+                paths.add(path)
+    return sorted(paths)
+
+def _FindRcFile(cwd):
+    """Find the configuration file pylint reads when no --rcfile argument
+    is given. Looks in the same places as pylint: the working directory and
+    the packages above it, $PYLINTRC, the home directory and /etc.
+    @param cwd: directory pylint is run in
+    @return: path or None
+
+    """
+    names = (u"pylintrc", u".pylintrc")
+    for name in names:
+        path = os.path.join(cwd, name)
+        if os.path.exists(path):
+            return path
+
+    curdir = os.path.abspath(cwd)
+    while os.path.isfile(os.path.join(curdir, u"__init__.py")):
+        parent = os.path.dirname(curdir)
+        if parent == curdir:
+            break
+        curdir = parent
+        for name in names:
+            path = os.path.join(curdir, name)
+            if os.path.isfile(path):
+                return path
+
+    path = os.environ.get('PYLINTRC', None)
+    if path and os.path.exists(path):
+        return path
+
+    home = os.path.expanduser(u"~")
+    if home != u"~":
+        for path in (os.path.join(home, u".pylintrc"),
+                     os.path.join(home, u".config", u"pylintrc")):
+            if os.path.isfile(path):
+                return path
+
+    if os.path.isfile(u"/etc/pylintrc"):
+        return u"/etc/pylintrc"
+    return None
+
+def _FindDependencies(filename, pythonpath):
+    """Find the local modules a file depends on. These are the modules it
+    imports and the local modules imported by those, so that a change to
+    a base class defined further away is noticed as well.
+    @param filename: python source file
+    @param pythonpath: list of PYTHONPATH directories
+    @return: sorted list of paths or None if there are more than
+             MAX_DEPENDENCIES
+
+    """
+    found = set()
+    pending = [filename]
+    while pending:
+        for path in _FindImports(pending.pop(), pythonpath):
+            if path != filename and path not in found:
+                if len(found) == MAX_DEPENDENCIES:
+                    return None
+                found.add(path)
+                pending.append(path)
+    return sorted(found)
@@ -34,6 +34,7 @@ from PyStudio.SyntaxChecker.EvaluationWindow import EvaluationWindow
 from PyStudio.SyntaxChecker.PythonFormatChecker import PythonFormatChecker
 from PyStudio.SyntaxChecker.PythonSyntaxChecker import PythonSyntaxChecker
 from PyStudio.SyntaxChecker.CAResultsXml import AnalysisResults
+from PyStudio.SyntaxChecker.ProjectAnalyzer import ProjectAnalyzer
 
 # Globals
 _ = wx.GetTranslation
@@ -75,6 +76,10 @@ class LintShelfWindow(BaseShelfWindow):
         self.openbtn.ToolTip = wx.ToolTip(_("Load Results"))
         self._lbl = wx.StaticText(ctrlbar)
         ctrlbar.AddControl(self._lbl)
+        self._filechoice = wx.Choice(ctrlbar)
+        self._filechoice.ToolTip = wx.ToolTip(_("Project analysis results"))
+        self._filechoice.Hide()
+        ctrlbar.AddControl(self._filechoice)
         ctrlbar.AddStretchSpacer()
         self.layout("PyLint", self.OnRunLint, self.OnJobTimer)
         self.TaskButton.SetBitmap(Images.Lint.Bitmap)
@@ -85,9 +90,19 @@ class LintShelfWindow(BaseShelfWindow):
         self.clearbtn = self.AddPlateButton("", ed_glob.ID_DELETE, 
                                             wx.ALIGN_RIGHT)
         self.clearbtn.ToolTip = wx.ToolTip(_("Clear"))
+        self.projbtn = self.AddPlateButton(_("Analyze Project"),
+                                           Images.Project.Bitmap,
+                                           wx.ALIGN_RIGHT)
+        self.projbtn.ToolTip = wx.ToolTip(_("Run Pylint on all project files"))
 
         # Attributes
         self._checker = None
+        self._project = None
+        self._analyzer = None
+        self._analysis = list() # [AnalysisResults,] shown in _filechoice
+
+        # A project may have been loaded before the shelf was opened
+        self.DoProjectLoaded(PyStudioUtils.GetProjectFile(self._mw))
 
         # Editra Message Handlers
         ed_msg.Subscribe(self.OnFileLoad, ed_msg.EDMSG_FILE_OPENED)
@@ -99,6 +114,8 @@ class LintShelfWindow(BaseShelfWindow):
         self.Bind(wx.EVT_BUTTON, self.OnOpenResults, self.openbtn)
         self.Bind(wx.EVT_BUTTON, self.OnChkFormat, self.formatbtn)
         self.Bind(wx.EVT_BUTTON, self.OnClear, self.clearbtn)
+        self.Bind(wx.EVT_BUTTON, self.OnAnalyzeProject, self.projbtn)
+        self.Bind(wx.EVT_CHOICE, self.OnFileChoice, self._filechoice)
 
     def _InitImageList(self):
         """Initialize the segmentbooks image list"""
@@ -120,6 +137,13 @@ class LintShelfWindow(BaseShelfWindow):
         ed_msg.Unsubscribe(self.OnFileLoad)
         ed_msg.Unsubscribe(self.OnFileSave)
         ed_msg.Unsubscribe(self.OnPageChanged)
+        if self._analyzer:
+            self._analyzer.Cancel()
+
+    def DoProjectLoaded(self, projfile):
+        """Enable the project analysis for the loaded project"""
+        self._project = projfile
+        self.projbtn.Enable(projfile is not None)
 
     def OnThemeChanged(self, msg):
         """Update Icons"""
@@ -174,6 +198,93 @@ class LintShelfWindow(BaseShelfWindow):
         else:
             evt.Skip()
 
+    def OnAnalyzeProject(self, evt):
+        """Start or cancel the analysis of the current project"""
+        if evt.Id != self.projbtn.Id:
+            evt.Skip()
+            return
+
+        mwid = self.GetMainWindow().GetId()
+        if self._analyzer:
+            self._analyzer.Cancel()
+            self.projbtn.Enable(False)
+        elif self._project:
+            self._analyzer = ProjectAnalyzer(self._project,
+                                             self._OnAnalysisProgress,
+                                             self._OnAnalysisComplete)
+            self._analyzer.start()
+            self.projbtn.SetLabel(_("Cancel"))
+            self._lbl.SetLabel(_("Analyzing %s") % self._project.ProjectName)
+            ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_SHOW, (mwid, True))
+            ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE, (mwid, -1, -1))
+        self.GetControlBar(wx.TOP).Layout()
+
+    def _OnAnalysisProgress(self, done, total, path):
+        """Update the progress of the project analysis"""
+        if not self or not self._analyzer or self._analyzer.Cancelled:
+            return
+        mwid = self.GetMainWindow().GetId()
+        ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE, (mwid, done, total))
+        self._lbl.SetLabel(_("Analyzing %d/%d: %s") % \
+                           (done, total, os.path.basename(path)))
+
+    def _OnAnalysisComplete(self, analysis):
+        """Show the results of the project analysis
+        @param analysis: ProjectAnalysis or None if cancelled
+
+        """
+        if not self:
+            return
+        self._analyzer = None
+        mwid = self.GetMainWindow().GetId()
+        ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_SHOW, (mwid, False))
+        self.projbtn.SetLabel(_("Analyze Project"))
+        self.projbtn.Enable(self._project is not None)
+
+        if analysis is None:
+            self._lbl.SetLabel(_("Project analysis cancelled"))
+        else:
+            # List the files that have results
+            root = self._project.ProjectRoot if self._project else u""
+            self._analysis = [ results for results in analysis.resultsets
+                               if len(results.results) ]
+            items = list()
+            for results in self._analysis:
+                path = results.path
+                if root and path.startswith(root):
+                    path = path[len(root):].lstrip(os.sep)
+                items.append(u"%s (%d)" % (path, len(results.results)))
+            self._filechoice.SetItems(items)
+            self._filechoice.Show(bool(items))
+            self._lbl.SetLabel(_("%d of %d files have messages") % \
+                               (len(items), len(analysis.resultsets)))
+            if items:
+                self._filechoice.SetSelection(0)
+                self.ShowAnalysisResults(0)
+        self.GetControlBar(wx.TOP).Layout()
+
+    def OnFileChoice(self, evt):
+        """Show the project analysis results of the selected file"""
+        self.ShowAnalysisResults(self._filechoice.GetSelection())
+
+    def ShowAnalysisResults(self, index):
+        """Show the results of a file from the project analysis, the file is
+        opened when a result is activated.
+        @param index: index in the file choice
+
+        """
+        if 0 <= index < len(self._analysis):
+            results = self._analysis[index]
+            data = list()
+            for result in results.results:
+                line = result.line
+                if line.isdigit():
+                    line = int(line)
+                data.append((result.errType, result.errMsg, line))
+            self._checkresultslist.ShowData(data, results.path)
+            self._checkresultslist.RefreshRows()
+            self._evaluation.SetText(u"")
+
     def OnPageChanged(self, msg):
         """ Notebook tab was changed """
         notebook, pg_num = msg.GetData()
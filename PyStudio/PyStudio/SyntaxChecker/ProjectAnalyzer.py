@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# Name: ProjectAnalyzer.py
+# Purpose: PyLint analysis of all the files in a project
+# Author: Cody Precord <cprecord@editra.org>
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>
+# License: wxWindows License
+##############################################################################
+"""
+Runs PyLint on all the Python files of a project. The files are checked in
+parallel by a pool of tool processes, one for each CPU, and the results are
+collected in a L{ProjectAnalysis} document.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import wx
+import hashlib
+import threading
+import Queue
+
+# Editra Libraries
+import util
+import ebmlib
+
+# Local Imports
+from PyStudio.Common import ToolConfig
+from PyStudio.Common import ToolHost
+from PyStudio.Common.PythonDirectoryVariables import PythonDirectoryVariables
+from PyStudio.SyntaxChecker import LintCache
+from PyStudio.SyntaxChecker.PythonSyntaxChecker import PythonSyntaxChecker
+from PyStudio.SyntaxChecker.CAResultsXml import AnalysisResults, ProjectAnalysis
+
+#-----------------------------------------------------------------------------#
+
+def GetPythonFiles(directory):
+    """Get the Python source files in a directory object
+    @param directory: ebmlib.Directory
+    @return: list of paths
+
+    """
+    files = list()
+    for item in directory.Files:
+        if isinstance(item, ebmlib.Directory):
+            files.extend(GetPythonFiles(item))
+        elif item.Path.endswith(u".py"):
+            files.append(item.Path)
+    return files
+
+def GetAnalysisPath(project):
+    """Get the path the analysis of a project is saved to
+    @param project: ProjectFile
+
+    """
+    path = project.Path
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    name = hashlib.sha1(path).hexdigest()
+    return os.path.join(LintCache.GetCacheDir(), u"projects",
+                        u"%s.xml" % name)
+
+def GetProcessCount():
+    """Get the number of tool processes to analyze with
+    @return: int
+
+    """
+    try:
+        import multiprocessing
+        return max(1, multiprocessing.cpu_count())
+    except (ImportError, NotImplementedError):
+        return 1
+
+#-----------------------------------------------------------------------------#
+
+class ProjectAnalyzer(threading.Thread):
+    """Background job that analyzes all the files of a project"""
+    def __init__(self, project, progress, callback):
+        """Create the job
+        @param project: ProjectFile
+        @param progress: callable(done, total, path) called on the main thread
+                         after each file
+        @param callback: callable(ProjectAnalysis or None) called on the main
+                         thread when the job completes or is cancelled
+
+        """
+        super(ProjectAnalyzer, self).__init__()
+
+        # Attributes
+        self.project = project
+        self.progress = progress
+        self.callback = callback
+        self._cancel = threading.Event()
+        self._files = Queue.Queue()
+        self._lock = threading.Lock()
+        self._results = list()
+        self._hosts = list()
+        self._total = 0
+
+        self.setDaemon(True)
+
+    Cancelled = property(lambda self: self._cancel.isSet())
+
+    def Cancel(self):
+        """Stop the job and the tool processes checking files"""
+        self._cancel.set()
+        self._lock.acquire()
+        try:
+            for host in self._hosts:
+                host.Close()
+        finally:
+            self._lock.release()
+
+    def run(self):
+        """Analyze the project files"""
+        analysis = None
+        try:
+            analysis = self.Analyze()
+        except Exception, msg:
+            util.Log("[PyLint][err] Project analysis failed: %s" % msg)
+        wx.CallAfter(self.callback, analysis)
+
+    def Analyze(self):
+        """Lint all the project files with a pool of tool processes
+        @return: ProjectAnalysis or None if cancelled
+
+        """
+        flag, python = ToolConfig.GetPythonExecutablePath("PyLint")
+        if not flag:
+            util.Log("[PyLint][err] Project analysis: %s" % python)
+            return None
+
+        files = GetPythonFiles(self.project.GetAllProjectFiles())
+        self._total = len(files)
+        dirvars = dict()
+        for path in sorted(files):
+            dname = os.path.dirname(path)
+            if dname not in dirvars:
+                dirvars[dname] = PythonDirectoryVariables().read_dirvarfile(path)
+            self._files.put((path, dirvars[dname]))
+
+        count = min(GetProcessCount(), max(1, self._total))
+        util.Log("[PyLint][info] Analyzing %d files with %d processes" % \
+                 (self._total, count))
+        workers = [ threading.Thread(target=self._Worker, args=(python,))
+                    for idx in range(count) ]
+        for worker in workers:
+            worker.setDaemon(True)
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if self.Cancelled:
+            return None
+
+        analysis = ProjectAnalysis()
+        analysis.name = self.project.ProjectName
+        analysis.resultsets = sorted(self._results, key=lambda res: res.path)
+        path = GetAnalysisPath(self.project)
+        try:
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            analysis.Write(path)
+        except (IOError, OSError), msg:
+            util.Log("[PyLint][err] Failed to save project analysis: %s" % msg)
+        return analysis
+
+    def _Worker(self, python):
+        """Check files from the queue until it is empty or the job is
+        cancelled. Each worker uses its own tool processes.
+        @param python: interpreter path
+
+        """
+        hosts = dict() # PYTHONPATH -> ToolHost
+        try:
+            while not self.Cancelled:
+                try:
+                    path, vardict = self._files.get_nowait()
+                except Queue.Empty:
+                    break
+
+                checker = PythonSyntaxChecker(vardict, path)
+                key = tuple(checker.pythonpath or ())
+                if key not in hosts:
+                    hosts[key] = ToolHost.ToolHost(python, checker.pythonpath)
+                    self._lock.acquire()
+                    try:
+                        self._hosts.append(hosts[key])
+                    finally:
+                        self._lock.release()
+                    if self.Cancelled:
+                        break
+                try:
+                    rows = checker.RunSyntaxCheck(hosts[key])[0]
+                except Exception, msg:
+                    rows = [(u"Error", unicode(msg), u"NA")]
+
+                results = AnalysisResults()
+                results.path = path
+                for mtype, text, line in rows:
+                    if mtype != u"***":
+                        results.AddResult(unicode(line), mtype, text)
+
+                self._lock.acquire()
+                try:
+                    self._results.append(results)
+                    done = len(self._results)
+                finally:
+                    self._lock.release()
+                wx.CallAfter(self.progress, done, self._total, path)
+        finally:
+            for host in hosts.values():
+                host.Close()
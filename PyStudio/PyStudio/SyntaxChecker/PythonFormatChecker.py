@@ -13,13 +13,11 @@ __revision__ = "$Revision: 1522 $"
 
 #-----------------------------------------------------------------------------#
 # Imports
-import os
 import re
 
 # Local Imports
-from PyStudio.Common import ToolConfig
 from PyStudio.Common.PyStudioUtils import PyStudioUtils
-from PyStudio.Common.ProcessCreator import ProcessCreator
+from PyStudio.Common import ToolHost
 from PyStudio.SyntaxChecker.AbstractSyntaxChecker import AbstractSyntaxChecker
 
 # Editra Libraries
@@ -44,21 +42,23 @@ class PythonFormatChecker(AbstractSyntaxChecker):
 
         """
 
-        flag, localpythonpath = ToolConfig.GetPythonExecutablePath("Pep8")
+        flag, host = ToolHost.GetToolHost("Pep8", self.pythonpath)
 
         if not flag:
             # No configured Python
-            return ([(u"No Python", localpythonpath, u"NA")], u"None")
+            return ([(u"No Python", host, u"NA")], u"None")
 
-        childPath, parentPath = PyStudioUtils.get_packageroot(self.filename)
+        try:
+            childPath, parentPath = PyStudioUtils.get_packageroot(self.filename)
 
-        # Start pep8 check
-        pythoncode = "import sys,pep8;sys.argv=[u'pep8', %s];pep8._main()" % repr(childPath)
-        pep8_cmd = [localpythonpath, "-c", pythoncode]
-        processcreator = ProcessCreator("Pep8", parentPath, pep8_cmd, self.pythonpath)
-        process = processcreator.createprocess()
-        stdoutdata, stderrdata = process.communicate()
-        processcreator.restorepath()
+            # Run pep8 check
+            pep8_cmd = [u"pep8", childPath]
+            output = host.Call("pep8", parentPath, path=childPath)
+        except ToolHost.ToolHostError, msg:
+            return ([(u"Error", unicode(msg), u"NA")], u"None")
+        finally:
+            host.Release()
+        stdoutdata, stderrdata = output['stdout'], output['stderr']
 
         util.Log("[Pep8][info] stdout %s" % stdoutdata)
         util.Log("[Pep8][info] stderr %s" % stderrdata)
@@ -70,7 +70,7 @@ class PythonFormatChecker(AbstractSyntaxChecker):
 
         # The parseable line format is:
         #       '%(path)s:%(line)s: [%(sigle)s%(obj)s] %(msg)s'
-        regex = re.compile(r"(.*):(.*):(.*): ([A-Z])[0-9]* (.*)%s" % os.linesep)
+        regex = re.compile(r"(.*):(.*):(.*): ([A-Z])[0-9]* ([^\r\n]*)\r?$", re.M)
         rows = []
         # TODO: returned messages need to be translatable
         if self.pythonpath:
@@ -13,13 +13,13 @@ __revision__ = "$Revision$"
 
 #-----------------------------------------------------------------------------#
 # Imports
-import os
 import re
 
 # Local Imports
 from PyStudio.Common import ToolConfig
 from PyStudio.Common.PyStudioUtils import PyStudioUtils
-from PyStudio.Common.ProcessCreator import ProcessCreator
+from PyStudio.Common import ToolHost
+from PyStudio.SyntaxChecker import LintCache
 from PyStudio.SyntaxChecker.AbstractSyntaxChecker import AbstractSyntaxChecker
 
 # Editra Libraries
@@ -53,26 +53,44 @@ class PythonSyntaxChecker(AbstractSyntaxChecker):
         self.nopythonerror = u"***  FATAL ERROR: No local Python configured or found"
         self.nopylinterror = u"***  FATAL ERROR: No Pylint configured or found"
 
-    def RunSyntaxCheck(self):
-        """Run pylint"""
+    def RunSyntaxCheck(self, host=None):
+        """Run pylint in a tool process that keeps it loaded. The results
+        are served from the L{LintCache} when the file, its imports and the
+        configuration did not change since the last check.
+        @keyword host: ToolHost to use instead of a shared one
 
-        flag, localpythonpath = ToolConfig.GetPythonExecutablePath("PyLint")
+        """
+        if host is None:
+            flag, host = ToolHost.GetToolHost("PyLint", self.pythonpath)
 
-        if not flag:
-            # No configured Python
-            return ([(u"No Python", localpythonpath, u"NA")], u"None")
+            if not flag:
+                # No configured Python
+                return ([(u"No Python", host, u"NA")], u"None")
+
+            try:
+                return self.RunSyntaxCheck(host)
+            finally:
+                host.Release()
 
         childPath, parentPath = PyStudioUtils.get_packageroot(self.filename)
 
-        # Start pylint
+        # Run pylint
         modpath = PyStudioUtils.get_modulepath(childPath)
         allargs = self.pylintargs + [modpath,]
-        pythoncode = "from pylint import lint;lint.Run(%s)" % repr(allargs)
-        plint_cmd = [localpythonpath, "-c", pythoncode]
-        processcreator = ProcessCreator("Pylint", parentPath, plint_cmd, self.pythonpath)
-        process = processcreator.createprocess()
-        stdoutdata, stderrdata = process.communicate()
-        processcreator.restorepath()
+        plint_cmd = [u"pylint",] + allargs
+        key = LintCache.MakeKey(self.filename, host.python, allargs,
+                                self.pythonpath, parentPath)
+        cached = key and LintCache.GetResults(key)
+        if cached:
+            util.Log("[PyLint][info] Using cached results for %s" % self.filename)
+            rows, report = cached
+            return ([(u"***", u"Cached results", u"NA")] + rows, report)
+
+        try:
+            output = host.Call("lint", parentPath, argv=allargs)
+        except ToolHost.ToolHostError, msg:
+            return ([(u"Error", unicode(msg), u"NA")], u"None")
+        stdoutdata, stderrdata = output['stdout'], output['stderr']
 
         util.Log("[Pylint][info] stdout %s" % stdoutdata)
         util.Log("[Pylint][info] stderr %s" % stderrdata)
@@ -84,7 +102,7 @@ class PythonSyntaxChecker(AbstractSyntaxChecker):
 
         # The parseable line format is:
         #       '%(path)s:%(line)s: [%(sigle)s%(obj)s] %(msg)s'
-        regex = re.compile(r"(.*):(.*): \[([A-Z])[, ]*(.*)\] (.*)%s" % os.linesep)
+        regex = re.compile(r"(.*):(.*): \[([A-Z])[, ]*(.*)\] ([^\r\n]*)\r?$", re.M)
         rows = []
         # TODO: returned messages need to be translatable
         if self.pythonpath:
@@ -139,5 +157,10 @@ class PythonSyntaxChecker(AbstractSyntaxChecker):
         index = stdoutdata.find("Report", lastmatchindex)
         util.Log("[PyLint][info] Pylint command finished running")
         if index == -1:
-            return (rows, "")
-        return (rows, stdoutdata[index:].replace("\r", ""))
+            report = u""
+        else:
+            report = stdoutdata[index:].replace("\r", "")
+        if key and "Traceback" not in stderrdata:
+            LintCache.StoreResults(key, self.filename, rows, report,
+                                   self.pythonpath)
+        return (rows, report)
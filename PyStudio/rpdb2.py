@@ -286,6 +286,7 @@ import atexit
 import locale
 import codecs
 import signal
+import select
 import errno
 import time
 import copy
@@ -826,10 +827,13 @@ class CSessionManager:
         return self.__smi.get_launch_args()
 
         
-    def attach(self, key, name = None, encoding = 'utf-8'):
+    def attach(self, key, name = None, encoding = 'utf-8', port = None):
         """
         Attach to a debuggee (establish communication with the debuggee-server)
         key - a string specifying part of the filename or PID of the debuggee.
+        port - the port the debuggee-server listens on, if it is known
+        (for example from a handshake file), in which case the port range
+        is not scanned.
 
         if key is not a unicode string it will be decoded into unicode
         with the given encoding
@@ -837,7 +841,7 @@ class CSessionManager:
        
         key = as_unicode(key, encoding, fstrict = True)
 
-        return self.__smi.attach(key, name)
+        return self.__smi.attach(key, name, port = port)
 
 
     def detach(self):
@@ -1134,6 +1138,13 @@ class CSessionManager:
           [('locals()', true)]
           [('a.b.c', false), ('my_object.foo', false), ('another_object', true)]
 
+        An expanded expression can be followed by an offset, a count and
+        a key filter (regular expression matched against the child names 
+        or None) to get a page of its children:
+
+          [('my_list', true, 1000, 100, None)]
+          [('locals()', true, 0, 100, 'my_')]
+
         Return value is a list of dictionaries, where every element
         in the list corresponds to an element in the input list 'nl'.
 
@@ -1154,6 +1165,10 @@ class CSessionManager:
           DICT_KEY_ERROR - If an error prevented evaluation of this expression
                           the value of this key will be a repr of the 
                           exception info: repr(sys.exc_info())
+          DICT_KEY_OFFSET - If a page of the children was requested, the 
+                          offset of the first child in DICT_KEY_SUBNODES.
+                          DICT_KEY_N_SUBNODES is the number of children 
+                          that match the key filter.
 
         Each dictionary for child items has the following keys and values:
           DICT_KEY_EXPR - The Python expression that designates this child.
@@ -1179,6 +1194,30 @@ class CSessionManager:
         return self.__smi.get_namespace(nl, filter_level, repr_limit)
 
 
+    def set_namespace_requests(self, serial, requests):
+        """
+        Set the namespace queries that the debuggee answers in the
+        CEventNamespace event it sends when it breaks, so that the
+        namespace of the top frame arrives with the other break events
+        and does not need to be queried again with get_namespace().
+
+        serial - Number to tag the answers with.
+
+        requests - Dictionary of names to tuples (nl, filter_level,
+             repr_limit) with the arguments of get_namespace().
+
+        The m_namespace attribute of the event is None or a tuple
+        (serial, answers), where answers is a dictionary of the same names
+        to the return values of get_namespace() for the top frame.
+        """
+
+        _requests = {}
+        for (name, (nl, filter_level, repr_limit)) in requests.items():
+            _requests[name] = (nl, int(filter_level), repr_limit)
+
+        return self.__smi.set_namespace_requests(serial, _requests)
+
+
     #
     # REVIEW: remove warning item.
     #
@@ -1200,6 +1239,24 @@ class CSessionManager:
         return self.__smi.evaluate(expr)
 
 
+    def evaluate_list(self, exprs):
+        """
+        Evaluate a list of python expressions in the context of the current
+        thread and frame with a single request to the debuggee.
+
+        Return value is a list with a tuple (v, w, e, t) for every 
+        expression, where v, w and e are as returned by evaluate() and t is
+        the name of the type of the value.
+
+        NOTE: This call might not return since debugged script logic can lead
+        to tmporary locking or even deadlocking.
+        """
+
+        exprs = [as_unicode(expr, fstrict = True) for expr in exprs]
+        
+        return self.__smi.evaluate_list(exprs)
+
+
     def execute(self, suite):
         """
         Execute a python statement in the context of the current thread
@@ -1812,6 +1869,11 @@ PING_TIMEOUT = 4.0
 LOCAL_TIMEOUT = 1.0
 COMMUNICATION_RETRIES = 5
 
+KEEPALIVE_TIMEOUT = 30.0
+KEEPALIVE_POLL_INTERVAL = 0.5
+KEEPALIVE_POOL_SIZE = 4
+RESPONSE_BUFFER_SIZE = 64 * 1024
+
 WAIT_FOR_BREAK_TIMEOUT = 3.0
 
 SHUTDOWN_TIMEOUT = 4.0
@@ -2044,6 +2106,7 @@ DICT_KEY_TYPE = 'type'
 DICT_KEY_SUBNODES = 'subnodes'
 DICT_KEY_N_SUBNODES = 'n_subnodes'
 DICT_KEY_ERROR = 'error'
+DICT_KEY_OFFSET = 'offset'
 
 RPDB_EXEC_INFO = as_unicode('rpdb_exception_info')
 
@@ -2059,6 +2122,7 @@ ENCODING_RAW_I = as_unicode('__raw')
 MAX_EVALUATE_LENGTH = 256 * 1024
 MAX_NAMESPACE_ITEMS = 1024
 MAX_SORTABLE_LENGTH = 256 * 1024
+MAX_NAMESPACE_CACHE = 32
 REPR_ID_LENGTH = 4096
 
 MAX_NAMESPACE_WARNING = {
@@ -4010,6 +4074,52 @@ def delete_pwd_file(rid):
 
 
 
+def write_handshake_file(path, port):
+    """
+    Write the port of the debuggee server to the handshake file,
+    so that the client that launched the debuggee can attach to it
+    without scanning the port range.
+    The line is written in one go and terminated by a new line so
+    a partial read can be told apart.
+    """
+
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, int('0600', 8))
+
+    try:
+        os.write(fd, as_bytes('%d %d\n' % (port, _getpid())))
+    finally:
+        os.close(fd)
+
+
+
+def read_handshake_file(path):
+    """
+    Read the handshake file written by the debuggee.
+    Return (port, pid) or None if the file is not complete yet.
+    """
+
+    try:
+        f = open(path, 'r')
+        try:
+            s = f.read()
+        finally:
+            f.close()
+
+    except IOError:
+        return None
+
+    if not s.endswith('\n'):
+        return None
+
+    try:
+        port, pid = [int(i) for i in s.split()]
+    except ValueError:
+        return None
+
+    return (port, pid)
+
+
+
 def CalcUserShell():
     try:
         s = os.getenv('SHELL')
@@ -4863,43 +4973,41 @@ class CCrypto:
     def __verify_index(self, anchor, i, id):
         """
         Manage messages ids to prevent replay of old messages.
+        The signature was verified by the caller, so a bad index is 
+        not a failed authentication and is not delayed. Every new 
+        client starts with a bad index (the anchor is unknown to it).
         """
         
-        try:
-            try:    
-                self.m_lock.acquire()
+        try:    
+            self.m_lock.acquire()
 
-                if anchor != self.m_index_anchor_in:
-                    raise AuthenticationBadIndex(self.m_max_index, self.m_index_anchor_in)
+            if anchor != self.m_index_anchor_in:
+                raise AuthenticationBadIndex(self.m_max_index, self.m_index_anchor_in)
 
-                if i > self.m_max_index + INDEX_TABLE_SIZE // 2:
-                    raise AuthenticationBadIndex(self.m_max_index, self.m_index_anchor_in)
+            if i > self.m_max_index + INDEX_TABLE_SIZE // 2:
+                raise AuthenticationBadIndex(self.m_max_index, self.m_index_anchor_in)
 
-                i_mod = i % INDEX_TABLE_SIZE
-                (iv, idl) = self.m_index_table.get(i_mod, (None, None))
+            i_mod = i % INDEX_TABLE_SIZE
+            (iv, idl) = self.m_index_table.get(i_mod, (None, None))
 
-                #print >> sys.__stderr__, i, i_mod, iv, self.m_max_index
+            #print >> sys.__stderr__, i, i_mod, iv, self.m_max_index
 
-                if (iv is None) or (i > iv):
-                    idl = [id]
-                elif (iv == i) and (not id in idl):
-                    idl.append(id)
-                else:
-                    raise AuthenticationBadIndex(self.m_max_index, self.m_index_anchor_in)
+            if (iv is None) or (i > iv):
+                idl = [id]
+            elif (iv == i) and (not id in idl):
+                idl.append(id)
+            else:
+                raise AuthenticationBadIndex(self.m_max_index, self.m_index_anchor_in)
 
-                self.m_index_table[i_mod] = (i, idl) 
+            self.m_index_table[i_mod] = (i, idl) 
 
-                if i > self.m_max_index:
-                    self.m_max_index = i
+            if i > self.m_max_index:
+                self.m_max_index = i
 
-                return self.m_index
+            return self.m_index
 
-            finally:
-                self.m_lock.release()
-                
-        except:        
-            self.__wait_a_little()
-            raise
+        finally:
+            self.m_lock.release()
 
 
     def __wait_a_little(self):
@@ -5121,10 +5229,13 @@ class CEventNamespace(CEvent):
     """
     Namespace has changed. 
     This tells the debugger it should query the namespace again.
+    m_namespace is None or the answers to the namespace requests of the
+    debugger, see CSessionManager.set_namespace_requests().
     """
-    
-    pass
-    
+
+    def __init__(self, namespace = None):
+        self.m_namespace = namespace
+
 
 
 class CEventNoThreads(CEvent):
@@ -5391,6 +5502,7 @@ class CEventQueue:
         self.m_max_event_list_length = max_event_list_length
         self.m_event_list = []
         self.m_event_index = 0
+        self.m_n_holds = 0
 
         self.m_n_waiters = []
 
@@ -5427,6 +5539,32 @@ class CEventQueue:
         return self.m_event_index
 
 
+    def hold(self):
+        """
+        Hold new events back from waiters until release() is called,
+        so that events fired together are returned in a single batch.
+        """
+
+        try:
+            self.m_event_lock.acquire()
+            self.m_n_holds += 1
+
+        finally:
+            self.m_event_lock.release()
+
+
+    def release(self):
+        try:
+            self.m_event_lock.acquire()
+            self.m_n_holds -= 1
+
+            if self.m_n_holds == 0:
+                lock_notify_all(self.m_event_lock)
+
+        finally:
+            self.m_event_lock.release()
+
+
     def wait_for_event(self, timeout, event_index):
         """
         Return the new events which were fired. 
@@ -5436,8 +5574,14 @@ class CEventQueue:
             self.m_n_waiters.append(0)
 
             self.m_event_lock.acquire()
-            if event_index >= self.m_event_index:
-                safe_wait(self.m_event_lock, timeout)
+
+            t0 = time.time()
+            while event_index >= self.m_event_index or self.m_n_holds > 0:
+                _timeout = t0 + timeout - time.time()
+                if _timeout <= 0:
+                    break
+
+                safe_wait(self.m_event_lock, _timeout)
 
             if event_index >= self.m_event_index:
                 return (self.m_event_index, [])
@@ -5853,19 +5997,6 @@ class CBreakPoint(object):
         return rv
 
 
-    def calc_enclosing_scope_name(self):
-        if self.m_scope_offset != 0:
-            return None
-            
-        if self.m_scope_fqn in [MODULE_SCOPE, MODULE_SCOPE2]:
-            return None
-
-        scope_name_list = self.m_scope_fqn.split(SCOPE_SEP)
-        enclosing_scope_name = scope_name_list[-2]
-
-        return enclosing_scope_name
-
-            
     def enable(self):
         self.m_fEnabled = True
 
@@ -6014,11 +6145,16 @@ class CBreakPointsManager:
     def __init__(self):
         self.m_break_info_manager = CBreakInfoManager()
         self.m_active_break_points_by_file = {}
-        self.m_break_points_by_function = {}
         self.m_break_points_by_file = {}
         self.m_break_points_by_id = {}
         self.m_lock = threading.Lock()
 
+        #
+        # Incremented whenever the active breakpoints change, so that
+        # code contexts know to recalculate if they can hit one.
+        #
+        self.m_generation = 0
+
         self.m_temp_bp = None
         self.m_fhard_tbp = False
 
@@ -6046,55 +6182,7 @@ class CBreakPointsManager:
         if (tbp is not None) and (tbp.m_filename == filename):
             bpmpt[tbp.m_lineno] = tbp                      
 
-        
-    def __remove_from_function_list(self, bp):
-        function_name = bp.m_scope_name
-
-        try:
-            bpf = self.m_break_points_by_function[function_name]
-            del bpf[bp]
-            if len(bpf) == 0:
-                del self.m_break_points_by_function[function_name]
-        except KeyError:
-            pass
-
-        #
-        # In some cases a breakpoint belongs to two scopes at the
-        # same time. For example a breakpoint on the declaration line
-        # of a function.
-        #
-        
-        _function_name = bp.calc_enclosing_scope_name()
-        if _function_name is None:
-            return
-            
-        try:
-            _bpf = self.m_break_points_by_function[_function_name]
-            del _bpf[bp]
-            if len(_bpf) == 0:
-                del self.m_break_points_by_function[_function_name]
-        except KeyError:
-            pass
-
-
-    def __add_to_function_list(self, bp):
-        function_name = bp.m_scope_name
-
-        bpf = self.m_break_points_by_function.setdefault(function_name, {})
-        bpf[bp] = True 
-
-        #
-        # In some cases a breakpoint belongs to two scopes at the
-        # same time. For example a breakpoint on the declaration line
-        # of a function.
-        #
-        
-        _function_name = bp.calc_enclosing_scope_name()
-        if _function_name is None:
-            return
-            
-        _bpf = self.m_break_points_by_function.setdefault(_function_name, {})
-        _bpf[bp] = True 
+        self.m_generation += 1
 
             
     def get_breakpoint(self, filename, lineno):
@@ -6131,7 +6219,6 @@ class CBreakPointsManager:
             self.m_temp_bp = None
             self.m_fhard_tbp = False
 
-            self.__remove_from_function_list(bp)
             self.__calc_active_break_points_by_file(bp.m_filename)
 
         finally:
@@ -6166,7 +6253,6 @@ class CBreakPointsManager:
             self.m_fhard_tbp = fhard
             self.m_temp_bp = bp
             
-            self.__add_to_function_list(bp)
             self.__calc_active_break_points_by_file(bp.m_filename)
 
         finally:
@@ -6211,7 +6297,6 @@ class CBreakPointsManager:
             try:
                 old_bp = bpm[l]
                 id = old_bp.m_id
-                self.__remove_from_function_list(old_bp)
             except KeyError:
                 #
                 # Find the smallest available ID.
@@ -6230,8 +6315,6 @@ class CBreakPointsManager:
             
             self.m_break_points_by_id[id] = bp    
             bpm[l] = bp    
-            if fEnabled:
-                self.__add_to_function_list(bp)
 
             self.__calc_active_break_points_by_file(bp.m_filename)
 
@@ -6259,7 +6342,6 @@ class CBreakPointsManager:
                     continue
                     
                 bp.disable()
-                self.__remove_from_function_list(bp)
                 self.__calc_active_break_points_by_file(bp.m_filename)
 
         finally:
@@ -6284,7 +6366,6 @@ class CBreakPointsManager:
                     continue
                     
                 bp.enable()
-                self.__add_to_function_list(bp)
                 self.__calc_active_break_points_by_file(bp.m_filename)
 
         finally:
@@ -6318,7 +6399,6 @@ class CBreakPointsManager:
                 if len(bpm) == 0:
                     del self.m_break_points_by_file[filename]
                     
-                self.__remove_from_function_list(bp)
                 self.__calc_active_break_points_by_file(bp.m_filename)
                     
                 del self.m_break_points_by_id[id]
@@ -6348,11 +6428,43 @@ class CCodeContext:
         self.m_filename = calc_frame_path(frame)
         self.m_basename = os.path.basename(self.m_filename)
 
+        self.m_bp_manager = bp_manager
         self.m_file_breakpoints = bp_manager.get_active_break_points_by_file(self.m_filename)
 
+        valid_lines = CalcValidLines(self.m_code)
+        self.m_first_line = valid_lines[0]
+        self.m_last_line = max(valid_lines)
+
+        self.m_bp_generation = None
+        self.m_fBreakpoints = False
+
         self.m_fExceptionTrap = False
 
 
+    def has_breakpoints(self):
+        """
+        Return True if an active breakpoint lies within the lines of 
+        this code object. Frames of code without breakpoints do not 
+        need to be traced line by line.
+        The result is kept until the breakpoints change.
+        """
+
+        generation = self.m_bp_manager.m_generation
+        if generation == self.m_bp_generation:
+            return self.m_fBreakpoints
+
+        fBreakpoints = False
+        for lineno in list(self.m_file_breakpoints.keys()):
+            if self.m_first_line <= lineno <= self.m_last_line:
+                fBreakpoints = True
+                break
+
+        self.m_fBreakpoints = fBreakpoints
+        self.m_bp_generation = generation
+
+        return fBreakpoints
+
+
     def is_untraced(self):
         """
         Return True if this code object should not be traced.
@@ -6713,7 +6825,7 @@ class CDebuggerCoreThread:
         elif code_context.m_fExceptionTrap or (frame.f_back is None):    
             frame.f_trace = self.trace_dispatch_trap
             
-        elif frame.f_code.co_name in self.m_bp_manager.m_break_points_by_function:
+        elif code_context.has_breakpoints():
             frame.f_trace = self.trace_dispatch
             
         elif frame in self.m_locals_copy:
@@ -6787,9 +6899,12 @@ class CDebuggerCoreThread:
     def trace_dispatch_call(self, frame, event, arg):
         """
         Initial trace method for thread.
+        This runs on every call, so the common case of code without
+        breakpoints while not stepping is kept as short as possible.
         """
         
-        if not self.m_core.m_ftrace:
+        core = self.m_core
+        if not core.m_ftrace:
             return self.trace_dispatch_stop(frame, event, arg)
        
         self.m_depth += 1
@@ -6799,25 +6914,36 @@ class CDebuggerCoreThread:
         self.m_frame = frame
 
         try:
-            self.m_code_context = self.m_core.m_code_contexts[frame.f_code]
+            code_context = core.m_code_contexts[frame.f_code]
         except KeyError:
-            self.m_code_context = self.m_core.get_code_context(frame)
+            code_context = core.get_code_context(frame)
+
+        self.m_code_context = code_context
 
-        if self.m_core.m_fBreak or (self.m_core.m_step_tid == self.m_thread_id):
+        if core.m_fBreak or (core.m_step_tid == self.m_thread_id):
             self.m_event = event
-            self.m_core._break(self, frame, event, arg)
+            core._break(self, frame, event, arg)
             if frame in self.m_locals_copy:
                 self.update_locals()
                 self.set_local_trace(frame)
             return frame.f_trace
 
-        if not frame.f_code.co_name in self.m_bp_manager.m_break_points_by_function:
+        #
+        # Fast run: code that can not hit a breakpoint is not traced.
+        # Changing the breakpoints calls set_all_tracers() which re-arms 
+        # the frames that are already running.
+        # The cached result of has_breakpoints() is checked inline.
+        #
+        if code_context.m_bp_generation == self.m_bp_manager.m_generation:
+            if not code_context.m_fBreakpoints:
+                return None
+        elif not code_context.has_breakpoints():
             return None
 
-        bp = self.m_code_context.m_file_breakpoints.get(frame.f_lineno, None)
+        bp = code_context.m_file_breakpoints.get(frame.f_lineno, None)
         if bp is not None and self.__eval_breakpoint(frame, bp): 
             self.m_event = event
-            self.m_core._break(self, frame, event, arg)
+            core._break(self, frame, event, arg)
             if frame in self.m_locals_copy:
                 self.update_locals()
                 self.set_local_trace(frame)
@@ -7101,6 +7227,14 @@ class CDebuggerCore:
     def send_events(self, event):
         pass
 
+
+    def hold_events(self):
+        pass
+
+
+    def release_events(self):
+        pass
+
         
     def set_request_go_timer(self, timeout):
         """
@@ -7512,87 +7646,100 @@ class CDebuggerCore:
         ctx.m_fBroken = True
         f_full_notification = False
         f_uhe_notification = False
+        f_wait = False
       
         step_tid = self.m_step_tid
 
-        try: 
-            self.m_state_manager.acquire()
-            if self.m_state_manager.get_state() != STATE_BROKEN:
-                self.set_break_dont_lock()
+        #
+        # The events of this break are sent to the client together.
+        #
+        self.hold_events()
 
-            if g_module_main == -1:
-                try:
-                    g_module_main = sys.modules['__main__']
-                except:
-                    g_module_main = None
+        try:
+            try: 
+                self.m_state_manager.acquire()
+                if self.m_state_manager.get_state() != STATE_BROKEN:
+                    self.set_break_dont_lock()
 
-            if not is_py3k() and not frame.f_exc_traceback is None:
-                ctx.set_exc_info((frame.f_exc_type, frame.f_exc_value, frame.f_exc_traceback))
+                if g_module_main == -1:
+                    try:
+                        g_module_main = sys.modules['__main__']
+                    except:
+                        g_module_main = None
 
-            if is_py3k() and ctx.get_exc_info() == None and sys.exc_info()[2] != None:
-                ctx.set_exc_info(sys.exc_info())
+                if not is_py3k() and not frame.f_exc_traceback is None:
+                    ctx.set_exc_info((frame.f_exc_type, frame.f_exc_value, frame.f_exc_traceback))
 
-            try:
-                t = current_thread()
-                ctx.m_thread_name = thread_get_name(t)
-            except:
-                pass
+                if is_py3k() and ctx.get_exc_info() == None and sys.exc_info()[2] != None:
+                    ctx.set_exc_info(sys.exc_info())
+
+                try:
+                    t = current_thread()
+                    ctx.m_thread_name = thread_get_name(t)
+                except:
+                    pass
             
-            if ctx.m_fUnhandledException and not self.m_fUnhandledException:
-                self.m_fUnhandledException = True
-                f_uhe_notification = True
+                if ctx.m_fUnhandledException and not self.m_fUnhandledException:
+                    self.m_fUnhandledException = True
+                    f_uhe_notification = True
             
-            if self.is_auto_fork_first_stage(ctx.m_thread_id):
-                self.m_saved_step = (self.m_step_tid, self.m_saved_next, self.m_return_frame)
-                self.m_saved_next = None
-                self.m_bp_manager.m_fhard_tbp = True
+                if self.is_auto_fork_first_stage(ctx.m_thread_id):
+                    self.m_saved_step = (self.m_step_tid, self.m_saved_next, self.m_return_frame)
+                    self.m_saved_next = None
+                    self.m_bp_manager.m_fhard_tbp = True
 
-            if self.m_f_first_to_break or (self.m_current_ctx == ctx):                
-                self.m_current_ctx = ctx
-                self.m_lastest_event = event
+                if self.m_f_first_to_break or (self.m_current_ctx == ctx):                
+                    self.m_current_ctx = ctx
+                    self.m_lastest_event = event
 
-                self.m_step_tid = None
-                self.m_next_frame = None
-                self.m_return_frame = None       
-                self.m_saved_next = None
+                    self.m_step_tid = None
+                    self.m_next_frame = None
+                    self.m_return_frame = None       
+                    self.m_saved_next = None
 
-                self.m_bp_manager.del_temp_breakpoint(breakpoint = ctx.get_breakpoint())
+                    self.m_bp_manager.del_temp_breakpoint(breakpoint = ctx.get_breakpoint())
 
-                self.m_f_first_to_break = False
-                f_full_notification = True
+                    self.m_f_first_to_break = False
+                    f_full_notification = True
 
-        finally:
-            self.m_state_manager.release()
+            finally:
+                self.m_state_manager.release()
 
-        ffork_second_stage = self.handle_fork(ctx)
-        self.handle_exec(ctx)
+            ffork_second_stage = self.handle_fork(ctx)
+            self.handle_exec(ctx)
 
-        if self.is_auto_fork_first_stage(ctx.m_thread_id):
-            self.request_go_quiet()
+            if self.is_auto_fork_first_stage(ctx.m_thread_id):
+                self.request_go_quiet()
 
-        elif self.m_ffork_auto and ffork_second_stage:
-            (self.m_step_tid, self.m_next_frame, self.m_return_frame) = self.m_saved_step
-            self.m_saved_step = (None, None, None)
-            self.m_bp_manager.m_fhard_tbp = False
-            self.request_go_quiet()
+            elif self.m_ffork_auto and ffork_second_stage:
+                (self.m_step_tid, self.m_next_frame, self.m_return_frame) = self.m_saved_step
+                self.m_saved_step = (None, None, None)
+                self.m_bp_manager.m_fhard_tbp = False
+                self.request_go_quiet()
 
-        elif self.get_clients_attached() == 0:
-            #print_debug('state: %s' % self.m_state_manager.get_state())
-            self.request_go_quiet()
+            elif self.get_clients_attached() == 0:
+                #print_debug('state: %s' % self.m_state_manager.get_state())
+                self.request_go_quiet()
 
-        elif step_tid == ctx.m_thread_id and frame.f_code.co_name == 'rpdb2_import_wrapper':
-            self.request_step_quiet()
+            elif step_tid == ctx.m_thread_id and frame.f_code.co_name == 'rpdb2_import_wrapper':
+                self.request_step_quiet()
 
-        else:
-            if f_full_notification:
-                self.send_events(None) 
             else:
-                self.notify_thread_broken(ctx.m_thread_id, ctx.m_thread_name)
-                self.notify_namespace()
+                if f_full_notification:
+                    self.send_events(None) 
+                else:
+                    self.notify_thread_broken(ctx.m_thread_id, ctx.m_thread_name)
+                    self.notify_namespace()
 
-            if f_uhe_notification:
-                self.send_unhandled_exception_event()
-                
+                if f_uhe_notification:
+                    self.send_unhandled_exception_event()
+
+                f_wait = True
+
+        finally:
+            self.release_events()
+
+        if f_wait:
             state = self.m_state_manager.wait_for_state([STATE_RUNNING])
       
         self.prepare_fork_step(ctx.m_thread_id)
@@ -7794,17 +7941,23 @@ class CDebuggerCore:
         if len(self.m_threads) == 0:
             self.wait_for_first_thread()
         
+        self.hold_events()
+
         try:
-            self.m_state_manager.acquire()
-            if self.m_state_manager.get_state() == STATE_BROKEN:
-                return
+            try:
+                self.m_state_manager.acquire()
+                if self.m_state_manager.get_state() == STATE_BROKEN:
+                    return
+
+                self.set_break_dont_lock()
 
-            self.set_break_dont_lock()
+            finally:    
+                self.m_state_manager.release()
 
-        finally:    
-            self.m_state_manager.release()
+            self.send_events(None)
 
-        self.send_events(None)
+        finally:
+            self.release_events()
 
 
     def request_go_quiet(self, fLock = True):
@@ -8052,9 +8205,38 @@ class CDebuggerEngine(CDebuggerCore):
         self.m_event_queue = CEventQueue(self.m_event_dispatcher)
         self.m_event_queue.register_event_types(event_type_dict)
 
+        #
+        # (serial, {name: (nl, filter_level, repr_limit, encoding, fraw)})
+        #
+        self.m_namespace_requests = (0, {})
+
         event_type_dict = {CEventSync: {}}
         self.m_event_dispatcher.register_callback(self.send_events, event_type_dict, fSingleUse = False)
 
+        #
+        # Children lists of the paged namespace expressions, kept until 
+        # the next break.
+        #
+        self.m_namespace_cache = {}
+
+
+    def set_break_dont_lock(self):
+        self.m_namespace_cache = {}
+        CDebuggerCore.set_break_dont_lock(self)
+
+
+    def hold_events(self):
+        """
+        Hold events back from the client until release_events() is 
+        called, so that a break is reported in a single batch.
+        """
+
+        self.m_event_queue.hold()
+
+
+    def release_events(self):
+        self.m_event_queue.release()
+
 
     def shutdown(self):
         self.m_event_queue.shutdown()
@@ -8216,24 +8398,30 @@ class CDebuggerEngine(CDebuggerCore):
             fException = False
             fSendUnhandled = False
 
+        self.hold_events()
+
         try:
-            if isinstance(event, CEventSync) and not fException:
-                self.m_state_manager.set_state()
+            try:
+                if isinstance(event, CEventSync) and not fException:
+                    self.m_state_manager.set_state()
+                    
+                self.send_stack_depth()
+                self.send_threads_event(fException)
+                self.send_stack_event(fException)
+                self.send_namespace_event(fException)
+
+                if fSendUnhandled and self.m_fUnhandledException:
+                    self.send_unhandled_exception_event()
                 
-            self.send_stack_depth()
-            self.send_threads_event(fException)
-            self.send_stack_event(fException)
-            self.send_namespace_event()
+            except NoThreads:
+                self.send_no_threads_event()
+                
+            except:
+                print_debug_exception()
+                raise
 
-            if fSendUnhandled and self.m_fUnhandledException:
-                self.send_unhandled_exception_event()
-            
-        except NoThreads:
-            self.send_no_threads_event()
-            
-        except:
-            print_debug_exception()
-            raise
+        finally:
+            self.release_events()
 
        
     def send_unhandled_exception_event(self):
@@ -8311,12 +8499,30 @@ class CDebuggerEngine(CDebuggerCore):
         self.m_event_dispatcher.fire_event(event)
 
         
-    def send_namespace_event(self):
+    def send_namespace_event(self, fException = False):
         """
         Send event notifying namespace should be queried again.
+        The event carries the answers to the namespace requests of the 
+        debugger for the top frame, unless the answers can not be 
+        calculated without the help of the broken thread.
         """
         
-        event = CEventNamespace()
+        namespace = None
+        (serial, requests) = self.m_namespace_requests
+
+        if len(requests) > 0 and self.m_fsynchronicity and not fException:
+            try:
+                answers = {}
+                for (name, args) in requests.items():
+                    (nl, filter_level, repr_limit, encoding, fraw) = args
+                    answers[name] = self.get_namespace(nl, filter_level, 0, False, repr_limit, encoding, fraw)
+
+                namespace = (serial, answers)
+
+            except:
+                print_debug_exception()
+
+        event = CEventNamespace(namespace)
         self.m_event_dispatcher.fire_event(event)
 
 
@@ -8834,6 +9040,138 @@ class CDebuggerEngine(CDebuggerCore):
         return snl                
 
 
+    def __calc_subnode_keys(self, expr, r, fForceNames, filter_level, repr_limit, encoding, key_filter):
+        """
+        Return the list of children of r in namespace order: the items of 
+        a set, the keys of a dict, the indexes of a list or tuple or the 
+        attribute names of an object. Children with names that do not 
+        match key_filter are left out.
+        """
+
+        if isinstance(r, (set, frozenset)):
+            if len(r) > MAX_SORTABLE_LENGTH:
+                kl = [i for i in r]
+            else:
+                kl = [i for i in r]
+                sort(kl)
+
+            nf = lambda i: repr_ltd(i, repr_limit, encoding)
+
+        elif isinstance(r, (list, tuple)):
+            kl = list(range(len(r)))
+            nf = lambda i: as_unicode(repr(i))
+
+        elif isinstance(r, dict):
+            if filter_level == 2 and expr in ['locals()', 'globals()']:
+                r = copy.copy(r)
+                for k, v in list(r.items()):
+                    if parse_type(type(v)) in ['function', 'classobj', 'type']:
+                        del r[k]
+
+            kl = list(r.keys())
+            if len(r) <= MAX_SORTABLE_LENGTH:
+                sort(kl)
+
+            kl = [k for k in kl if not k in ['_RPDB2_FindRepr', '_RPDB2_builtins', '_rpdb2_args', '_rpdb2_pwd', 'm_rpdb2_pwd']]
+            nf = lambda k: as_unicode([repr_ltd(k, repr_limit, encoding), k][fForceNames])
+
+        else:
+            kl = calc_attribute_list(r, filter_level)
+            sort(kl)
+
+            kl = [a for a in kl if a != 'm_rpdb2_pwd']
+            nf = as_unicode
+
+        if key_filter:
+            kl = [k for k in kl if re.match(key_filter, nf(k))]
+
+        return kl
+
+
+    def __calc_subnodes_page(self, ckey, expr, r, fForceNames, filter_level, repr_limit, encoding, offset, count, key_filter):
+        """
+        Return (number of children, children dictionaries) for the children 
+        of r from offset to offset + count. The list of children is cached 
+        with ckey until the next break so that getting a page takes the 
+        same time regardless of the number of children.
+        """
+
+        if isinstance(r, (list, tuple)) and not key_filter:
+            n = len(r)
+            kl = range(offset, min(n, offset + count))
+
+        else:
+            size = self.__calc_number_of_subnodes(r)
+            cached = self.m_namespace_cache.get(ckey, None)
+            if cached is not None and cached[0] == id(r) and cached[1] == size:
+                al = cached[2]
+            else:
+                al = self.__calc_subnode_keys(expr, r, fForceNames, filter_level, repr_limit, encoding, key_filter)
+                if len(self.m_namespace_cache) >= MAX_NAMESPACE_CACHE:
+                    self.m_namespace_cache = {}
+                self.m_namespace_cache[ckey] = (id(r), size, al)
+
+            n = len(al)
+            kl = al[offset: offset + count]
+
+        snl = []
+
+        for k in kl:
+            is_valid = [True]
+            e = {}
+
+            if isinstance(r, (set, frozenset)):
+                rk = repr_ltd(k, REPR_ID_LENGTH, encoding = ENCODING_RAW_I)
+                v = k
+                e[DICT_KEY_EXPR] = as_unicode('_RPDB2_FindRepr((%s), %d)["%s"]' % (expr, REPR_ID_LENGTH, rk.replace('"', '&quot')))
+                e[DICT_KEY_NAME] = repr_ltd(k, repr_limit, encoding)
+
+            elif isinstance(r, (list, tuple)):
+                v = r[k]
+                e[DICT_KEY_EXPR] = as_unicode('(%s)[%d]' % (expr, k))
+                e[DICT_KEY_NAME] = as_unicode(repr(k))
+
+            elif isinstance(r, dict):
+                try:
+                    v = r[k]
+                except KeyError:
+                    continue
+
+                if [True for t in [bool, int, float, bytes, str, unicode, type(None)] if t is type(k)]:
+                    rk = repr(k)
+                    if len(rk) < REPR_ID_LENGTH:
+                        e[DICT_KEY_EXPR] = as_unicode('(%s)[%s]' % (expr, rk))
+
+                if type(k) is str8:
+                    rk = repr(k)
+                    if len(rk) < REPR_ID_LENGTH:
+                        e[DICT_KEY_EXPR] = as_unicode('(%s)[str8(%s)]' % (expr, rk[1:]))
+
+                if not DICT_KEY_EXPR in e:
+                    rk = repr_ltd(k, REPR_ID_LENGTH, encoding = ENCODING_RAW_I)
+                    e[DICT_KEY_EXPR] = as_unicode('_RPDB2_FindRepr((%s), %d)["%s"]' % (expr, REPR_ID_LENGTH, rk.replace('"', '&quot')))
+
+                e[DICT_KEY_NAME] = as_unicode([repr_ltd(k, repr_limit, encoding), k][fForceNames])
+
+            else:
+                try:
+                    v = getattr(r, k)
+                except AttributeError:
+                    continue
+
+                e[DICT_KEY_EXPR] = as_unicode('(%s).%s' % (expr, k))
+                e[DICT_KEY_NAME] = as_unicode(k)
+
+            e[DICT_KEY_REPR] = repr_ltd(v, repr_limit, encoding, is_valid)
+            e[DICT_KEY_IS_VALID] = is_valid[0]
+            e[DICT_KEY_TYPE] = as_unicode(parse_type(type(v)))
+            e[DICT_KEY_N_SUBNODES] = self.__calc_number_of_subnodes(v)
+
+            snl.append(e)
+
+        return (n, snl)
+
+
     def get_exception(self, frame_index, fException):
         ctx = self.get_current_ctx()
         
@@ -8872,7 +9210,7 @@ class CDebuggerEngine(CDebuggerCore):
         return False        
 
 
-    def calc_expr(self, expr, fExpand, filter_level, frame_index, fException, _globals, _locals, lock, event, rl, index, repr_limit, encoding):
+    def calc_expr(self, expr, fExpand, filter_level, frame_index, fException, _globals, _locals, lock, event, rl, index, repr_limit, encoding, page = None):
         e = {}
 
         try:
@@ -8897,8 +9235,16 @@ class CDebuggerEngine(CDebuggerCore):
             
             if fExpand and (e[DICT_KEY_N_SUBNODES] > 0):
                 fForceNames = (expr in ['globals()', 'locals()']) or (RPDB_EXEC_INFO in expr)
-                e[DICT_KEY_SUBNODES] = self.__calc_subnodes(expr, r, fForceNames, filter_level, repr_limit, encoding)
-                e[DICT_KEY_N_SUBNODES] = len(e[DICT_KEY_SUBNODES])
+                if page:
+                    (offset, count, key_filter) = page
+                    ckey = (expr, frame_index, fException, filter_level, key_filter, self.get_current_ctx().m_thread_id)
+                    (n, snl) = self.__calc_subnodes_page(ckey, expr, r, fForceNames, filter_level, repr_limit, encoding, offset, count, key_filter)
+                    e[DICT_KEY_SUBNODES] = snl
+                    e[DICT_KEY_N_SUBNODES] = n
+                    e[DICT_KEY_OFFSET] = offset
+                else:
+                    e[DICT_KEY_SUBNODES] = self.__calc_subnodes(expr, r, fForceNames, filter_level, repr_limit, encoding)
+                    e[DICT_KEY_N_SUBNODES] = len(e[DICT_KEY_SUBNODES])
                 
         except:
             print_debug_exception()
@@ -8954,12 +9300,19 @@ class CDebuggerEngine(CDebuggerCore):
         index = 0
         lock = threading.Condition()
         
-        for (expr, fExpand) in nl:
+        for item in nl:
+            (expr, fExpand) = item[:2]
+            page = None
+            if len(item) > 2:
+                # Missing fields of (offset, count, key filter) get their defaults
+                defaults = (0, MAX_NAMESPACE_ITEMS, None)
+                page = tuple(item[2:5]) + defaults[len(item[2:5]):]
+
             if self.is_child_of_failure(failed_expr_list, expr):
                 continue
 
             event = threading.Event()
-            args = (expr, fExpand, filter_level, frame_index, fException, _globals, _locals, lock, event, rl, index, repr_limit, encoding)
+            args = (expr, fExpand, filter_level, frame_index, fException, _globals, _locals, lock, event, rl, index, repr_limit, encoding, page)
 
             if self.m_fsynchronicity:
                 g_server.m_work_queue.post_work_item(target = self.calc_expr, args = args, name = 'calc_expr %s' % expr)
@@ -8988,6 +9341,16 @@ class CDebuggerEngine(CDebuggerCore):
         return _rl 
 
 
+    def set_namespace_requests(self, serial, requests):
+        """
+        Set the namespace queries to answer in the namespace event.
+        requests is a dictionary of names to tuples of the arguments
+        (nl, filter_level, repr_limit, encoding, fraw) of get_namespace().
+        """
+
+        self.m_namespace_requests = (serial, requests)
+
+
     def evaluate(self, expr, frame_index, fException, encoding, fraw):
         """
         Evaluate expression in context of frame at depth 'frame-index'.
@@ -9017,9 +9380,63 @@ class CDebuggerEngine(CDebuggerCore):
 
         (_globals, _locals, x) = self.__get_locals_globals(frame_index, fException)
 
+        (v, w, e, t) = self.__evaluate_expr(expr, _globals, _locals, encoding, fraw)
+
+        self.notify_namespace()
+
+        result.append((v, w, e))
+
+
+    def evaluate_list(self, exprs, frame_index, fException, encoding, fraw):
+        """
+        Evaluate a list of expressions in context of frame at depth 
+        'frame-index'. Return a list of (value, warning, error, type name)
+        tuples, one for each expression.
+        """
+
+        bad = (as_unicode(''), as_unicode(STR_SYNCHRONICITY_BAD), as_unicode(''), as_unicode(''))
+        result = [[bad for expr in exprs]]
+
+        if self.m_fsynchronicity:
+            self._evaluate_list(result, exprs, frame_index, fException, encoding, fraw)
+        else:
+            try:
+                ctx = self.get_current_ctx()
+                tid = ctx.m_thread_id
+                send_job(tid, 1000 * max(1, len(exprs)), self._evaluate_list, result, exprs, frame_index, fException, encoding, fraw) 
+            except:
+                pass
+
+        return result[-1]
+
+
+    def _evaluate_list(self, result, exprs, frame_index, fException, encoding, fraw):
+        """
+        Evaluate a list of expressions in context of frame at depth 
+        'frame-index'.
+        """
+
+        encoding = self.__calc_encoding(encoding)
+
+        (_globals, _locals, x) = self.__get_locals_globals(frame_index, fException)
+
+        rl = [self.__evaluate_expr(expr, _globals, _locals, encoding, fraw) for expr in exprs]
+
+        self.notify_namespace()
+
+        result.append(rl)
+
+
+    def __evaluate_expr(self, expr, _globals, _locals, encoding, fraw):
+        """
+        Evaluate expression with the given globals and locals.
+        Return a tuple (value, warning, error, type name).
+        """
+
         v = ''
         w = ''
         e = ''
+        t = ''
 
         try:
             if '_rpdb2_pwd' in expr or '_rpdb2_args' in expr:
@@ -9046,6 +9463,7 @@ class CDebuggerEngine(CDebuggerCore):
                 encoding = ENCODING_RAW_I
 
             v = repr_ltd(r, MAX_EVALUATE_LENGTH, encoding)
+            t = safe_str(type(r).__name__)
             
             if len(v) > MAX_EVALUATE_LENGTH:
                 v += '... *** %s ***' % STR_MAX_EVALUATE_LENGTH_WARNING 
@@ -9055,9 +9473,7 @@ class CDebuggerEngine(CDebuggerCore):
             exc_info = sys.exc_info()
             e = "%s, %s" % (safe_str(exc_info[0]), safe_str(exc_info[1]))
 
-        self.notify_namespace()
-
-        result.append((as_unicode(v), as_unicode(w), as_unicode(e)))
+        return (as_unicode(v), as_unicode(w), as_unicode(e), as_unicode(t))
 
         
     def execute(self, suite, frame_index, fException, encoding):
@@ -9068,6 +9484,11 @@ class CDebuggerEngine(CDebuggerCore):
         
         result = [(as_unicode(STR_SYNCHRONICITY_BAD), as_unicode(''))]
 
+        #
+        # The suite may change the namespace.
+        #
+        self.m_namespace_cache = {}
+
         if self.m_fsynchronicity:
             self._execute(result, suite, frame_index, fException, encoding)
         else:
@@ -9415,6 +9836,55 @@ def my_xmlrpclib_loads(data):
 
 
 
+#
+# MOD
+#
+class CXMLRPCRequestHandler(SimpleXMLRPCServer.SimpleXMLRPCRequestHandler):
+    """
+    Modification of SimpleXMLRPCServer.SimpleXMLRPCRequestHandler that
+    keeps connections alive between requests so that clients do not 
+    reconnect on every call.
+    Older request handlers shut down the connection after each response,
+    so keep-alive is only enabled where it is supported.
+    """
+
+    if sys.version_info[:2] >= (2, 7):
+        protocol_version = 'HTTP/1.1'
+
+
+    def handle(self):
+        self.close_connection = 1
+        self.handle_one_request()
+
+        while not self.close_connection and self.__wait_for_request():
+            self.handle_one_request()
+
+
+    def __wait_for_request(self):
+        """
+        Wait for the next request on a kept-alive connection.
+        Return False if the connection stays idle for too long or if
+        the server is stopping, so the worker thread is released.
+        """
+
+        t0 = time.time()
+
+        while not g_server.m_stop:
+            if time.time() - t0 > KEEPALIVE_TIMEOUT:
+                return False
+
+            try:
+                r, w, x = select.select([self.connection], [], [], KEEPALIVE_POLL_INTERVAL)
+            except (select.error, socket.error, ValueError):
+                return False
+
+            if len(r) > 0:
+                return True
+
+        return False
+
+
+
 #
 # MOD
 #
@@ -9644,6 +10114,7 @@ class CIOServer:
     def run(self):
         if self.m_server == None:
             (self.m_port, self.m_server) = self.__StartXMLRPCServer()
+            self.report_port()
        
         self.m_work_queue = CWorkQueue()
         self.m_server.register_function(self.dispatcher_method)        
@@ -9734,7 +10205,7 @@ class CIOServer:
 
         while True:
             try:
-                server = CXMLRPCServer((host, port), logRequests = 0)
+                server = CXMLRPCServer((host, port), requestHandler = CXMLRPCRequestHandler, logRequests = 0)
                 return (port, server)
                 
             except socket.error:
@@ -9753,6 +10224,10 @@ class CIOServer:
         pass
 
 
+    def report_port(self):
+        pass
+
+
 
 class CServerInfo(object):
     def __init__(self, age, port, pid, filename, rid, state, fembedded):
@@ -9783,7 +10258,7 @@ class CDebuggeeServer(CIOServer):
     The debuggee XML RPC server class.
     """
     
-    def __init__(self, filename, debugger, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, rid = None):
+    def __init__(self, filename, debugger, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, rid = None, handshake = None):
         if rid is None:
             rid = generate_rid()
         
@@ -9797,11 +10272,27 @@ class CDebuggeeServer(CIOServer):
         self.m_time = time.time()
         self.m_debugger = debugger
         self.m_rid = rid
+        self.m_handshake = handshake
 
                 
     def shutdown(self):
         CIOServer.shutdown(self)
 
+
+    def report_port(self):
+        """
+        Let the client that launched the debuggee know which port
+        the server is listening on.
+        """
+
+        if self.m_handshake is None:
+            return
+
+        try:
+            write_handshake_file(self.m_handshake, self.m_port)
+        except (IOError, OSError):
+            print_debug_exception()
+
         
     def record_client_heartbeat(self, id, name, params):
         finit = (name == 'request_break')
@@ -9922,11 +10413,21 @@ class CDebuggeeServer(CIOServer):
         r = self.m_debugger.get_namespace(nl, filter_level, frame_index, fException, repr_limit, encoding, fraw)
         return r
 
+
+    def export_set_namespace_requests(self, serial, requests):
+        self.m_debugger.set_namespace_requests(serial, requests)
+        return 0
+
         
     def export_evaluate(self, expr, frame_index, fException, encoding, fraw):
         (v, w, e) = self.m_debugger.evaluate(expr, frame_index, fException, encoding, fraw)
         return (v, w, e)
 
+
+    def export_evaluate_list(self, exprs, frame_index, fException, encoding, fraw):
+        rl = self.m_debugger.evaluate_list(exprs, frame_index, fException, encoding, fraw)
+        return rl
+
         
     def export_execute(self, suite, frame_index, fException, encoding):
         (w, e) = self.m_debugger.execute(suite, frame_index, fException, encoding)
@@ -10068,19 +10569,54 @@ class CLocalTransport(xmlrpclib.Transport):
     """
     Modification of xmlrpclib.Transport to work around Zonealarm sockets
     bug.
+    Connections are kept alive in a pool. A thread checks out a connection
+    for the duration of a request since threads can not share a connection.
     """
     
     _connection_class = httplib.HTTPConnection
     _connection_class_old = httplib_HTTP
 
+    #
+    # Payloads are already compressed by CCrypto.
+    #
+    accept_gzip_encoding = False
+
+
+    def __init__(self, *args, **kwargs):
+        if hasattr(xmlrpclib.Transport, '__init__'):
+            xmlrpclib.Transport.__init__(self, *args, **kwargs)
+
+        self.m_lock = threading.Lock()
+        self.m_pool = {}
+
+        if hasattr(self, '_connection'):
+            self.m_local = threading.local()
+
+
+    def request(self, host, handler, request_body, verbose = 0):
+        if not hasattr(self, '_connection'):
+            return xmlrpclib.Transport.request(self, host, handler, request_body, verbose)
+
+        try:
+            return xmlrpclib.Transport.request(self, host, handler, request_body, verbose)
+        finally:
+            self.__checkin()
+
 
     def make_connection(self, host):
         # New Python version of connect().
-        # However, make_connection is hacked to always create a new connection
-        # Otherwise all threads use single connection and crash.
+        # The connection checked out by this thread is reused until the
+        # request completes; otherwise take an idle one from the pool.
         if hasattr(self, '_connection'):
             chost, self._extra_headers, x509 = self.get_host_info(host)
-            return self._connection_class(chost)
+
+            connection = getattr(self.m_local, 'connection', None)
+            if connection is None:
+                connection = self.__checkout(chost)
+                self.m_local.connection = connection
+                self.m_local.host = chost
+
+            return connection
  
         # Old Python version of connect().
         # create a HTTP connection object from a host descriptor
@@ -10088,6 +10624,80 @@ class CLocalTransport(xmlrpclib.Transport):
         return self._connection_class_old(host)
 
 
+    def close(self):
+        """
+        Close the connection checked out by the calling thread.
+        """
+
+        if not hasattr(self, '_connection'):
+            return
+
+        connection = getattr(self.m_local, 'connection', None)
+        self.m_local.connection = None
+
+        if connection is not None:
+            connection.close()
+
+
+    def __checkout(self, host):
+        self.m_lock.acquire()
+        try:
+            pool = self.m_pool.get(host, [])
+
+            while len(pool) > 0:
+                (connection, t) = pool.pop()
+
+                #
+                # The server drops connections that are idle for 
+                # KEEPALIVE_TIMEOUT, so do not reuse connections that 
+                # may be about to close.
+                #
+                if time.time() - t < KEEPALIVE_TIMEOUT / 2:
+                    return connection
+
+                connection.close()
+
+        finally:
+            self.m_lock.release()
+
+        return self._connection_class(host)
+
+
+    def __checkin(self):
+        connection = getattr(self.m_local, 'connection', None)
+        if connection is None:
+            return
+
+        self.m_local.connection = None
+
+        self.m_lock.acquire()
+        try:
+            pool = self.m_pool.setdefault(self.m_local.host, [])
+            if len(pool) < KEEPALIVE_POOL_SIZE:
+                pool.append((connection, time.time()))
+                return
+
+        finally:
+            self.m_lock.release()
+
+        connection.close()
+
+
+    def parse_response(self, response):
+        # read the entire response body at once, and parse it
+
+        p, u = self.getparser()
+
+        data = response.read()
+        if self.verbose:
+            _print("body: " + repr(data))
+
+        p.feed(data)
+        p.close()
+
+        return u.close()
+
+
     def __parse_response(self, file, sock):
         # read response from input file/socket, and parse it
 
@@ -10095,10 +10705,10 @@ class CLocalTransport(xmlrpclib.Transport):
 
         while 1:
             if sock:
-                response = sock.recv(1024)
+                response = sock.recv(RESPONSE_BUFFER_SIZE)
             else:
                 time.sleep(0.002)
-                response = file.read(1024)
+                response = file.read(RESPONSE_BUFFER_SIZE)
             if not response:
                 break
             if self.verbose:
@@ -10298,6 +10908,21 @@ class CServerList:
         return self.m_list 
 
 
+    def calcServer(self, _rpdb2_pwd, rid, port):
+        """
+        Like calcList() but only query the server on the given port.
+        """
+
+        self.m_errors = {}
+
+        s = CSession(self.m_host, port, _rpdb2_pwd, fAllowUnencrypted = True, rid = rid)
+        s.Connect()
+
+        self.m_list = [s.getServerInfo()]
+
+        return self.m_list
+
+
     def get_errors(self):
         return self.m_errors
 
@@ -10624,7 +11249,7 @@ class CSessionManagerInternal:
             subprocess.Popen(command, shell=True)
 
     
-    def attach(self, key, name = None, fsupress_pwd_warning = False, fsetenv = False, ffirewall_test = True, server = None, fload_breakpoints = True):
+    def attach(self, key, name = None, fsupress_pwd_warning = False, fsetenv = False, ffirewall_test = True, server = None, fload_breakpoints = True, port = None):
         assert(is_unicode(key))
 
         self.__verify_unattached()
@@ -10636,6 +11261,13 @@ class CSessionManagerInternal:
             #self.m_printer(STR_PASSWORD_MUST_BE_SET)
             raise UnsetPassword
        
+        #
+        # A known port means the debuggee is already listening on it,
+        # and a blocked connection is reported by the attach itself.
+        #
+        if port is not None:
+            ffirewall_test = False
+
         if g_fFirewallTest and ffirewall_test:
             firewall_test = CFirewallTest(self.get_remote())
             if not firewall_test.run():
@@ -10654,7 +11286,11 @@ class CSessionManagerInternal:
         try:
             servers = [server]
             if server == None:
-                self.m_server_list_object.calcList(self.m_rpdb2_pwd, self.m_rid)                
+                if port is None:
+                    self.m_server_list_object.calcList(self.m_rpdb2_pwd, self.m_rid)                
+                else:
+                    self.m_server_list_object.calcServer(self.m_rpdb2_pwd, self.m_rid, port)
+
                 servers = self.m_server_list_object.findServers(key)
                 server = servers[0] 
 
@@ -10783,13 +11419,21 @@ class CSessionManagerInternal:
         self.m_worker_thread_ident = thread.get_ident()
         t = 0
         nfailures = 0
+        sel = []
         
         while not self.m_fStop:
             try:
-                t = ControlRate(t, IDLE_MAX_RATE)
+                #
+                # Events arrive in batches, one per break, so after a 
+                # batch poll again right away.
+                #
+                if len(sel) == 0:
+                    t = ControlRate(t, IDLE_MAX_RATE)
+
                 if self.m_fStop:
                     return
                 
+                sel = []
                 (n, sel) = self.getSession().getProxy().wait_for_event(PING_TIMEOUT, self.m_remote_event_index)
                 
                 if True in [isinstance(e, CEventForkSwitch) for e in sel]:
@@ -11220,6 +11864,17 @@ class CSessionManagerInternal:
         return r
 
 
+    def set_namespace_requests(self, serial, requests):
+        self.__verify_attached()
+
+        _requests = {}
+        for (name, (nl, filter_level, repr_limit)) in requests.items():
+            _requests[name] = (nl, filter_level, repr_limit, self.m_encoding, self.m_fraw)
+
+        r = self.getSession().getProxy().set_namespace_requests(serial, _requests)
+        return r
+
+
     def evaluate(self, expr, fclear_completions = True):
         assert(is_unicode(expr))
 
@@ -11236,6 +11891,23 @@ class CSessionManagerInternal:
 
         return (value, warning, error)
 
+
+    def evaluate_list(self, exprs):
+        for expr in exprs:
+            assert(is_unicode(expr))
+
+        self.__verify_attached()
+        self.__verify_broken()
+
+        frame_index = self.get_frame_index()
+        fAnalyzeMode = (self.m_state_manager.get_state() == STATE_ANALYZE) 
+
+        rl = self.getSession().getProxy().evaluate_list(exprs, frame_index, fAnalyzeMode, self.m_encoding, self.m_fraw)
+        
+        self.m_completions.clear()
+
+        return [tuple(r) for r in rl]
+
         
     def execute(self, suite):
         assert(is_unicode(suite))
@@ -14156,7 +14828,7 @@ def __start_embedded_debugger(_rpdb2_pwd, fAllowUnencrypted, fAllowRemote, timeo
 
 
 
-def StartServer(args, fchdir, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, rid): 
+def StartServer(args, fchdir, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, rid, handshake = None): 
     assert(is_unicode(_rpdb2_pwd))
 
     global g_server
@@ -14201,7 +14873,7 @@ def StartServer(args, fchdir, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, rid):
 
     g_debugger = CDebuggerEngine()
 
-    g_server = CDebuggeeServer(ExpandedFilename, g_debugger, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, rid)
+    g_server = CDebuggeeServer(ExpandedFilename, g_debugger, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, rid, handshake)
     g_server.start()
 
     try:
@@ -14323,7 +14995,7 @@ def main(StartClient_func = StartClient, version = RPDB_TITLE):
         options, _rpdb2_args = getopt.getopt(
                             argv[1:], 
                             'hdao:rtep:scv', 
-                            ['help', 'debugee', 'debuggee', 'attach', 'host=', 'remote', 'plaintext', 'encrypt', 'pwd=', 'rid=', 'screen', 'chdir', 'base64=', 'nofwtest', 'version', 'debug']
+                            ['help', 'debugee', 'debuggee', 'attach', 'host=', 'remote', 'plaintext', 'encrypt', 'pwd=', 'rid=', 'handshake=', 'screen', 'chdir', 'base64=', 'nofwtest', 'version', 'debug']
                             )
 
     except getopt.GetoptError:
@@ -14337,6 +15009,7 @@ def main(StartClient_func = StartClient, version = RPDB_TITLE):
     
     encoded_path = None
     secret = None
+    handshake = None
     host = None
     _rpdb2_pwd = None
     fchdir = False
@@ -14368,6 +15041,8 @@ def main(StartClient_func = StartClient, version = RPDB_TITLE):
             _rpdb2_pwd = a
         if o in ['--rid']:
             secret = a
+        if o in ['--handshake']:
+            handshake = a
         if o in ['-s', '--screen']:
             g_fScreen = True
         if o in ['-c', '--chdir']:
@@ -14415,6 +15090,10 @@ def main(StartClient_func = StartClient, version = RPDB_TITLE):
         _print("--host can only be used together with --attach.")
         return 2
 
+    if (handshake is not None) and not fWrap:
+        _print("--handshake can only be used together with --debuggee.")
+        return 2
+
     if host is None:
         host = LOCALHOST    
 
@@ -14470,7 +15149,7 @@ def main(StartClient_func = StartClient, version = RPDB_TITLE):
             _print(STR_ENCRYPTION_SUPPORT_ERROR)
             return 2
 
-        StartServer(_rpdb2_args, fchdir, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, secret)
+        StartServer(_rpdb2_args, fchdir, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, secret, handshake)
         
     elif fAttach:
         StartClient_func(_rpdb2_args[0], fAttach, fchdir, _rpdb2_pwd, fAllowUnencrypted, fAllowRemote, host)
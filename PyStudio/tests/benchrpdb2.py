@@ -0,0 +1,185 @@
+###############################################################################
+# Name: benchrpdb2.py
+# Purpose: Benchmark of the rpdb2 tracing overhead
+# Author: Cody Precord <cprecord@editra.org>
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>
+# License: wxWindows License
+###############################################################################
+
+"""
+Measure how much slower a CPU bound workload runs under the rpdb2 debugger.
+
+  plain    - no debugger
+  traced   - debugger with a breakpoint inside the workload, which is then
+             traced line by line (the breakpoint line is never reached)
+  fastrun  - debugger with a breakpoint outside the workload, which is then
+             not traced line by line
+  shared   - as fastrun, but the breakpoint is in a method with the same
+             name as the workload function
+
+Usage: python benchrpdb2.py [--rpdb2=<directory of rpdb2.py> ...] [mode]
+
+Each mode runs in its own interpreter, as the debugger can not be removed
+once it is started. Without a mode all of them are run ROUNDS times and the
+median times are compared. Giving more than one rpdb2 directory compares
+the versions of rpdb2 in them.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+import time
+import subprocess
+
+#-----------------------------------------------------------------------------#
+# Globals
+MODES = ('plain', 'traced', 'fastrun', 'shared')
+REPEAT = 5
+ROUNDS = 7
+SCRIPT = os.path.abspath(__file__)
+if SCRIPT.endswith('.pyc'):
+    SCRIPT = SCRIPT[:-1]
+RPDB2_DIR = os.path.join(os.path.dirname(SCRIPT), '..')
+
+#-----------------------------------------------------------------------------#
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def add(self, other):
+        return Point(self.x + other.x, self.y + other.y)
+
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+def workload():
+    """CPU bound mix of calls, allocations and loops"""
+    point = Point(0, 0)
+    for i in range(20000):
+        point = point.add(Point(i, 1))
+    total = 0
+    for i in range(60000):
+        if i < 0:
+            total = -1 # traced breakpoint
+        total += i % 7
+    return fib(18) + point.x + total
+
+def unused():
+    return None # fastrun breakpoint
+
+class Unused(object):
+    def workload(self):
+        return None # shared breakpoint
+
+#-----------------------------------------------------------------------------#
+
+def FindLine(marker):
+    """Get the line number of the line ending with the marker comment"""
+    handle = open(SCRIPT, 'r')
+    try:
+        for lineno, line in enumerate(handle):
+            if line.rstrip().endswith('# ' + marker):
+                return lineno + 1
+    finally:
+        handle.close()
+    raise ValueError(marker)
+
+def StartDebugger(mode):
+    """Start rpdb2 in this process and set the breakpoint for the mode.
+    The breakpoint is set before the workload is called, so it is set in
+    the breakpoint manager directly instead of through the debugger, which
+    expects to be called from its server threads.
+
+    """
+    import rpdb2
+    rpdb2.start_embedded_debugger(rpdb2.as_unicode('bench'), timeout=0)
+    lineno = FindLine('%s breakpoint' % mode)
+    bpmanager = rpdb2.g_debugger.m_bp_manager
+    bpmanager.set_breakpoint(SCRIPT, rpdb2.as_unicode(''), lineno, True,
+                             rpdb2.as_unicode(''), rpdb2.as_unicode('utf-8'))
+
+def Median(values):
+    """Get the median of a list of numbers"""
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def RunMode(mode):
+    """Run the workload and print the median processor time in seconds.
+    The median is used as the debugger threads make some runs faster or
+    slower than the others.
+
+    """
+    if mode != 'plain':
+        StartDebugger(mode)
+    times = list()
+    for i in range(REPEAT):
+        start = time.clock()
+        workload()
+        times.append(time.clock() - start)
+    sys.stdout.write('%f\n' % Median(times))
+    sys.stdout.flush()
+
+def RunAll(rpdb2_dirs):
+    """Run every mode in a new interpreter and print the comparison. The
+    runs of the rpdb2 versions are interleaved so that changes in the speed
+    of the machine affect all of them alike.
+
+    """
+    times = dict()
+    for i in range(ROUNDS):
+        for mode in MODES:
+            for rpdb2_dir in rpdb2_dirs:
+                cmd = [sys.executable, SCRIPT, '--rpdb2=%s' % rpdb2_dir, mode]
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+                output = proc.communicate()[0]
+                elapsed = float(output.split()[0])
+                times.setdefault((rpdb2_dir, mode), list()).append(elapsed)
+
+    for rpdb2_dir in rpdb2_dirs:
+        sys.stdout.write('%s\n' % rpdb2_dir)
+        sys.stdout.write('%-8s %10s %10s\n' % ('mode', 'seconds', 'overhead'))
+        plain = Median(times[(rpdb2_dir, 'plain')])
+        for mode in MODES:
+            elapsed = Median(times[(rpdb2_dir, mode)])
+            sys.stdout.write('%-8s %10.3f %9.1fx\n' % \
+                             (mode, elapsed, elapsed / plain))
+
+def main(args):
+    rpdb2_dirs = list()
+    modes = list()
+    for arg in args:
+        if arg.startswith('--rpdb2='):
+            rpdb2_dirs.append(arg[len('--rpdb2='):])
+        elif arg in MODES:
+            modes.append(arg)
+        else:
+            sys.stderr.write(__doc__)
+            return 2
+
+    if not rpdb2_dirs:
+        rpdb2_dirs.append(RPDB2_DIR)
+
+    if modes:
+        sys.path.insert(0, os.path.abspath(rpdb2_dirs[0]))
+        RunMode(modes[0])
+    else:
+        RunAll(rpdb2_dirs)
+    return 0
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    # Only exit through SystemExit on errors, as the debugger stops on it
+    EXIT_CODE = main(sys.argv[1:])
+    if EXIT_CODE:
+        sys.exit(EXIT_CODE)
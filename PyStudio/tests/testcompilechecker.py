@@ -0,0 +1,108 @@
+###############################################################################
+# Name: testcompilechecker.py
+# Purpose: Unittest for PyStudio.SyntaxChecker.CompileChecker
+# Author: Cody Precord <cprecord@editra.org>
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>
+# License: wxWindows License
+###############################################################################
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath('..'))
+
+from PyStudio.SyntaxChecker import CompileChecker
+
+#-----------------------------------------------------------------------------#
+
+SOURCE = u'''"""Module
+docstring
+"""
+import os
+import sys
+
+X = {1: 2,
+     3: 4}
+
+"""a
+b""".strip()
+
+@dec
+@dec2
+def func(a,
+         b):
+    """func
+    docstring"""
+    return (a +
+            b)
+
+if X:
+    pass
+elif sys:
+    pass
+else:
+    pass
+
+try:
+    pass
+except Exception:
+    pass
+finally:
+    pass
+
+Y = 3 \\
+    + 4
+'''
+
+EDITS = (u'', u'pass', u'    pass', u'"', u'"""', u'(', u')', u'else:',
+         u'x = """', u'@dec', u'y = 1 \\')
+
+class TestCompileChecker(unittest.TestCase):
+    def setUp(self):
+        self.lastgood = self.check(SOURCE)[2]
+        self.assertNotEqual(self.lastgood, None)
+
+    def check(self, text, lastgood=None):
+        return CompileChecker.CheckSource(text, u"test.py", lastgood)
+
+    def checkSame(self, text):
+        """Incremental check gives the same result as a full check"""
+        self.assertEquals(self.check(text, self.lastgood)[:2],
+                          self.check(text)[:2])
+
+    def testUnchanged(self):
+        """Unchanged text is not checked again"""
+        self.assertEquals(self.check(SOURCE, self.lastgood),
+                          (-1, u"", self.lastgood))
+
+    def testStatementStarts(self):
+        """Multi line strings start statements at their first line"""
+        self.assertEquals(self.lastgood[1],
+                          [1, 4, 5, 7, 10, 13, 22, 29, 36])
+
+    def testAfterDocstring(self):
+        """Edit of the statement after the module docstring"""
+        self.checkSame(SOURCE.replace(u'import os', u'import re'))
+        self.checkSame(SOURCE.replace(u'import sys', u'import (sys'))
+
+    def testEditLines(self):
+        """Replace, insert and delete each line of the source"""
+        lines = SOURCE.splitlines(True)
+        for idx in range(len(lines) + 1):
+            for edit in EDITS:
+                edit = edit + u'\n'
+                self.checkSame(u''.join(lines[:idx] + [edit] + lines[idx+1:]))
+                self.checkSame(u''.join(lines[:idx] + [edit] + lines[idx:]))
+            self.checkSame(u''.join(lines[:idx] + lines[idx+1:]))
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,10 +16,12 @@ import unittest
 import StringIO
 import os
 import sys
+import shutil
+import tempfile
 
-sys.path.insert(0, os.path.abspath('../PyStudio'))
+sys.path.insert(0, os.path.abspath('../PyStudio/ModuleFinder'))
 
-import finder
+import findmodule as finder
 
 #-----------------------------------------------------------------------------#
 
@@ -88,15 +90,70 @@ class TestModuleFinder(unittest.TestCase):
         res = self.finder.Find('os.path')
         self.assertTrue(len(res) == 1 and os.path.join(self.base, 'os.py') in res)
 
-    def testFindUseImport(self):
-        res = self.finder.Find('string', True)
-        self.assertEquals(res[0], os.path.join(self.base, 'string.py'))
+    def testFindFirstMatch(self):
+        """Stop at the first directory with a module found"""
+        mfinder = finder.ModuleFinder(finder.GetSearchPath(), True)
+        res = mfinder.Find('string')
+        self.assertTrue(os.path.join(self.base, 'string.py') in res)
+        self.assertEquals(set(os.path.dirname(path) for path in res),
+                          set([self.base]))
 
     def check(self, lst1, lst2):
         lst1 = lst1.sort()
         lst2 = lst2.sort()
         self.assertEqual(lst1, lst2)
 
+#-----------------------------------------------------------------------------#
+
+class TestModuleIndex(unittest.TestCase):
+    def setUp(self):
+        self.indexdir = tempfile.mkdtemp()
+        self.pkgdir = tempfile.mkdtemp()
+        self.searchpath = finder.GetSearchPath() + [self.pkgdir]
+        os.makedirs(os.path.join(self.pkgdir, 'foopkg', 'sub'))
+        for path in (('foopkg', '__init__.py'), ('foopkg', 'foomod.py'),
+                     ('foopkg', 'sub', '__init__.py'), ('foobar.py',)):
+            open(os.path.join(self.pkgdir, *path), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.indexdir)
+        shutil.rmtree(self.pkgdir)
+
+    def find(self, text, firstmatch=False):
+        mfinder = finder.ModuleFinder(self.searchpath, firstmatch,
+                                      self.indexdir)
+        return mfinder.Find(text)
+
+    def testSameResults(self):
+        """Index finds the same modules as the traversal"""
+        walker = finder.ModuleFinder(self.searchpath)
+        for text in ('string', 'ctypes', 'mime', 'email.mime', 'os.path',
+                     'foo', 'foopkg', 'foopkg.sub', 'foopkg.foo'):
+            self.assertEquals(sorted(self.find(text)),
+                              sorted(walker.Find(text)))
+
+    def testPersistent(self):
+        """Index is written to the index directory"""
+        self.find('foo')
+        self.assertTrue(os.listdir(self.indexdir))
+        self.assertEquals(self.find('foobar'),
+                          [ os.path.join(self.pkgdir, 'foobar.py') ])
+
+    def testChanges(self):
+        """Added and removed modules are found by the next search"""
+        self.assertEquals(self.find('foopkg.newmod'), [])
+        newmod = os.path.join(self.pkgdir, 'foopkg', 'newmod.py')
+        open(newmod, 'w').close()
+        self.assertEquals(self.find('foopkg.newmod'), [ newmod ])
+        shutil.rmtree(os.path.join(self.pkgdir, 'foopkg'))
+        self.assertEquals(self.find('foopkg.newmod'), [])
+        self.assertEquals(self.find('foopkg'), [])
+
+    def testFirstMatch(self):
+        """Exact name is preferred over a prefix match"""
+        self.assertEquals(self.find('foopkg', True),
+                          [ os.path.join(self.pkgdir, 'foopkg', '__init__.py') ])
+
 if __name__ == '__main__':
     unittest.main()
 
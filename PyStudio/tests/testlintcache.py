@@ -0,0 +1,94 @@
+###############################################################################
+# Name: testlintcache.py
+# Purpose: Unittest for PyStudio.SyntaxChecker.LintCache
+# Author: Cody Precord <cprecord@editra.org>
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>
+# License: wxWindows License
+###############################################################################
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.abspath('..'))
+
+from PyStudio.SyntaxChecker import LintCache
+
+#-----------------------------------------------------------------------------#
+
+class TestLintCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.pkg = os.path.join(self.root, 'pkg')
+        os.mkdir(self.pkg)
+        self.write('pkg/__init__.py', '')
+        self.write('pkg/base.py', 'class Base(object):\n    pass\n')
+        self.write('pkg/mid.py', 'from pkg.base import Base\n')
+        self.write('pkg/mod.py', 'import os\nfrom pkg import mid\n')
+        self.write('pkg/other.py', 'x = 1\n')
+        self.filename = os.path.join(self.pkg, 'mod.py')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, path, text):
+        handle = open(os.path.join(self.root, *path.split('/')), 'wb')
+        handle.write(text)
+        handle.close()
+
+    def key(self, args=()):
+        return LintCache.MakeKey(self.filename, 'python', list(args),
+                                 None, self.pkg)
+
+    def testRcFileInPackage(self):
+        """Implicit configuration of the package root is in the key"""
+        self.write('pylintrc', '[MESSAGES CONTROL]\n')
+        key = self.key()
+        self.assertEquals(key, self.key())
+        self.write('pylintrc', '[MESSAGES CONTROL]\ndisable=C0111\n')
+        self.assertNotEqual(key, self.key())
+
+    def testRcFileInDirectory(self):
+        """Configuration in the working directory comes first"""
+        self.write('pylintrc', '[MESSAGES CONTROL]\n')
+        key = self.key()
+        self.write('pkg/.pylintrc', '[MESSAGES CONTROL]\n')
+        self.assertNotEqual(key, self.key())
+
+    def testExplicitRcFile(self):
+        """Configuration given with --rcfile is in the key"""
+        self.write('lintrc', 'a')
+        key = self.key(['--rcfile=../lintrc'])
+        self.write('lintrc', 'b')
+        self.assertNotEqual(key, self.key(['--rcfile=../lintrc']))
+        self.assertEquals(self.key(['--rcfile=../missing']), None)
+
+    def testDependencies(self):
+        """Modules imported through other local modules are dependencies"""
+        deps = LintCache._FindDependencies(self.filename, [self.root])
+        self.assertEquals(deps, [ os.path.join(self.pkg, name)
+                                  for name in ('__init__.py', 'base.py',
+                                               'mid.py') ])
+
+    def testTooManyDependencies(self):
+        """No dependency list when there are more than the maximum"""
+        limit = LintCache.MAX_DEPENDENCIES
+        LintCache.MAX_DEPENDENCIES = 2
+        try:
+            self.assertEquals(LintCache._FindDependencies(self.filename,
+                                                          [self.root]), None)
+        finally:
+            LintCache.MAX_DEPENDENCIES = limit
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    unittest.main()
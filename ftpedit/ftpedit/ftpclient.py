@@ -15,6 +15,15 @@ to use FTP client interface with both blocking and non blocking methods. To
 use the non-blocking methods the client must be initialized with a window object
 to recieve the event callbacks from the Async method calls.
 
+Clients can be set to use a L{FtpSessionPool} in which case the commands are
+run in logged in sessions that are kept open and reused between commands
+instead of on the clients own connection.
+
+Directory listings are kept in a L{FtpListingCache} by site and remote path.
+Changes made through the client are applied to the cached listings so that
+the server only has to be asked for directories that have not been listed yet
+or when a refresh is requested.
+
 """
 
 __author__ = "Cody Precord <cprecord@editra.org>"
@@ -24,6 +33,9 @@ __revision__ = "$Revision$"
 #-----------------------------------------------------------------------------#
 # Imports
 import os
+import posixpath
+import time
+import socket
 import threading
 import ftplib
 import tempfile
@@ -96,6 +108,50 @@ class FtpClientNotConnected(FtpClientError):
 
 #-----------------------------------------------------------------------------#
 
+def pooled(failure):
+    """Decorator for L{FtpClient} methods that need a connection. If the client
+    uses a session pool the method is run in a pooled session that is moved to
+    the clients current directory first. Sessions that lost their connection
+    are dropped and the command is retried once on a new session.
+    @param failure: callable(client, *args) returning the methods failure value
+
+    """
+    def decorator(funct):
+        def wrapper(self, *args):
+            if self._pool is None:
+                return funct(self, *args)
+
+            for attempt in range(2):
+                try:
+                    session = self._pool.Acquire(self._host, self._port,
+                                                 self._lastlogin,
+                                                 self._curdir)
+                except FtpClientError, msg:
+                    Log("[ftpedit][err] %s: %s" % (funct.__name__, msg))
+                    self._ProcessException(msg)
+                    return failure(self, *args)
+
+                try:
+                    rval = funct(session, *args)
+                finally:
+                    err = session.GetLastError()
+                    session.ClearLastError()
+                    self._pool.Release(session, broken=IsConnectionError(err))
+
+                if attempt == 0 and IsConnectionError(err):
+                    continue
+
+                self._curdir = session.GetCurrentDirectory()
+                if err is not None:
+                    self._ProcessException(err)
+                return rval
+        wrapper.__name__ = funct.__name__
+        wrapper.__doc__ = funct.__doc__
+        return wrapper
+    return decorator
+
+#-----------------------------------------------------------------------------#
+
 class FtpClient(ftplib.FTP):
     """Ftp Client
     Supports both syncronous and asynchronous commands. The asynchronous
@@ -103,11 +159,12 @@ class FtpClient(ftplib.FTP):
     L{FtpClientEvent} to the owner window when the command completes.
 
     """
-    def __init__(self, parent, host=u'', port=21):
+    def __init__(self, parent, host=u'', port=21, pool=None):
         """Create an ftp client object
         @param parent: owner window (can be None, but no events will be fired)
         @keyword host: host name/ip
         @keyword port: port number
+        @keyword pool: L{FtpSessionPool} to run commands in
 
         """
         ftplib.FTP.__init__(self, host)
@@ -119,9 +176,11 @@ class FtpClient(ftplib.FTP):
         self._host = host       # Host name
         self._lastlogin = None  # Last used login (user, pass)
         self._port = port       # Port number
+        self._pool = pool       # Session pool
         self._active = False    # Connected?
-        self._data = list()     # recieved data
         self._lasterr = None    # Last error
+        self._mlsd = None       # Server supports MLSD (None if unknown)
+        self._prefetch = 0      # Number of sub directories to prefetch
         self._mutex = threading.Lock()
         self._busy = threading.Condition(self._mutex)
 
@@ -136,18 +195,98 @@ class FtpClient(ftplib.FTP):
         if len(str(msg)):
             self._lasterr = msg
 
-    def _ProcessInput(self, data):
-        """Process incoming data
-        @param data: string
-        @note: for internal use
+    def _AbsPath(self, name):
+        """Get the absolute remote path of a name in the current directory"""
+        return posixpath.normpath(posixpath.join(self._curdir, name))
+
+    @pooled(lambda self, path: None)
+    def _ChangeDir(self, path):
+        """Change the working directory on the server
+        @param path: directory to change to
 
         """
-        processed = ParseFtpOutput(data)
+        try:
+            self.cwd(path)
+            self._curdir = self.pwd()
+        except Exception, msg:
+            self._lasterr = msg
+            Log("[ftpedit][err] ChangeDir: %s" % msg)
 
-        # Make sure only one thread is modifying the list at a time
-        self._busy.acquire()
-        self._data.append(processed)
-        self._busy.release()
+    @pooled(lambda self, path=None: None)
+    def _ListDirectory(self, path=None):
+        """Get the entries of a directory from the server using MLSD if the
+        server supports it and LIST otherwise.
+        @keyword path: directory to list (current directory if None)
+        @return: list of dict(isdir, name, size, date) or None on error
+
+        """
+        if not self.IsActive():
+            raise FtpClientNotConnected, "FtpClient is not connected"
+
+        lines = list()
+        if self._mlsd is not False:
+            cmd = 'MLSD'
+            if path:
+                cmd = 'MLSD ' + path
+            try:
+                self.retrlines(cmd, lines.append)
+            except ftplib.error_perm, msg:
+                # Command not understood, fallback to LIST
+                if str(msg)[:3] not in ('500', '501', '502'):
+                    Log("[ftpedit][err] GetFileList: %s" % msg)
+                    self._ProcessException(msg)
+                    return None
+                self._mlsd = False
+                lines = list()
+            except Exception, msg:
+                Log("[ftpedit][err] GetFileList: %s" % msg)
+                self._ProcessException(msg)
+                return None
+            else:
+                self._mlsd = True
+                return [ item for item in [ ParseMlsdLine(x) for x in lines ]
+                         if item is not None ]
+
+        cmd = 'LIST'
+        if path:
+            cmd = 'LIST ' + path
+        try:
+            self.retrlines(cmd, lines.append)
+        except Exception, msg:
+            Log("[ftpedit][err] GetFileList: %s" % msg)
+            self._ProcessException(msg)
+            return None
+        return [ item for item in [ ParseFtpOutput(x) for x in lines ]
+                 if 'name' in item ]
+
+    def _Prefetch(self, path, items):
+        """List the sub directories of path in the background on a copy of
+        this client so that they are in the cache when they are opened.
+        @param path: directory that was listed
+        @param items: entries of the directory
+
+        """
+        dirs = [ posixpath.join(path, item['name']) for item in items
+                 if item['isdir'] and item['name'] not in ('.', '..') ]
+        dirs = dirs[:self._prefetch]
+        if not dirs:
+            return
+
+        client = self.Clone()
+        client.ClearLastError()
+        site = self.GetSiteKey()
+        def Prefetch():
+            """List the directories that are not cached yet"""
+            for dpath in dirs:
+                if ListingCache.Get(site, dpath) is None:
+                    entries = client._ListDirectory(dpath)
+                    if entries is None:
+                        break
+                    ListingCache.Set(site, dpath, entries)
+
+        prefetch_t = threading.Thread(target=Prefetch)
+        prefetch_t.setDaemon(True)
+        prefetch_t.start()
 
     def _RefreshCommand(self, cmd, args=list()):
         """Run a refresh command
@@ -161,19 +300,21 @@ class FtpClient(ftplib.FTP):
     #---- Public Api ----#
 
     def ChangeDir(self, path):
-        """Change the current working directory and get the list of files
+        """Change the current working directory and get the list of files.
+        Changing to a directory that is in the listing cache does not need
+        to contact the server.
         @return: list
 
         """
         if not self.IsActive():
             raise FtpClientNotConnected, "FtpClient is not connected"
 
-        try:
-            self.cwd(path)
-            self._curdir = self.pwd()
-        except Exception, msg:
-            self._lasterr = msg
-            Log("[ftpedit][err] ChangeDir: %s" % msg)
+        target = self._AbsPath(path)
+        if self._curdir and \
+           ListingCache.Get(self.GetSiteKey(), target) is not None:
+            self._curdir = target
+        else:
+            self._ChangeDir(path)
 
         return self.GetFileList()
 
@@ -208,13 +349,14 @@ class FtpClient(ftplib.FTP):
 
     def Clone(self):
         """Create a copy of this client"""
-        nclient = FtpClient(self._parent)
+        nclient = FtpClient(self._parent, pool=self._pool)
         nclient._default = self._default
         nclient._curdir = self._curdir
         nclient._host = self._host
         nclient._lastlogin = self._lastlogin
         nclient._port = self._port
         nclient._lasterr = self._lasterr
+        nclient._prefetch = self._prefetch
         return nclient
 
     def Connect(self, user, password):
@@ -223,6 +365,22 @@ class FtpClient(ftplib.FTP):
         @param password: password
 
         """
+        if self._pool is not None:
+            # Login with a new pooled session
+            try:
+                self._curdir = self._pool.Open(self._host, self._port,
+                                               (user, password),
+                                               self._default)
+            except FtpClientError, msg:
+                Log("[ftpedit][err] Connect: %s" % msg)
+                self._ProcessException(msg)
+                self._lastlogin = None
+                return False
+            self._lastlogin = (user, password)
+            self._active = True
+            ListingCache.Invalidate(self.GetSiteKey())
+            return True
+
         try:
             # First disconnect if there is an existing connection
             if self.IsActive():
@@ -250,6 +408,11 @@ class FtpClient(ftplib.FTP):
         @return: bool
 
         """
+        if self._pool is not None:
+            self._active = False
+            self._pool.Close(self._host, self._port, self._lastlogin)
+            return True
+
         try:
             if self._active:
                 self.abort()
@@ -261,6 +424,7 @@ class FtpClient(ftplib.FTP):
             return False
         return True
 
+    @pooled(lambda self, fname: False)
     def DeleteFile(self, fname):
         """Delete the given file
         @param fname: string
@@ -276,6 +440,7 @@ class FtpClient(ftplib.FTP):
             self._ProcessException(msg)
             Log("[ftpedit][err] DeleteFile: %s" % msg)
             return False
+        ListingCache.Update(self.GetSiteKey(), self._AbsPath(fname))
         return True
 
     def DeleteFileAsync(self, fname):
@@ -289,6 +454,7 @@ class FtpClient(ftplib.FTP):
                           edEVT_FTP_REFRESH, args=[self.DeleteFile, [fname,]])
         ftp_t.start()
 
+    @pooled(lambda self, fname: (u"/".join([self._curdir, fname]), None))
     def Download(self, fname):
         """Download the file at the given path
         @param fname: string
@@ -333,6 +499,8 @@ class FtpClient(ftplib.FTP):
                           edEVT_FTP_DOWNLOAD, args=[fname,])
         ftp_t.start()
 
+    @pooled(lambda self, fname, dest:
+            (u"/".join([self._curdir, fname]), dest, False))
     def DownloadTo(self, fname, dest):
         """Download the file from the server to the destination
         @param fname: file on server to download
@@ -377,49 +545,34 @@ class FtpClient(ftplib.FTP):
         """
         return self._curdir
 
-    def GetFileList(self):
-        """Get list of files at the given path
+    def GetFileList(self, refresh=False):
+        """Get list of files in the current directory. Listings are cached
+        by directory so the server is only asked for directories that have
+        not been listed before.
+        @keyword refresh: get the listing from the server
         @return: list of dict(isdir, name, size, date)
 
         """
         if not self.IsActive():
             raise FtpClientNotConnected, "FtpClient is not connected"
 
-        try:
-            code = self.retrlines('LIST', self._ProcessInput)
-        except Exception, msg:
-            Log("[ftpedit][err] GetFileList: %s" % msg)
-            self._ProcessException(msg)
+        site = self.GetSiteKey()
+        path = self._curdir
+        items = None
+        if not refresh:
+            items = ListingCache.Get(site, path)
 
-        #-- Critical section --#
-        self._busy.acquire()
-        rval = list(self._data)
-        del self._data
-        self._data = list()
-        self._busy.release()
-        #-- End Critical Section --#
-
-        # Sort the list (directories, files)
-        dirs = list()
-        files = list()
-        for item in rval:
-            if item['isdir']:
-                dirs.append(item)
+        if items is None:
+            items = self._ListDirectory()
+            if items is None:
+                items = list()
             else:
-                files.append(item)
+                path = self._curdir
+                ListingCache.Set(site, path, items)
+                if self._prefetch and self._pool is not None:
+                    self._Prefetch(path, items)
 
-        # Sort dir list by dir name
-        dirs.sort(key=lambda x: x['name'])
-
-        # Insert dummy .. entry to allow for navigating backwards with
-        dirs.insert(0, dict(name=u'..', isdir=True, size=u'0 bytes', date=u''))
-
-        # Sort file list by file name
-        files.sort(key=lambda x: x['name'])
-
-        # Return ordered list of directories followed by files in alphanumeric
-        # sorted order.
-        return dirs + files
+        return SortFileList(items)
 
     def GetHostname(self):
         """Get the name of the currently connected host
@@ -442,6 +595,20 @@ class FtpClient(ftplib.FTP):
         """
         return self._lastlogin
 
+    def GetSiteKey(self):
+        """Get the key identifying the site this client is logged in to
+        @return: (host, port, user)
+
+        """
+        return GetSiteKey(self._host, self._port, self._lastlogin)
+
+    def GetSessionPool(self):
+        """Get the session pool this client runs its commands in
+        @return: L{FtpSessionPool} or None
+
+        """
+        return self._pool
+
     def GetParent(self):
         """Get the clients parent window
         @return: parent window or None
@@ -479,6 +646,7 @@ class FtpClient(ftplib.FTP):
         """
         raise NotImplementedError
 
+    @pooled(lambda self, dname: False)
     def NewDir(self, dname):
         """Create a new directory relative to the current path
         @param dname: string
@@ -493,6 +661,8 @@ class FtpClient(ftplib.FTP):
             self._ProcessException(msg)
             Log("[ftpedit][err] NewDir: %s" % msg)
             return False
+        ListingCache.Update(self.GetSiteKey(), self._AbsPath(dname),
+                            dict(isdir=True, size=CalcSize(0), date=Now()))
         return True
 
     def NewDirAsync(self, dname):
@@ -504,6 +674,7 @@ class FtpClient(ftplib.FTP):
                           edEVT_FTP_REFRESH, args=[self.NewDir, [dname,]])
         ftp_t.start()
 
+    @pooled(lambda self, fname: False)
     def NewFile(self, fname):
         """Create a new file relative to the current path
         @param fname: string
@@ -519,6 +690,8 @@ class FtpClient(ftplib.FTP):
             self._ProcessException(msg)
             Log("[ftpedit][err] Upload: %s" % msg)
             return False
+        ListingCache.Update(self.GetSiteKey(), self._AbsPath(fname),
+                            dict(isdir=False, size=CalcSize(0), date=Now()))
         return True
 
     def NewFileAsync(self, fname):
@@ -537,9 +710,11 @@ class FtpClient(ftplib.FTP):
         in a EVT_FTP_REFRESH event.
 
         """
-        ftp_t = FtpThread(self._parent, self.GetFileList, edEVT_FTP_REFRESH)
+        ftp_t = FtpThread(self._parent, self.GetFileList,
+                          edEVT_FTP_REFRESH, args=[True,])
         ftp_t.start()
 
+    @pooled(lambda self, old, new: False)
     def Rename(self, old, new):
         """Rename the file
         @param old: old file name
@@ -556,6 +731,8 @@ class FtpClient(ftplib.FTP):
             self._ProcessException(msg)
             Log("[ftpedit][err] Rename: %s" % msg)
             return False
+        ListingCache.Rename(self.GetSiteKey(), self._AbsPath(old),
+                            self._AbsPath(new))
         return True
 
     def RenameAsync(self, old, new):
@@ -575,6 +752,14 @@ class FtpClient(ftplib.FTP):
         """
         self._default = dpath
 
+    def SetPrefetch(self, count):
+        """Set the number of sub directories to list in the background
+        after a directory has been listed from the server.
+        @param count: int (0 to disable)
+
+        """
+        self._prefetch = count
+
     def SetHostname(self, hostname):
         """Set the host name
         @param hostname: string
@@ -589,6 +774,7 @@ class FtpClient(ftplib.FTP):
         """
         self._port = port
 
+    @pooled(lambda self, src, dest: False)
     def Upload(self, src, dest):
         """Upload a file to the server
         @param src: source file
@@ -608,6 +794,9 @@ class FtpClient(ftplib.FTP):
             self._ProcessException(msg)
             Log("[ftpedit][err] Upload: %s" % msg)
             return False
+        size = CalcSize(buff.len)
+        ListingCache.Update(self.GetSiteKey(), self._AbsPath(dest),
+                            dict(isdir=False, size=size, date=Now()))
         return True
 
     def UploadAsync(self, src, dest):
@@ -653,20 +842,578 @@ class FtpThread(threading.Thread):
             evt = FtpClientEvent(self._etype, result, cdir)
             wx.PostEvent(self._parent, evt)
 
+#-----------------------------------------------------------------------------#
+
+class FtpSessionPool(object):
+    """Pool of logged in L{FtpClient} sessions for each site (host, port and
+    user). Idle sessions are kept alive with NOOP commands and disconnected
+    after being idle for too long.
+
+    """
+    def __init__(self, maxsize=3, keepalive=30, timeout=300):
+        """Create the pool
+        @keyword maxsize: maximum number of sessions per site
+        @keyword keepalive: seconds between NOOP commands on idle sessions
+        @keyword timeout: seconds before idle sessions are disconnected
+
+        """
+        super(FtpSessionPool, self).__init__()
+
+        # Attributes
+        self.maxsize = maxsize
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._idle = dict()     # site -> [[session, idle since, last check]]
+        self._count = dict()    # site -> number of open sessions
+        self._gen = dict()      # site -> generation (changed by Close)
+        self._owner = dict()    # id(session) -> (site, generation)
+        self._watcher = None    # Keepalive thread
+
+    def _NewSession(self, host, port, login, default=u'.'):
+        """Create and login a new session
+        @raise FtpClientError: if the connection or login failed
+
+        """
+        session = FtpClient(None)
+        session.SetHostname(host)
+        session.SetPort(port)
+        session.SetDefaultPath(default)
+        if not session.Connect(login[0], login[1]):
+            err = session.GetLastError()
+            raise FtpClientError, unicode(err)
+        return session
+
+    def _Discard(self, session):
+        """Disconnect a session that is no longer in the pool"""
+        try:
+            session.quit()
+        except Exception:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+    def _StartKeepAlive(self):
+        """Start the keepalive thread if it is not running"""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._KeepAlive)
+            self._watcher.setDaemon(True)
+            self._watcher.start()
+
+    def _KeepAlive(self):
+        """Keep the idle sessions alive and evict the expired ones"""
+        while True:
+            time.sleep(max(1, self.keepalive / 2))
+            now = time.time()
+            expired = list()
+            checks = list()
+            self._cond.acquire()
+            try:
+                for site, idle in self._idle.items():
+                    for entry in list(idle):
+                        if now - entry[1] > self.timeout:
+                            idle.remove(entry)
+                            expired.append((site, entry[0]))
+                        elif now - entry[2] > self.keepalive:
+                            idle.remove(entry)
+                            checks.append((site, entry))
+            finally:
+                self._cond.release()
+
+            # Network access is done outside of the lock
+            for site, session in expired:
+                self._Discard(session)
+                self._Forget(site, session)
+
+            for site, entry in checks:
+                if Noop(entry[0]):
+                    entry[2] = time.time()
+                    self._cond.acquire()
+                    try:
+                        info = self._owner.get(id(entry[0]), None)
+                        keep = info is not None and \
+                               info[1] == self._gen.get(site, 0)
+                        if keep:
+                            self._idle.setdefault(site, list()).append(entry)
+                            self._cond.notify()
+                    finally:
+                        self._cond.release()
+                    if keep:
+                        continue
+                self._Discard(entry[0])
+                self._Forget(site, entry[0])
+
+    def _Forget(self, site, session):
+        """Remove a discarded session from the pool counts"""
+        self._cond.acquire()
+        try:
+            info = self._owner.pop(id(session), None)
+            if info is not None and info[1] == self._gen.get(site, 0):
+                self._count[site] = max(0, self._count.get(site, 1) - 1)
+            self._cond.notify()
+        finally:
+            self._cond.release()
+
+    def Acquire(self, host, port, login, path=None, wait=30):
+        """Get a logged in session for the site. Idle sessions are reused
+        (checked with a NOOP first if they have not been used for a while),
+        a new one is created if there is no idle session and the site has
+        less than maxsize sessions, otherwise this waits for a session to be
+        released.
+        @param host: host name
+        @param port: port number
+        @param login: (user, password)
+        @keyword path: directory the session should be in
+        @keyword wait: seconds to wait for a free session
+        @return: L{FtpClient} that must be given back with L{Release}
+        @raise FtpClientError: if no session could be opened
+
+        """
+        if login is None:
+            raise FtpClientNotConnected, "FtpClient is not connected"
+
+        site = GetSiteKey(host, port, login)
+        deadline = time.time() + wait
+        session = None
+        while session is None:
+            entry = None
+            self._cond.acquire()
+            try:
+                while True:
+                    idle = self._idle.get(site, list())
+                    if idle:
+                        # Most recently used session first
+                        entry = idle.pop()
+                        break
+                    elif self._count.get(site, 0) < self.maxsize:
+                        self._count[site] = self._count.get(site, 0) + 1
+                        gen = self._gen.get(site, 0)
+                        break
+
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise FtpClientError, "No free connection to %s" % host
+                    self._cond.wait(remaining)
+            finally:
+                self._cond.release()
+
+            if entry is not None:
+                # Check sessions that the keepalive has not seen recently
+                if time.time() - entry[2] > self.keepalive and \
+                   not Noop(entry[0]):
+                    self._Discard(entry[0])
+                    self._Forget(site, entry[0])
+                    continue
+                session = entry[0]
+            else:
+                try:
+                    session = self._NewSession(host, port, login)
+                except FtpClientError:
+                    self._cond.acquire()
+                    self._count[site] = max(0, self._count.get(site, 1) - 1)
+                    self._cond.notify()
+                    self._cond.release()
+                    raise
+                self._cond.acquire()
+                self._owner[id(session)] = (site, gen)
+                self._cond.release()
+
+        # Move to the requested directory
+        if path and session.GetCurrentDirectory() != path:
+            try:
+                session.cwd(path)
+                session._curdir = path
+            except Exception, msg:
+                self.Release(session, IsConnectionError(msg))
+                raise FtpClientError, unicode(msg)
+        return session
+
+    def Close(self, host, port, login):
+        """Disconnect all idle sessions of a site. Sessions that are in use
+        are disconnected when they are released.
+        @param host: host name
+        @param port: port number
+        @param login: (user, password)
+
+        """
+        site = GetSiteKey(host, port, login)
+        self._cond.acquire()
+        try:
+            self._gen[site] = self._gen.get(site, 0) + 1
+            self._count[site] = 0
+            idle = self._idle.pop(site, list())
+            for entry in idle:
+                self._owner.pop(id(entry[0]), None)
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+
+        for entry in idle:
+            self._Discard(entry[0])
+
+    def Open(self, host, port, login, default=u'.', wait=30):
+        """Login to a site with a new session and add it to the pool. When
+        the site already has maxsize sessions the least recently used idle
+        one is replaced, if none is idle this waits for one to be released.
+        @param host: host name
+        @param port: port number
+        @param login: (user, password)
+        @keyword default: directory to change to after login
+        @keyword wait: seconds to wait for a free session
+        @return: the sessions current directory
+        @raise FtpClientError: if the connection or login failed
+
+        """
+        site = GetSiteKey(host, port, login)
+        deadline = time.time() + wait
+        replaced = None
+        self._cond.acquire()
+        try:
+            while True:
+                idle = self._idle.get(site, list())
+                if self._count.get(site, 0) < self.maxsize:
+                    self._count[site] = self._count.get(site, 0) + 1
+                    break
+                elif idle:
+                    # The new session takes over the slot of the idle one
+                    replaced = idle.pop(0)[0]
+                    self._owner.pop(id(replaced), None)
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise FtpClientError, "No free connection to %s" % host
+                self._cond.wait(remaining)
+            gen = self._gen.get(site, 0)
+        finally:
+            self._cond.release()
+
+        if replaced is not None:
+            self._Discard(replaced)
+
+        try:
+            session = self._NewSession(host, port, login, default)
+        except FtpClientError:
+            self._cond.acquire()
+            self._count[site] = max(0, self._count.get(site, 1) - 1)
+            self._cond.notify()
+            self._cond.release()
+            raise
+
+        self._cond.acquire()
+        self._owner[id(session)] = (site, gen)
+        self._cond.release()
+        self.Release(session)
+        return session.GetCurrentDirectory()
+
+    def Release(self, session, broken=False):
+        """Give a session back to the pool
+        @param session: L{FtpClient} from L{Acquire}
+        @keyword broken: the session lost its connection
+
+        """
+        self._cond.acquire()
+        try:
+            info = self._owner.get(id(session), None)
+            keep = not broken and session.IsActive() and info is not None \
+                   and info[1] == self._gen.get(info[0], 0)
+            if keep:
+                now = time.time()
+                self._idle.setdefault(info[0], list()).append([session, now, now])
+                self._cond.notify()
+                self._StartKeepAlive()
+        finally:
+            self._cond.release()
+
+        if not keep:
+            self._Discard(session)
+            if info is not None:
+                self._Forget(info[0], session)
+
+# Sessions shared by all clients
+SessionPool = FtpSessionPool()
+
+#-----------------------------------------------------------------------------#
+
+class FtpListingCache(object):
+    """Cache of remote directory listings by site and directory path. The
+    least recently used listings are dropped when there are more than
+    maxsize of them.
+
+    """
+    def __init__(self, maxsize=256):
+        """Create the cache
+        @keyword maxsize: maximum number of directory listings to keep
+
+        """
+        super(FtpListingCache, self).__init__()
+
+        # Attributes
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = dict()  # (site, path) -> [list of items, tick]
+        self._tick = 0
+
+    def Get(self, site, path):
+        """Get the cached listing of a directory
+        @param site: site key
+        @param path: absolute directory path
+        @return: list of dict(isdir, name, size, date) or None
+
+        """
+        self._lock.acquire()
+        try:
+            entry = self._entries.get((site, path), None)
+            if entry is None:
+                return None
+            self._tick += 1
+            entry[1] = self._tick
+            return list(entry[0])
+        finally:
+            self._lock.release()
+
+    def Set(self, site, path, items):
+        """Store the listing of a directory
+        @param site: site key
+        @param path: absolute directory path
+        @param items: list of dict(isdir, name, size, date)
+
+        """
+        self._lock.acquire()
+        try:
+            self._tick += 1
+            self._entries[(site, path)] = [list(items), self._tick]
+            if len(self._entries) > self.maxsize:
+                lru = sorted(self._entries.iteritems(),
+                             key=lambda item: item[1][1])
+                for key, entry in lru[:max(1, self.maxsize / 4)]:
+                    del self._entries[key]
+        finally:
+            self._lock.release()
+
+    def _Drop(self, site, path):
+        """Remove the listings of path and the directories below it
+        @note: lock must be held by caller
+
+        """
+        prefix = path.rstrip(u'/') + u'/'
+        for key in self._entries.keys():
+            if key[0] == site and (key[1] == path or
+                                   key[1].startswith(prefix)):
+                del self._entries[key]
+
+    def Update(self, site, path, item=None):
+        """Update the cached listing of the directory that contains path
+        @param site: site key
+        @param path: absolute path of the file or directory
+        @keyword item: new dict(isdir, size, date) for path or None if it
+                       was removed.
+
+        """
+        dname, name = posixpath.split(path)
+        self._lock.acquire()
+        try:
+            entry = self._entries.get((site, dname), None)
+            if entry is not None:
+                for old in [ x for x in entry[0] if x['name'] == name ]:
+                    entry[0].remove(old)
+                    if old['isdir']:
+                        self._Drop(site, path)
+                if item is not None:
+                    item = dict(item)
+                    item['name'] = name
+                    entry[0].append(item)
+        finally:
+            self._lock.release()
+
+    def Rename(self, site, old, new):
+        """Update the cached listings for a renamed file or directory
+        @param site: site key
+        @param old: old absolute path
+        @param new: new absolute path
+
+        """
+        odir, oname = posixpath.split(old)
+        self._lock.acquire()
+        try:
+            item = None
+            entry = self._entries.get((site, odir), None)
+            if entry is not None:
+                for cur in [ x for x in entry[0] if x['name'] == oname ]:
+                    entry[0].remove(cur)
+                    item = cur
+            self._Drop(site, old)
+        finally:
+            self._lock.release()
+
+        if item is None:
+            # Not known, make sure the new directory gets listed again
+            self.Invalidate(site, posixpath.dirname(new))
+        else:
+            self.Update(site, new, item)
+
+    def Invalidate(self, site, path=None):
+        """Remove the cached listings of a site
+        @param site: site key
+        @keyword path: only remove this directory and the ones below it
+
+        """
+        self._lock.acquire()
+        try:
+            if path is None:
+                for key in self._entries.keys():
+                    if key[0] == site:
+                        del self._entries[key]
+            else:
+                self._Drop(site, path)
+        finally:
+            self._lock.release()
+
+# Directory listings shared by all clients
+ListingCache = FtpListingCache()
+
 #-----------------------------------------------------------------------------#
 # Utility
 
+def GetSiteKey(host, port, login):
+    """Get the key identifying a site login
+    @param host: host name
+    @param port: port number
+    @param login: (user, password) or None
+    @return: (host, port, user)
+
+    """
+    user = u''
+    if login is not None:
+        user = login[0]
+    return (host, int(port), user)
+
+def Now():
+    """Get the current time formatted like the dates in the file lists
+    @return: string
+
+    """
+    return unicode(time.strftime('%Y-%m-%d %H:%M'))
+
+def SortFileList(items):
+    """Order a list of files with the directories first followed by the
+    files, both sorted by name. A '..' entry is added to allow for
+    navigating backwards.
+    @param items: list of dict(isdir, name, size, date)
+    @return: list
+
+    """
+    # Sort the list (directories, files)
+    dirs = list()
+    files = list()
+    for item in items:
+        if item['isdir']:
+            dirs.append(item)
+        else:
+            files.append(item)
+
+    # Sort dir list by dir name
+    dirs.sort(key=lambda x: x['name'])
+
+    # Insert dummy .. entry to allow for navigating backwards with
+    dirs.insert(0, dict(name=u'..', isdir=True, size=u'0 bytes', date=u''))
+
+    # Sort file list by file name
+    files.sort(key=lambda x: x['name'])
+
+    # Return ordered list of directories followed by files in alphanumeric
+    # sorted order.
+    return dirs + files
+
+def ParseMlsdLine(line):
+    """Parse a line of output from the ftp MLSD command. The line is
+    parsed as the byte string read from the server so that names can be
+    sent back to it unchanged.
+    @param line: "fact=value;fact=value; name"
+    @return: dict(isdir, size, date, name) or None for the entries of the
+             current and parent directory.
+
+    """
+    if ' ' not in line:
+        return None
+
+    facts, name = line.split(' ', 1)
+    values = dict()
+    for fact in facts.split(';'):
+        if '=' in fact:
+            key, value = fact.split('=', 1)
+            values[key.lower()] = value
+
+    ftype = values.get('type', 'file').lower()
+    if ftype in ('cdir', 'pdir') or name in ('.', '..'):
+        return None
+
+    rval = dict(name=name, isdir=(ftype == 'dir'), date='')
+    size = values.get('size', values.get('sizd', '0'))
+    if size.isdigit():
+        rval['size'] = CalcSize(int(size))
+    else:
+        rval['size'] = CalcSize(0)
+
+    modify = values.get('modify', '')
+    if len(modify) >= 12 and modify[:12].isdigit():
+        rval['date'] = "%s-%s-%s %s:%s" % (modify[0:4], modify[4:6],
+                                            modify[6:8], modify[8:10],
+                                            modify[10:12])
+    return rval
+
+def IsConnectionError(err):
+    """Is the error one caused by a lost connection
+    @param err: exception object or None
+    @return: bool
+
+    """
+    if isinstance(err, (EOFError, socket.error)):
+        return True
+    # 421 Service not available, closing control connection
+    return isinstance(err, ftplib.error_temp) and str(err).startswith('421')
+
+def Noop(session):
+    """Check that a session is still connected
+    @param session: L{FtpClient}
+    @return: bool
+
+    """
+    try:
+        session.voidcmd('NOOP')
+    except Exception:
+        return False
+    return True
+
 def ParseFtpOutput(line):
     """Parse output from the ftp RETR/LIST commands and render a dictionary
-    of tokens.
+    of tokens. Both the unix (ls -l) and the DOS listing formats are
+    understood. As with L{ParseMlsdLine} the line is parsed as bytes.
     @param line: line from ftp list.
     @return: dict(isdir, size, modified, fname)
 
     """
     rval = dict()
-    parts = line.split(None, 9)
+    if line.startswith('total'):
+        return rval
+
+    parts = line.split(None, 3)
+    if len(parts) == 4 and parts[0][:2].isdigit() and '-' in parts[0]:
+        # DOS format: MM-DD-YY  HH:MMAM  <DIR>|size  name
+        rval['isdir'] = parts[2].upper() == '<DIR>'
+        if parts[2].isdigit():
+            rval['size'] = CalcSize(int(parts[2]))
+        else:
+            rval['size'] = CalcSize(0)
+        rval['date'] = "%s %s" % (parts[0], parts[1])
+        rval['name'] = parts[3]
+        return rval
+
+    parts = line.split(None, 8)
     state = 0
-    dstring = u''
+    dstring = ''
     for part in parts:
         # Permissions / type
         if state == 0:
@@ -682,7 +1429,7 @@ def ParseFtpOutput(line):
 
         # Last modified
         elif state >= 5 and state < 8:
-            dstring = dstring + u" " + part
+            dstring = dstring + " " + part
             if state == 7:
                 rval['date'] = dstring.strip()
             state += 1
@@ -126,10 +126,17 @@ class FtpFile(ed_txt.EdFile):
 
         # Cant reuse ftp ojects...
         self._client = self._client.Clone()
+        self._client.ClearLastError()
         self._client.SetHostname(self._site['url'])
         self._client.SetPort(self._site['port'])
-        connected = self._client.Connect(self._site['user'],
-                                         self._site['pword'])
+
+        # Pooled clients upload in an already logged in session
+        pooled = self._client.GetSessionPool() is not None
+        if pooled:
+            connected = True
+        else:
+            connected = self._client.Connect(self._site['user'],
+                                             self._site['pword'])
 
         if not connected:
             # TODO: report error to upload in ui
@@ -145,12 +152,8 @@ class FtpFile(ed_txt.EdFile):
                 wx.CallAfter(self._PostStatusMsg, _("Ftp upload failed: %s") % self.ftppath)
             else:
                 wx.CallAfter(self._PostStatusMsg, _("Ftp upload succeeded: %s") % self.ftppath)
-                parent = self._client.GetParent()
-                if parent is not None:
-                    files = self._client.GetFileList()
-                    evt = ftpclient.FtpClientEvent(ftpclient.edEVT_FTP_REFRESH, files)
-                    wx.PostEvent(parent, evt)
-            self._client.Disconnect()
+            if not pooled:
+                self._client.Disconnect()
             wx.CallAfter(self._Busy, False)
 
     def GetCurrentDirectory(self):
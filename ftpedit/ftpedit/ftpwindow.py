@@ -65,11 +65,14 @@ class FtpWindow(ed_basewin.EdBaseCtrlBox):
         self._config = ftpconfig.ConfigData
         self._config.SetData(Profile_Get(CONFIG_KEY, default=dict()))
         self._connected = False
-        self._client = ftpclient.FtpClient(self)
+        self._client = ftpclient.FtpClient(self, pool=ftpclient.SessionPool)
         self._files = list()
         self._select = None
         self._open = list()   # Open ftpfile objects
 
+        # List the first few sub directories in the background
+        self._client.SetPrefetch(8)
+
         # Ui controls
         self._cbar = None     # ControlBar
         self._list = None     # FtpList
@@ -0,0 +1,232 @@
+# -*- mode:Python;  cursor-type: (bar. 1)-*-
+import sys
+sys.path.append('..')
+
+from nose.tools import *
+
+import ftpedit.ftpclient as ftpclient
+
+# Listings are read from the server as byte strings, names are utf-8 here
+NAME = 'caf\xc3\xa9.txt'
+
+class TestListingParsers(object):
+    def testMlsdLine(self):
+        item = ftpclient.ParseMlsdLine('type=file;size=12;'
+                                       'modify=20120102030405; ' + NAME)
+        eq_(item['name'], NAME)
+        eq_(item['isdir'], False)
+        eq_(item['date'], '2012-01-02 03:04')
+        item = ftpclient.ParseMlsdLine('Type=dir;Modify=20120102030405; r\xe9p')
+        eq_(item['name'], 'r\xe9p')
+        eq_(item['isdir'], True)
+        eq_(ftpclient.ParseMlsdLine('type=cdir; .'), None)
+        eq_(ftpclient.ParseMlsdLine('type=pdir; ..'), None)
+        eq_(ftpclient.ParseMlsdLine('garbage'), None)
+
+    def testUnixListing(self):
+        item = ftpclient.ParseFtpOutput('-rw-r--r--   1 user  group  12 '
+                                        'Jan  2 03:04 ' + NAME)
+        eq_(item['name'], NAME)
+        eq_(item['isdir'], False)
+        eq_(item['date'], 'Jan 2 03:04')
+        item = ftpclient.ParseFtpOutput('drwxr-xr-x   2 user  group  4096 '
+                                        'Jan  2 03:04 r\xe9p dir')
+        eq_(item['name'], 'r\xe9p dir')
+        eq_(item['isdir'], True)
+        eq_(ftpclient.ParseFtpOutput('total 8'), dict())
+
+    def testDosListing(self):
+        item = ftpclient.ParseFtpOutput('01-02-12  03:04AM       12 ' + NAME)
+        eq_(item['name'], NAME)
+        eq_(item['isdir'], False)
+        item = ftpclient.ParseFtpOutput('01-02-12  03:04AM    <DIR>  r\xe9p')
+        eq_(item['name'], 'r\xe9p')
+        eq_(item['isdir'], True)
+
+LOGIN = ('user', 'secret')
+
+class FakeSession(object):
+    """Stands in for a logged in FtpClient"""
+    def __init__(self, default):
+        self.active = True
+        self.curdir = default
+        self.quit_called = False
+
+    def IsActive(self):
+        return self.active
+
+    def GetCurrentDirectory(self):
+        return self.curdir
+
+    def cwd(self, path):
+        self.curdir = path
+
+    def voidcmd(self, cmd):
+        if not self.active:
+            raise EOFError
+
+    def quit(self):
+        self.active = False
+        self.quit_called = True
+
+    def close(self):
+        self.active = False
+
+class FakePool(ftpclient.FtpSessionPool):
+    """Pool that creates fake sessions"""
+    def __init__(self, maxsize=2):
+        ftpclient.FtpSessionPool.__init__(self, maxsize, keepalive=3600)
+        self.created = list()
+        self.fail = False
+
+    def _NewSession(self, host, port, login, default=u'.'):
+        if self.fail:
+            raise ftpclient.FtpClientError, "530 Login incorrect"
+        session = FakeSession(default)
+        self.created.append(session)
+        return session
+
+    def Count(self):
+        return self._count.get(ftpclient.GetSiteKey('host', 21, LOGIN), 0)
+
+class TestSessionPool(object):
+    def setUp(self):
+        self.pool = FakePool()
+
+    def acquire(self, path=None, wait=0):
+        return self.pool.Acquire('host', 21, LOGIN, path, wait)
+
+    def testAcquireRelease(self):
+        first = self.acquire()
+        second = self.acquire('/pub')
+        assert first is not second
+        eq_(second.curdir, '/pub')
+        eq_(self.pool.Count(), 2)
+        assert_raises(ftpclient.FtpClientError, self.acquire)
+
+        # Released sessions are reused, most recently released first
+        self.pool.Release(first)
+        self.pool.Release(second)
+        assert self.acquire() is second
+        assert self.acquire() is first
+        eq_(len(self.pool.created), 2)
+
+    def testBrokenSession(self):
+        session = self.acquire()
+        self.pool.Release(session, broken=True)
+        assert session.quit_called
+        eq_(self.pool.Count(), 0)
+        assert self.acquire() is not session
+
+    def testFailedLogin(self):
+        self.pool.fail = True
+        assert_raises(ftpclient.FtpClientError, self.acquire)
+        assert_raises(ftpclient.FtpClientError, self.pool.Open,
+                      'host', 21, LOGIN)
+        eq_(self.pool.Count(), 0)
+
+    def testGeneration(self):
+        # Close drops the idle sessions and the ones in use when released
+        busy = self.acquire()
+        idle = self.acquire()
+        self.pool.Release(idle)
+        self.pool.Close('host', 21, LOGIN)
+        assert idle.quit_called
+        eq_(self.pool.Count(), 0)
+        self.pool.Release(busy)
+        assert busy.quit_called
+        eq_(self.pool.Count(), 0)
+        session = self.acquire()
+        assert session is not busy and session is not idle
+
+    def testOpen(self):
+        eq_(self.pool.Open('host', 21, LOGIN, '/home'), '/home')
+        eq_(self.pool.Count(), 1)
+        # Each connect logs in again but the site limit is kept by
+        # replacing the least recently used idle session.
+        for idx in range(3):
+            self.pool.Open('host', 21, LOGIN)
+        eq_(self.pool.Count(), 2)
+        eq_([ session.quit_called for session in self.pool.created ],
+            [True, True, False, False])
+
+    def testOpenWaits(self):
+        self.acquire()
+        self.acquire()
+        assert_raises(ftpclient.FtpClientError, self.pool.Open,
+                      'host', 21, LOGIN, '.', 0)
+        eq_(self.pool.Count(), 2)
+
+def listing(*names):
+    """Make a directory listing, directory names end with a slash"""
+    return [ dict(name=name.rstrip('/'), isdir=name.endswith('/'), size=0,
+                  date='2012-01-02 03:04') for name in names ]
+
+def names(items):
+    return sorted(item['name'] for item in items)
+
+SITE = ('host', 21, 'user')
+
+class TestListingCache(object):
+    def setUp(self):
+        self.cache = ftpclient.FtpListingCache(maxsize=8)
+        self.cache.Set(SITE, '/', listing('a.txt', 'pub'))
+        self.cache.Set(SITE, '/pub', listing('b.txt', 'sub'))
+        self.cache.Set(SITE, '/pub/sub', listing('c.txt'))
+        self.cache.Set(('other', 21, 'user'), '/', listing('d.txt'))
+
+    def testGet(self):
+        eq_(names(self.cache.Get(SITE, '/pub')), ['b.txt', 'sub'])
+        eq_(self.cache.Get(SITE, '/nosuchdir'), None)
+        # Changing the returned list does not change the cache
+        self.cache.Get(SITE, '/').pop()
+        eq_(len(self.cache.Get(SITE, '/')), 2)
+
+    def testUpdate(self):
+        self.cache.Update(SITE, '/new.txt', dict(isdir=False, size=5,
+                                                 date='2012-01-03 00:00'))
+        eq_(names(self.cache.Get(SITE, '/')), ['a.txt', 'new.txt', 'pub'])
+        self.cache.Update(SITE, '/a.txt', dict(isdir=False, size=7,
+                                               date='2012-01-03 00:00'))
+        items = self.cache.Get(SITE, '/')
+        eq_(len(items), 3)
+        eq_([ x['size'] for x in items if x['name'] == 'a.txt' ], [7])
+        self.cache.Update(SITE, '/a.txt')
+        eq_(names(self.cache.Get(SITE, '/')), ['new.txt', 'pub'])
+
+    def testRemoveDirectory(self):
+        self.cache.Set(SITE, '/pub', listing('b.txt', 'sub/'))
+        self.cache.Update(SITE, '/pub/sub')
+        eq_(names(self.cache.Get(SITE, '/pub')), ['b.txt'])
+        eq_(self.cache.Get(SITE, '/pub/sub'), None)
+
+    def testRename(self):
+        self.cache.Set(SITE, '/', listing('a.txt', 'pub/'))
+        self.cache.Rename(SITE, '/pub', '/www')
+        eq_(names(self.cache.Get(SITE, '/')), ['a.txt', 'www'])
+        eq_(self.cache.Get(SITE, '/pub'), None)
+        eq_(self.cache.Get(SITE, '/pub/sub'), None)
+
+        # Unknown source, the target directory is listed again
+        self.cache.Set(SITE, '/www', listing('b.txt'))
+        self.cache.Rename(SITE, '/elsewhere/x.txt', '/www/x.txt')
+        eq_(self.cache.Get(SITE, '/www'), None)
+
+    def testInvalidate(self):
+        self.cache.Invalidate(SITE, '/pub')
+        eq_(self.cache.Get(SITE, '/pub'), None)
+        eq_(self.cache.Get(SITE, '/pub/sub'), None)
+        eq_(names(self.cache.Get(SITE, '/')), ['a.txt', 'pub'])
+        self.cache.Invalidate(SITE)
+        eq_(self.cache.Get(SITE, '/'), None)
+        eq_(names(self.cache.Get(('other', 21, 'user'), '/')), ['d.txt'])
+
+    def testLeastRecentlyUsed(self):
+        self.cache.Get(SITE, '/')
+        for idx in range(5):
+            self.cache.Set(SITE, '/dir%d' % idx, listing())
+        # Over the limit, the least recently used quarter is dropped
+        eq_(self.cache.Get(SITE, '/pub'), None)
+        eq_(self.cache.Get(SITE, '/pub/sub'), None)
+        assert self.cache.Get(SITE, '/') is not None
+        assert self.cache.Get(SITE, '/dir4') is not None